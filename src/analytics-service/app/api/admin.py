@@ -0,0 +1,290 @@
+from datetime import date, datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, List, Optional
+import structlog
+from app.api import analytics
+from app.auth import require_admin
+from app.config import settings
+from app.profiling import capture_profile
+from app.services import export
+from app.services.columnar import TREND_BUCKETS, ColumnarStore
+from app.services.leaderboard import LeaderboardService
+
+logger = structlog.get_logger()
+
+# Every admin endpoint exposes data or process controls across all users
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+leaderboard_service = LeaderboardService()
+# Columnar report engine; None when COLUMNAR_ENABLED is off
+columnar_store = ColumnarStore(settings.COLUMNAR_PATH) if settings.COLUMNAR_ENABLED else None
+
+
+@router.post("/profile")
+async def start_profile(
+    seconds: float = Query(10, gt=0),
+    current_user: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """Capture a CPU/allocation/asyncio profile of this process and write it to disk"""
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profiling is disabled"
+        )
+    if seconds > settings.PROFILING_MAX_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"seconds must be at most {settings.PROFILING_MAX_SECONDS}"
+        )
+
+    logger.info("Profile requested", seconds=seconds, user_id=current_user["user_id"])
+    try:
+        return await capture_profile(seconds, settings.PROFILING_OUTPUT_DIR)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
+@router.get("/cache")
+async def get_cache_stats(current_user: dict = Depends(require_admin)) -> Dict[str, Any]:
+    """Response cache hit/miss statistics for this process"""
+    return analytics.analytics_service.cache.stats()
+
+
+@router.get("/single-flight")
+async def get_single_flight_stats(current_user: dict = Depends(require_admin)) -> Dict[str, Any]:
+    """Analytics computations run versus collapsed into an identical one in flight, for this process"""
+    return analytics.analytics_service.single_flight.stats()
+
+
+@router.get("/cycle-times")
+async def get_merged_cycle_times(
+    project_id: Optional[List[int]] = Query(None, description="Projects to merge; all users when omitted"),
+    current_user: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """Cycle-time percentiles merged from the stored per-user or per-project digests"""
+    return await analytics.analytics_service.merge_cycle_times(project_id)
+
+
+async def _count_distinct(
+    metric: str,
+    first_day: Optional[date],
+    last_day: Optional[date],
+    scope: Optional[int] = None
+) -> Dict[str, Any]:
+    last_day = last_day or datetime.now(timezone.utc).date()
+    try:
+        return await analytics.analytics_service.count_distinct(metric, first_day or last_day, last_day, scope)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/distinct/active-users")
+async def get_distinct_active_users(
+    first_day: Optional[date] = Query(None, alias="from", description="First UTC day; defaults to to"),
+    last_day: Optional[date] = Query(None, alias="to", description="Last UTC day (inclusive); defaults to today"),
+    current_user: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """Approximate number of distinct users with task activity in the range"""
+    return await _count_distinct("active_users", first_day, last_day)
+
+
+@router.get("/distinct/projects/{project_id}/tasks")
+async def get_distinct_project_tasks(
+    project_id: int,
+    first_day: Optional[date] = Query(None, alias="from", description="First UTC day; defaults to to"),
+    last_day: Optional[date] = Query(None, alias="to", description="Last UTC day (inclusive); defaults to today"),
+    current_user: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """Approximate number of distinct tasks of a project touched in the range"""
+    return await _count_distinct("project_tasks", first_day, last_day, project_id)
+
+
+@router.get("/export/task-events")
+async def export_task_events(
+    user_id: Optional[int] = Query(None),
+    project_id: Optional[int] = Query(None),
+    start: Optional[datetime] = Query(None, alias="from", description="Earliest event timestamp"),
+    end: Optional[datetime] = Query(None, alias="to", description="Timestamp to stop before (exclusive)"),
+    fields: Optional[List[str]] = Query(None, description="Fields to export; all when omitted"),
+    format: str = Query("ndjson", description="ndjson or arrow"),
+    compress: bool = Query(True, description="gzip the NDJSON, or zstd the Arrow buffers"),
+    cursor: Optional[str] = Query(None, description="_id of the last event received, to resume after it"),
+    batch_size: int = Query(settings.EXPORT_BATCH_SIZE, ge=1, le=settings.EXPORT_MAX_BATCH_SIZE),
+    current_user: dict = Depends(require_admin)
+) -> StreamingResponse:
+    """Stream raw task events in _id order as NDJSON or an Arrow IPC stream"""
+    if format not in export.FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"format must be one of {', '.join(export.FORMATS)}"
+        )
+    if format == "arrow" and export.pa is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Arrow export requires pyarrow; use format=ndjson"
+        )
+    try:
+        selected = export.export_fields(fields)
+        query = export.export_query(user_id, project_id, start, end, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    logger.info("Export requested", query=str(query), format=format, user_id=current_user["user_id"])
+    docs = analytics.analytics_service.export_task_events(query, selected, batch_size)
+    media_type, extension = export.FORMATS[format]
+    if format == "arrow":
+        chunks = export.arrow_chunks(docs, selected, batch_size, compress)
+    else:
+        chunks = export.ndjson_chunks(docs, selected, batch_size, compress)
+        if compress:
+            media_type, extension = "application/gzip", f"{extension}.gz"
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="task_events.{extension}"'}
+    )
+
+
+@router.get("/live")
+async def get_live_stats(current_user: dict = Depends(require_admin)) -> Dict[str, Any]:
+    """Live update watcher mode and open connections of this process"""
+    return analytics.change_hub.stats()
+
+
+@router.get("/replica")
+async def get_replica_stats(current_user: dict = Depends(require_admin)) -> Dict[str, Any]:
+    """Metrics replica residency and hit rate for this process"""
+    if analytics.metrics_replica is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Metrics replica is disabled"
+        )
+    return analytics.metrics_replica.stats()
+
+
+def _columnar() -> ColumnarStore:
+    if columnar_store is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Columnar reports are disabled"
+        )
+    if not columnar_store.ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Columnar snapshot has not been loaded yet"
+        )
+    return columnar_store
+
+
+@router.get("/reports/status")
+async def get_report_status(current_user: dict = Depends(require_admin)) -> Dict[str, Any]:
+    """Rows and ingest watermark of the columnar snapshot in this process"""
+    if columnar_store is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Columnar reports are disabled"
+        )
+    return columnar_store.stats()
+
+
+@router.get("/reports/trends")
+async def get_trend_report(
+    start: Optional[datetime] = Query(None, alias="from", description="Range start; defaults to 90 days before to"),
+    end: Optional[datetime] = Query(None, alias="to", description="Range end (exclusive); defaults to now"),
+    bucket: str = Query("day", description=" or ".join(TREND_BUCKETS)),
+    current_user: dict = Depends(require_admin)
+) -> List[Dict[str, Any]]:
+    """Platform-wide events, creations, completions and active users per day or week"""
+    store = _columnar()
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(days=90)
+    try:
+        return await store.trends(start, end, bucket)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/reports/cohorts")
+async def get_cohort_report(
+    weeks: int = Query(12, ge=1, le=104),
+    current_user: dict = Depends(require_admin)
+) -> List[Dict[str, Any]]:
+    """Weekly user cohorts by first task event and their activity in the following weeks"""
+    return await _columnar().cohorts(weeks)
+
+
+@router.get("/reports/projects")
+async def get_project_report(
+    project_id: Optional[List[int]] = Query(None, description="Projects to compare; all when omitted"),
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to", description="Range end (exclusive)"),
+    limit: int = Query(50, ge=1, le=1000),
+    current_user: dict = Depends(require_admin)
+) -> List[Dict[str, Any]]:
+    """Projects side by side: events, creations, completions, tasks, users and active days"""
+    return await _columnar().compare_projects(project_id, start, end, limit)
+
+
+@router.post("/reports/refresh")
+async def refresh_reports(current_user: dict = Depends(require_admin)) -> Dict[str, Any]:
+    """Ingest new events into the columnar snapshot now instead of waiting for the schedule"""
+    if columnar_store is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Columnar reports are disabled"
+        )
+    logger.info("Columnar refresh requested", user_id=current_user["user_id"])
+    return await columnar_store.refresh()
+
+
+@router.get("/leaderboard/users")
+async def get_user_leaderboard(
+    by: str = Query("completed_tasks", description="completed_tasks, completion_rate or last_activity"),
+    limit: int = Query(10, ge=1, le=100),
+    current_user: dict = Depends(require_admin)
+) -> List[Dict[str, Any]]:
+    """Top users, served from the materialized leaderboard view"""
+    try:
+        return await leaderboard_service.top_users(by, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/leaderboard/projects")
+async def get_project_leaderboard(
+    by: str = Query("completed_tasks", description="completed_tasks, completion_rate or last_activity"),
+    limit: int = Query(10, ge=1, le=100),
+    current_user: dict = Depends(require_admin)
+) -> List[Dict[str, Any]]:
+    """Top projects, served from the materialized leaderboard view"""
+    try:
+        return await leaderboard_service.top_projects(by, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/totals")
+async def get_platform_totals(current_user: dict = Depends(require_admin)) -> Dict[str, Any]:
+    """Platform-wide totals as of the last leaderboard refresh"""
+    totals = await leaderboard_service.totals()
+    if totals is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Totals have not been computed yet"
+        )
+    return totals
+
+
+@router.post("/leaderboard/refresh")
+async def refresh_leaderboards(
+    full: bool = Query(False),
+    current_user: dict = Depends(require_admin)
+) -> Dict[str, Any]:
+    """Run a leaderboard refresh now instead of waiting for the schedule"""
+    logger.info("Leaderboard refresh requested", full=full, user_id=current_user["user_id"])
+    try:
+        result = await leaderboard_service.refresh(full=full)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    result["refreshed_through"] = result["refreshed_through"].isoformat()
+    return result
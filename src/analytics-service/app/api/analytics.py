@@ -1,11 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from typing import Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Request, Response
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional, Type
+from pydantic import BaseModel
+import asyncio
 import structlog
 from app.auth import get_admin_user
+from app.config import settings
+from app.responses import FastJSONResponse, dumps
 from app.services.analytics_service import AnalyticsService
+from app.services.change_hub import ChangeHub
+from app.services.metrics_replica import MetricsReplica
 from app.models import (
+    ActivityResponse,
+    CycleTimesResponse,
     DashboardResponse,
     ProjectAnalyticsResponse,
+    TimelinePageResponse,
     TaskSummaryResponse,
     ProductivityResponse
 )
@@ -13,15 +24,59 @@ from app.models import (
 logger = structlog.get_logger()
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
-analytics_service = AnalyticsService()
+change_hub = ChangeHub()
+metrics_replica = (
+    MetricsReplica(change_hub, settings.METRICS_REPLICA_MAX_USERS) if settings.METRICS_REPLICA_ENABLED else None
+)
+analytics_service = AnalyticsService(replica=metrics_replica)
+
+
+def _matches_if_none_match(request: Request, etag: Optional[str]) -> bool:
+    """Whether the client's If-None-Match already holds ``etag`` (weak comparison, as for GET)"""
+    header = request.headers.get("if-none-match")
+    if not header or etag is None:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def _conditional(request: Request, response: Response, etag: Optional[str]) -> Optional[Response]:
+    """Return a 304 response if the client's copy is current, else tag ``response`` with the ETag"""
+    if etag is None:
+        return None
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _matches_if_none_match(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+def _respond(model: Type[BaseModel], data: Dict[str, Any], response: Optional[Response] = None) -> Response:
+    """Encode a service result in one pass, keeping the headers set on ``response``.
+
+    The service builds these dicts itself, so FastAPI's validation and
+    ``jsonable_encoder`` walk over ``response_model`` are skipped; the model
+    only documents the schema. RESPONSE_VALIDATION_ENABLED checks it once.
+    """
+    if settings.RESPONSE_VALIDATION_ENABLED:
+        model.model_validate(data)
+    headers = dict(response.headers) if response is not None else None
+    return FastJSONResponse(data, headers=headers)
 
 
 @router.get("/dashboard", response_model=DashboardResponse)
-async def get_dashboard(request: Request, current_user: dict = Depends(get_admin_user)):
+async def get_dashboard(request: Request, response: Response, current_user: dict = Depends(get_admin_user)):
     """Get user dashboard metrics"""
     try:
-        dashboard_data = await analytics_service.get_user_dashboard(current_user["user_id"])
-        return DashboardResponse(**dashboard_data)
+        user_id = current_user["user_id"]
+        version = await analytics_service.user_version(user_id)
+        not_modified = _conditional(request, response, analytics_service.etag(user_id, "dashboard", (), version))
+        if not_modified:
+            return not_modified
+        dashboard_data = await analytics_service.get_user_dashboard(user_id, version=version)
+        return _respond(DashboardResponse, dashboard_data, response)
     except Exception as e:
         logger.error("Error getting dashboard", error=str(e), user_id=current_user["user_id"])
         raise HTTPException(
@@ -30,16 +85,76 @@ async def get_dashboard(request: Request, current_user: dict = Depends(get_admin
         )
 
 
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {dumps(data).decode()}\n\n"
+
+
+@router.get("/dashboard/stream")
+async def stream_dashboard(request: Request, current_user: dict = Depends(get_admin_user)):
+    """Push dashboard updates as Server-Sent Events.
+
+    Sends the full dashboard as a ``dashboard`` event, then a ``delta`` event
+    with only the changed fields whenever the user's metrics change.
+    """
+    if not settings.LIVE_UPDATES_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Live updates are disabled"
+        )
+    if change_hub.connections >= settings.LIVE_MAX_CONNECTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many live connections"
+        )
+    user_id = current_user["user_id"]
+
+    async def events():
+        queue = change_hub.subscribe(user_id)
+        try:
+            last = await analytics_service.get_user_dashboard(user_id)
+            yield _sse("dashboard", last)
+            while True:
+                try:
+                    await asyncio.wait_for(queue.get(), timeout=settings.LIVE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                # Served from the response cache for every other connection of this user
+                current = await analytics_service.get_user_dashboard(user_id)
+                delta = {key: value for key, value in current.items() if last.get(key) != value}
+                if delta:
+                    yield _sse("delta", delta)
+                    last = current
+        finally:
+            change_hub.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/projects/{project_id}", response_model=ProjectAnalyticsResponse)
 async def get_project_analytics(
     project_id: int,
     request: Request,
+    response: Response,
     current_user: dict = Depends(get_admin_user)
 ):
     """Get analytics for a specific project"""
     try:
+        user_id = current_user["user_id"]
+        version = await analytics_service.user_version(user_id)
+        not_modified = _conditional(
+            request, response, analytics_service.etag(user_id, "project", (project_id,), version)
+        )
+        if not_modified:
+            return not_modified
         project_data = await analytics_service.get_project_analytics(
-            project_id, current_user["user_id"]
+            project_id, user_id, version=version
         )
         
         if project_data is None:
@@ -48,7 +163,7 @@ async def get_project_analytics(
                 detail="Project not found or access denied"
             )
         
-        return ProjectAnalyticsResponse(**project_data)
+        return _respond(ProjectAnalyticsResponse, project_data, response)
     except HTTPException:
         raise
     except Exception as e:
@@ -62,12 +177,77 @@ async def get_project_analytics(
         )
 
 
+@router.get("/projects/{project_id}/timeline", response_model=TimelinePageResponse)
+async def get_project_timeline(
+    project_id: int,
+    request: Request,
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(settings.TIMELINE_PAGE_SIZE, ge=1, le=settings.TIMELINE_MAX_PAGE_SIZE),
+    current_user: dict = Depends(get_admin_user)
+):
+    """Page through a project's timeline, oldest first"""
+    try:
+        page = await analytics_service.get_project_timeline(
+            project_id, current_user["user_id"], cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error("Error getting project timeline",
+                    error=str(e),
+                    user_id=current_user["user_id"],
+                    project_id=project_id)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve project timeline"
+        )
+
+    if page is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found or access denied"
+        )
+    return _respond(TimelinePageResponse, page)
+
+
+@router.get("/projects/{project_id}/timeline/stream")
+async def stream_project_timeline(
+    project_id: int,
+    request: Request,
+    batch_size: int = Query(settings.TIMELINE_STREAM_BATCH_SIZE, ge=1, le=10000),
+    current_user: dict = Depends(get_admin_user)
+):
+    """Stream a project's whole timeline as NDJSON, one event per line"""
+    entries = await analytics_service.stream_project_timeline(
+        project_id, current_user["user_id"], batch_size
+    )
+    if entries is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found or access denied"
+        )
+
+    async def ndjson():
+        async for entry in entries:
+            yield dumps(entry) + b"\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
 @router.get("/tasks/summary", response_model=TaskSummaryResponse)
-async def get_task_summary(request: Request, current_user: dict = Depends(get_admin_user)):
+async def get_task_summary(request: Request, response: Response, current_user: dict = Depends(get_admin_user)):
     """Get task completion metrics summary"""
     try:
-        summary_data = await analytics_service.get_task_summary(current_user["user_id"])
-        return TaskSummaryResponse(**summary_data)
+        user_id = current_user["user_id"]
+        version = await analytics_service.user_version(user_id)
+        not_modified = _conditional(request, response, analytics_service.etag(user_id, "task_summary", (), version))
+        if not_modified:
+            return not_modified
+        summary_data = await analytics_service.get_task_summary(user_id, version=version)
+        return _respond(TaskSummaryResponse, summary_data, response)
     except Exception as e:
         logger.error("Error getting task summary", error=str(e), user_id=current_user["user_id"])
         raise HTTPException(
@@ -77,11 +257,32 @@ async def get_task_summary(request: Request, current_user: dict = Depends(get_ad
 
 
 @router.get("/productivity", response_model=ProductivityResponse)
-async def get_productivity_insights(request: Request, current_user: dict = Depends(get_admin_user)):
+async def get_productivity_insights(
+    request: Request,
+    response: Response,
+    days: int = Query(30, ge=1, le=settings.PRODUCTIVITY_MAX_DAYS),
+    tz: str = Query("UTC", description="IANA time zone the days are counted in, e.g. Europe/Copenhagen"),
+    current_user: dict = Depends(get_admin_user)
+):
     """Get user productivity insights and recommendations"""
     try:
-        productivity_data = await analytics_service.get_productivity_insights(current_user["user_id"])
-        return ProductivityResponse(**productivity_data)
+        user_id = current_user["user_id"]
+        params = analytics_service.productivity_params(days, tz)
+        version = await analytics_service.user_version(user_id)
+        not_modified = _conditional(
+            request, response, analytics_service.etag(user_id, "productivity", params, version)
+        )
+        if not_modified:
+            return not_modified
+        productivity_data = await analytics_service.get_productivity_insights(
+            user_id, days=days, tz=tz, version=version
+        )
+        return _respond(ProductivityResponse, productivity_data, response)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error("Error getting productivity insights", error=str(e), user_id=current_user["user_id"])
         raise HTTPException(
@@ -90,6 +291,93 @@ async def get_productivity_insights(request: Request, current_user: dict = Depen
         )
 
 
+@router.get("/cycle-times", response_model=CycleTimesResponse)
+async def get_cycle_times(request: Request, response: Response, current_user: dict = Depends(get_admin_user)):
+    """Get p50/p90/p99 task cycle times (creation to completion) overall and per project"""
+    try:
+        user_id = current_user["user_id"]
+        version = await analytics_service.user_version(user_id)
+        not_modified = _conditional(request, response, analytics_service.etag(user_id, "cycle_times", (), version))
+        if not_modified:
+            return not_modified
+        cycle_times = await analytics_service.get_cycle_times(user_id, version=version)
+        return _respond(CycleTimesResponse, cycle_times, response)
+    except Exception as e:
+        logger.error("Error getting cycle times", error=str(e), user_id=current_user["user_id"])
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve cycle times"
+        )
+
+
+def _activity_range(start: Optional[datetime], end: Optional[datetime]):
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(days=settings.ACTIVITY_DEFAULT_DAYS)
+    return start, end
+
+
+async def _activity(
+    current_user: dict,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    bucket: str,
+    project_id: Optional[int] = None
+) -> Response:
+    try:
+        start, end = _activity_range(start, end)
+        activity = await analytics_service.get_activity(
+            current_user["user_id"], start, end, bucket, project_id=project_id
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error("Error getting activity",
+                    error=str(e),
+                    user_id=current_user["user_id"],
+                    project_id=project_id)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve activity"
+        )
+
+    if activity is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found or access denied"
+        )
+    return _respond(ActivityResponse, activity)
+
+
+@router.get("/activity", response_model=ActivityResponse)
+async def get_activity(
+    start: Optional[datetime] = Query(
+        None, alias="from", description="Range start; defaults to ACTIVITY_DEFAULT_DAYS before to"
+    ),
+    end: Optional[datetime] = Query(None, alias="to", description="Range end (exclusive); defaults to now"),
+    bucket: str = Query("day", description="hour, day, week or month (UTC)"),
+    current_user: dict = Depends(get_admin_user)
+):
+    """Get task creations, completions and status transitions per bucket"""
+    return await _activity(current_user, start, end, bucket)
+
+
+@router.get("/projects/{project_id}/activity", response_model=ActivityResponse)
+async def get_project_activity(
+    project_id: int,
+    start: Optional[datetime] = Query(
+        None, alias="from", description="Range start; defaults to ACTIVITY_DEFAULT_DAYS before to"
+    ),
+    end: Optional[datetime] = Query(None, alias="to", description="Range end (exclusive); defaults to now"),
+    bucket: str = Query("day", description="hour, day, week or month (UTC)"),
+    current_user: dict = Depends(get_admin_user)
+):
+    """Get a project's task creations, completions and status transitions per bucket"""
+    return await _activity(current_user, start, end, bucket, project_id=project_id)
+
+
 @router.get("/health")
 async def health_check():
     """Health check endpoint"""
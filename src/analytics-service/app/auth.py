@@ -1,9 +1,13 @@
 from fastapi import HTTPException, status, Request
 from fastapi import Depends
+from pydantic import TypeAdapter, ValidationError
 import structlog
+from app.models import UserId
 
 logger = structlog.get_logger()
 
+_user_id_adapter = TypeAdapter(UserId)
+
 
 async def get_current_user_from_headers(request: Request) -> dict:
     """Get current user from headers set by API Gateway"""
@@ -17,21 +21,31 @@ async def get_current_user_from_headers(request: Request) -> dict:
             detail="Missing user information in headers. Requests must come through API Gateway."
         )
     
+    try:
+        user_id = _user_id_adapter.validate_python(user_id)
+    except ValidationError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid user id in headers"
+        )
+    
     return {
-        "user_id": int(user_id),
+        "user_id": user_id,
         "username": username,
         "role": role
     }
 
 
 async def get_admin_user(request: Request) -> dict:
-    """Get current admin user (requires Admin role) - trusts API Gateway"""
-    user = await get_current_user_from_headers(request)
-    
-    # if user.get("role") != "Admin": TODO: Uncomment if admin-only access is needed
-    #     raise HTTPException(
-    #         status_code=status.HTTP_403_FORBIDDEN,
-    #         detail="Forbidden: Admin role required"
-    #     )
-    
-    return user
\ No newline at end of file
+    """Get the current user of an /analytics request - trusts API Gateway"""
+    return await get_current_user_from_headers(request)
+
+
+async def require_admin(user: dict = Depends(get_current_user_from_headers)) -> dict:
+    """Current user of an /admin request; 403 unless the gateway asserts the Admin role"""
+    if user.get("role") != "Admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Forbidden: Admin role required"
+        )
+    return user
@@ -1,5 +1,8 @@
+import asyncio
+from typing import Any, Dict
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from app.config import settings
+from app.instrumentation import command_listener
 import structlog
 
 logger = structlog.get_logger()
@@ -11,16 +14,46 @@ class MongoDB:
 mongodb = MongoDB()
 
 
+def client_options() -> Dict[str, Any]:
+    """Pool and timeout options for this process's client; 0 leaves a timeout unset"""
+    options: Dict[str, Any] = {
+        "maxPoolSize": settings.MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGODB_MIN_POOL_SIZE,
+        "connectTimeoutMS": settings.MONGODB_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+    }
+    optional = {
+        "maxIdleTimeMS": settings.MONGODB_MAX_IDLE_TIME_MS,
+        "socketTimeoutMS": settings.MONGODB_SOCKET_TIMEOUT_MS,
+        "waitQueueTimeoutMS": settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+    }
+    options.update({name: value for name, value in optional.items() if value > 0})
+    if settings.METRICS_ENABLED:
+        options["event_listeners"] = [command_listener]
+    return options
+
+
+async def prewarm_connections(count: int):
+    """Open ``count`` pooled connections up front so the first requests do not pay for the handshakes"""
+    # Concurrent commands cannot share a connection, so each one checks out its own
+    count = min(count, settings.MONGODB_MAX_POOL_SIZE)
+    if count > 0:
+        await asyncio.gather(*(mongodb.client.admin.command("ping") for _ in range(count)))
+        logger.info("Pre-warmed MongoDB connections", connections=count)
+
+
 async def connect_to_mongo():
     """Create database connection"""
     try:
-        mongodb.client = AsyncIOMotorClient(settings.MONGODB_URL)
+        mongodb.client = AsyncIOMotorClient(settings.MONGODB_URL, **client_options())
         mongodb.database = mongodb.client[settings.DATABASE_NAME]
         
         # Test the connection
         await mongodb.client.admin.command('ping')
         logger.info("Connected to MongoDB", database=settings.DATABASE_NAME)
         
+        await prewarm_connections(settings.MONGODB_PREWARM_CONNECTIONS)
+        
         # Create indexes for better performance
         await create_indexes()
         
@@ -40,30 +73,56 @@ async def create_indexes():
     """Create database indexes for better query performance"""
     try:
         # Task events indexes
-        await mongodb.database.task_events.create_index([("user_id", 1), ("created_at", -1)])
-        await mongodb.database.task_events.create_index([("project_id", 1), ("created_at", -1)])
+        # Events carry their event time in "timestamp"; every read sorts on it
+        await mongodb.database.task_events.create_index([("user_id", 1), ("timestamp", -1)])
+        await mongodb.database.task_events.create_index(
+            [("user_id", 1), ("event", 1), ("status", 1), ("timestamp", -1)]
+        )
+        # Keyset order of the project timeline
+        await mongodb.database.task_events.create_index(
+            [("project_id", 1), ("user_id", 1), ("timestamp", 1), ("_id", 1)]
+        )
         await mongodb.database.task_events.create_index([("task_id", 1)])
-        await mongodb.database.task_events.create_index([("event_type", 1)])
+        # _id order of the admin export per user and per project
+        await mongodb.database.task_events.create_index([("user_id", 1), ("_id", 1)])
+        await mongodb.database.task_events.create_index([("project_id", 1), ("_id", 1)])
         
         # Project events indexes
-        await mongodb.database.project_events.create_index([("user_id", 1), ("created_at", -1)])
+        await mongodb.database.project_events.create_index([("user_id", 1), ("timestamp", -1)])
         await mongodb.database.project_events.create_index([("project_id", 1)])
-        await mongodb.database.project_events.create_index([("event_type", 1)])
         
         # User metrics indexes
         await mongodb.database.user_metrics.create_index([("user_id", 1)], unique=True)
         await mongodb.database.user_metrics.create_index([("last_activity", -1)])
+        # Covers the response cache's version lookup
+        await mongodb.database.user_metrics.create_index([("user_id", 1), ("version", 1), ("updated_at", 1)])
         
         # Project metrics indexes
         await mongodb.database.project_metrics.create_index([("project_id", 1), ("user_id", 1)], unique=True)
         await mongodb.database.project_metrics.create_index([("user_id", 1), ("last_activity", -1)])
         
+        # Activity series: one scope's windows of one granularity, by start
+        await mongodb.database.task_event_windows.create_index(
+            [("user_id", 1), ("project_id", 1), ("granularity", 1), ("window_start", 1)]
+        )
+        
+        # Incremental leaderboard refreshes select by snapshot time
+        await mongodb.database.user_metrics.create_index([("updated_at", 1)])
+        await mongodb.database.project_metrics.create_index([("updated_at", 1)])
+        
         logger.info("Database indexes created successfully")
         
     except Exception as e:
         logger.error("Failed to create database indexes", error=str(e))
 
 
+def user_id_filter(user_id: int):
+    """Query value for user_id; during the id migration it also matches the legacy string form"""
+    if settings.USER_ID_MIGRATION_COMPAT:
+        return {"$in": [user_id, str(user_id)]}
+    return user_id
+
+
 def get_database() -> AsyncIOMotorDatabase:
     """Get database instance"""
     return mongodb.database
\ No newline at end of file
@@ -0,0 +1,240 @@
+import json
+import os
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+import bson
+import structlog
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from pymongo import monitoring
+from app.config import settings
+
+logger = structlog.get_logger()
+
+# Route label of Mongo commands issued outside a request (watcher, leaderboard refresh)
+BACKGROUND = "background"
+# Route label of requests that matched no route, to keep the label set bounded
+UNMATCHED = "unmatched"
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route", ["method", "route", "status"]
+)
+REQUEST_MONGO_TIME = Histogram(
+    "http_request_mongo_duration_seconds", "Time a request spent waiting on MongoDB commands", ["method", "route"]
+)
+MONGO_LATENCY = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency", ["command", "collection", "route"]
+)
+MONGO_DOCUMENTS = Counter(
+    "mongo_command_documents_returned_total", "Documents returned by MongoDB commands", ["command", "collection", "route"]
+)
+MONGO_BYTES = Counter(
+    "mongo_command_reply_bytes_total", "BSON bytes of MongoDB command replies", ["command", "collection", "route"]
+)
+MONGO_FAILURES = Counter(
+    "mongo_command_failures_total", "Failed MongoDB commands", ["command", "collection", "route"]
+)
+SINGLE_FLIGHT_CALLS = Counter(
+    "analytics_single_flight_calls_total",
+    "Analytics computations by whether they ran (leader) or joined an identical one in flight (collapsed)",
+    ["endpoint", "role"]
+)
+
+
+class CommandRecord:
+    __slots__ = ("command", "collection", "shape", "seconds", "documents", "bytes", "failed")
+
+    def __init__(self, command: str, collection: str, shape: str):
+        self.command = command
+        self.collection = collection
+        self.shape = shape
+        self.seconds = 0.0
+        self.documents = 0
+        self.bytes = 0
+        self.failed = False
+
+
+class RequestTrace:
+    """Mongo commands issued on behalf of one request"""
+
+    def __init__(self):
+        self.commands: List[CommandRecord] = []
+        self._pending: Dict[int, CommandRecord] = {}
+
+    @property
+    def mongo_seconds(self) -> float:
+        return sum(record.seconds for record in self.commands)
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+
+
+def query_shape(value: Any) -> Any:
+    """Replace literal values with "?" so queries differing only in their arguments group together"""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+        return [query_shape(item) for item in value]
+    return "?"
+
+
+def command_shape(command_name: str, command: Dict[str, Any]) -> str:
+    shape: Dict[str, Any] = {}
+    for field in ("filter", "query", "pipeline", "updates", "deletes"):
+        if field in command:
+            shape[field] = query_shape(command[field])
+    if "sort" in command:
+        # Sort directions are part of the shape: they decide the index
+        shape["sort"] = dict(command["sort"])
+    return f"{command_name} {json.dumps(shape, separators=(',', ':'), default=str)}"
+
+
+def _collection(command_name: str, command: Dict[str, Any]) -> str:
+    target = command.get("collection") if command_name == "getMore" else command.get(command_name)
+    return target if isinstance(target, str) else ""
+
+
+def _documents(reply: Dict[str, Any]) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    return 0
+
+
+def _observe(record: CommandRecord, route: str):
+    labels = (record.command, record.collection, route)
+    if record.failed:
+        MONGO_FAILURES.labels(*labels).inc()
+    MONGO_LATENCY.labels(*labels).observe(record.seconds)
+    if record.documents:
+        MONGO_DOCUMENTS.labels(*labels).inc(record.documents)
+    if record.bytes:
+        MONGO_BYTES.labels(*labels).inc(record.bytes)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Attributes each command to the request it was issued for.
+
+    Motor runs pymongo on an executor with a copy of the caller's context,
+    so the request's trace is visible here. Commands are observed when the
+    request finishes, once its route is known; commands outside a request
+    are observed immediately under the ``background`` route.
+    """
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        trace = _current_trace.get()
+        if trace is None:
+            return
+        trace._pending[event.request_id] = CommandRecord(
+            event.command_name,
+            _collection(event.command_name, event.command),
+            command_shape(event.command_name, event.command),
+        )
+
+    def _finish(self, event, reply: Optional[Dict[str, Any]]):
+        trace = _current_trace.get()
+        record = trace._pending.pop(event.request_id, None) if trace is not None else None
+        if record is None:
+            # Background command; pymongo does not repeat the command on completion
+            record = CommandRecord(event.command_name, "", "")
+        record.seconds = event.duration_micros / 1e6
+        if reply is None:
+            record.failed = True
+        else:
+            record.documents = _documents(reply)
+            try:
+                record.bytes = len(bson.encode(reply))
+            except Exception:
+                pass
+        if trace is None:
+            _observe(record, BACKGROUND)
+        else:
+            trace.commands.append(record)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finish(event, event.reply)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finish(event, None)
+
+
+command_listener = MongoCommandListener()
+
+
+def _route(scope: Dict[str, Any]) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED
+
+
+class InstrumentationMiddleware:
+    """Per-route latency histograms, Mongo attribution and the slow-request log.
+
+    A pure ASGI middleware, so streamed responses are timed until their last
+    chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace()
+        token = _current_trace.set(trace)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+            self._record(scope, trace, status_code, time.perf_counter() - started)
+
+    @staticmethod
+    def _record(scope: Dict[str, Any], trace: RequestTrace, status_code: int, seconds: float):
+        method = scope["method"]
+        route = _route(scope)
+        REQUEST_LATENCY.labels(method, route, str(status_code)).observe(seconds)
+        REQUEST_MONGO_TIME.labels(method, route).observe(trace.mongo_seconds)
+        for record in trace.commands:
+            _observe(record, route)
+
+        if seconds * 1000 >= settings.SLOW_REQUEST_MS:
+            slowest = sorted(trace.commands, key=lambda record: record.seconds, reverse=True)
+            logger.warning(
+                "Slow request",
+                method=method,
+                route=route,
+                path=scope["path"],
+                status=status_code,
+                duration_ms=round(seconds * 1000, 1),
+                mongo_ms=round(trace.mongo_seconds * 1000, 1),
+                mongo_commands=len(trace.commands),
+                queries=[
+                    {
+                        "shape": record.shape,
+                        "collection": record.collection,
+                        "ms": round(record.seconds * 1000, 1),
+                        "documents": record.documents,
+                        "bytes": record.bytes,
+                    }
+                    for record in slowest[:settings.SLOW_REQUEST_MAX_QUERIES]
+                ],
+            )
+
+
+def render_metrics() -> bytes:
+    """Prometheus exposition; aggregated across gunicorn workers when PROMETHEUS_MULTIPROC_DIR is set"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
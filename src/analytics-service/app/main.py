@@ -1,12 +1,15 @@
 import asyncio
 import structlog
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
 from app.database import connect_to_mongo, close_mongo_connection
+from app.instrumentation import CONTENT_TYPE_LATEST, InstrumentationMiddleware, render_metrics
+from app.responses import FastJSONResponse
 
-from app.api.analytics import router as analytics_router
+from app.api.analytics import router as analytics_router, change_hub, metrics_replica
+from app.api.admin import router as admin_router, columnar_store, leaderboard_service
 
 # Configure structured logging
 structlog.configure(
@@ -39,6 +42,19 @@ async def lifespan(app: FastAPI):
     try:
         # Connect to MongoDB
         await connect_to_mongo()
+        if settings.LEADERBOARD_REFRESH_ENABLED:
+            leaderboard_service.start()
+        if columnar_store is not None:
+            columnar_store.start()
+        if settings.LIVE_UPDATES_ENABLED or metrics_replica is not None:
+            change_hub.start()
+        if metrics_replica is not None:
+            # Load only once the stream is open, so no change made during the load is missed
+            try:
+                await asyncio.wait_for(change_hub.watching.wait(), settings.METRICS_REPLICA_STARTUP_TIMEOUT_SECONDS)
+                await metrics_replica.bootstrap()
+            except asyncio.TimeoutError:
+                logger.warning("No metrics change stream; the replica stays idle until one opens")
         logger.info("Analytics API Service started successfully")
         
         yield
@@ -50,6 +66,10 @@ async def lifespan(app: FastAPI):
     finally:
         # Shutdown
         logger.info("Shutting down Analytics API Service")
+        await leaderboard_service.stop()
+        if columnar_store is not None:
+            await columnar_store.stop()
+        await change_hub.stop()
         await close_mongo_connection()
 
 
@@ -61,6 +81,7 @@ app = FastAPI(
     openapi_url="/api/v1/openapi.json",
     docs_url="/api/v1/docs",
     redoc_url="/api/v1/redoc",
+    default_response_class=FastJSONResponse,
     lifespan=lifespan
 )
 
@@ -73,8 +94,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.METRICS_ENABLED:
+    app.add_middleware(InstrumentationMiddleware)
+
 # Include routers
 app.include_router(analytics_router, prefix=settings.API_V1_STR)
+app.include_router(admin_router, prefix=settings.API_V1_STR)
 
 
 @app.get("/")
@@ -87,6 +112,14 @@ async def root():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics: per-route latency and MongoDB command attribution"""
+    if not settings.METRICS_ENABLED:
+        return Response(status_code=404)
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/health")
 async def health():
     """Health check endpoint"""
@@ -1,13 +1,30 @@
+import re
 from datetime import datetime, timezone
-from typing import Optional, Dict, Any, List
-from pydantic import BaseModel, Field
+from typing import Annotated, Optional, Dict, Any, List
+from pydantic import BaseModel, BeforeValidator, Field
+
+
+def coerce_user_id(value: Any) -> Any:
+    """Normalize a user id to its canonical ``int`` form.
+
+    Producers and older documents carry the id as a numeric string; anything
+    that is not an integer is left for pydantic to reject. Only ASCII digits
+    count, the strings Mongo's ``$toInt`` accepts in scripts/migrate_user_ids.py.
+    """
+    if isinstance(value, str) and re.fullmatch(r"-?[0-9]+", value.strip()):
+        return int(value)
+    return value
+
+
+# Canonical user id type shared by every model that stores or queries user_id
+UserId = Annotated[int, BeforeValidator(coerce_user_id)]
 
 
 class TaskEvent(BaseModel):
     event: str  # task_created, task_updated, task_completed, task_deleted
     task_id: Optional[int] = None  # Optional for project events
     project_id: Optional[int] = None
-    user_id: str  # Comes as string from Kafka
+    user_id: UserId
     username: str
     title: Optional[str] = None
     name: Optional[str] = None  # For project names
@@ -22,7 +39,7 @@ class TaskEvent(BaseModel):
 class ProjectEvent(BaseModel):
     event: str  # project_created, project_updated, project_deleted
     project_id: Optional[int] = None
-    user_id: str  # Comes as string from Kafka
+    user_id: UserId
     username: str
     name: Optional[str] = None  # Project name
     timestamp: datetime
@@ -33,7 +50,7 @@ class ProjectEvent(BaseModel):
 
 
 class UserMetrics(BaseModel):
-    user_id: int
+    user_id: UserId
     username: str
     total_tasks: int = 0
     completed_tasks: int = 0
@@ -47,7 +64,7 @@ class UserMetrics(BaseModel):
 
 class ProjectMetrics(BaseModel):
     project_id: int
-    user_id: int
+    user_id: UserId
     username: str
     project_name: str
     total_tasks: int = 0
@@ -84,6 +101,30 @@ class ProjectAnalyticsResponse(BaseModel):
     avg_completion_time_hours: Optional[float]
     task_distribution: Dict[str, int]
     timeline: List[Dict[str, Any]]
+    timeline_next_cursor: Optional[str] = None
+
+
+class TimelinePageResponse(BaseModel):
+    events: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
+
+class ActivityResponse(BaseModel):
+    bucket: str
+    start: datetime
+    end: datetime
+    project_id: Optional[int] = None
+    series: List[Dict[str, Any]]
+    totals: Dict[str, Any]
+
+
+class CycleTimesResponse(BaseModel):
+    completed: int
+    mean_hours: Optional[float] = None
+    p50_hours: Optional[float] = None
+    p90_hours: Optional[float] = None
+    p99_hours: Optional[float] = None
+    projects: List[Dict[str, Any]]
 
 
 class TaskSummaryResponse(BaseModel):
@@ -0,0 +1,18 @@
+from typing import Any
+import orjson
+from fastapi.responses import ORJSONResponse
+
+# Mongo returns naive datetimes that are UTC; say so in the output
+ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(content: Any) -> bytes:
+    """Encode with orjson, which serializes datetimes natively instead of per item in Python"""
+    return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(ORJSONResponse):
+    """JSON response rendered by orjson with the service's encoding options"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Tuple
+
+# Bucket -> the task_event_windows granularity it is rolled up from. The
+# worker keeps hourly and daily UTC windows; weeks and months are day windows
+# grouped by Mongo, so a range costs one document per day (or hour) at most.
+BUCKETS = {
+    "hour": "hour",
+    "day": "day",
+    "week": "day",
+    "month": "day",
+}
+
+COUNTERS = ("events", "created", "updated", "deleted", "completed")
+
+
+def _utc(ts: datetime) -> datetime:
+    """Naive UTC, the form Mongo returns window starts in"""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def align(ts: datetime, bucket: str) -> datetime:
+    """Start of the UTC bucket containing ``ts``; weeks start on Monday"""
+    ts = _utc(ts).replace(minute=0, second=0, microsecond=0)
+    if bucket == "hour":
+        return ts
+    ts = ts.replace(hour=0)
+    if bucket == "week":
+        return ts - timedelta(days=ts.weekday())
+    if bucket == "month":
+        return ts.replace(day=1)
+    return ts
+
+
+def next_start(start: datetime, bucket: str) -> datetime:
+    if bucket == "hour":
+        return start + timedelta(hours=1)
+    if bucket == "day":
+        return start + timedelta(days=1)
+    if bucket == "week":
+        return start + timedelta(weeks=1)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def bucket_range(
+    start: datetime,
+    end: datetime,
+    bucket: str,
+    max_buckets: int
+) -> Tuple[datetime, datetime, List[datetime]]:
+    """Aligned [start, end) and the bucket starts in it; raises ValueError for unusable ranges"""
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+    start, end = align(start, bucket), _utc(end)
+    if start >= end:
+        raise ValueError("from must be before to")
+    starts = []
+    current = start
+    while current < end:
+        if len(starts) == max_buckets:
+            raise ValueError(f"Range covers more than {max_buckets} {bucket} buckets; use a coarser bucket")
+        starts.append(current)
+        current = next_start(current, bucket)
+    return start, end, starts
+
+
+def bucket_expression(bucket: str) -> Any:
+    if bucket in ("week", "month"):
+        truncate: Dict[str, Any] = {"date": "$window_start", "unit": bucket, "timezone": "UTC"}
+        if bucket == "week":
+            truncate["startOfWeek"] = "monday"
+        return {"$dateTrunc": truncate}
+    return "$window_start"
+
+
+def activity_pipeline(match: Dict[str, Any], bucket: str) -> List[Dict[str, Any]]:
+    """Counters and status transitions per bucket, summed in Mongo in one round trip"""
+    return [
+        {"$match": match},
+        {"$set": {"bucket": bucket_expression(bucket)}},
+        {"$facet": {
+            "counters": [
+                {"$group": {"_id": "$bucket", **{name: {"$sum": f"${name}"} for name in COUNTERS}}}
+            ],
+            "transitions": [
+                {"$project": {"bucket": 1, "transition": {"$objectToArray": {"$ifNull": ["$transitions", {}]}}}},
+                {"$unwind": "$transition"},
+                {"$group": {
+                    "_id": {"bucket": "$bucket", "status": "$transition.k"},
+                    "count": {"$sum": "$transition.v"}
+                }}
+            ]
+        }}
+    ]
+
+
+def empty_counts() -> Dict[str, Any]:
+    return {**{name: 0 for name in COUNTERS}, "transitions": {}}
+
+
+def build_series(starts: List[datetime], result: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Zero-filled series over ``starts`` and the totals of the range"""
+    by_start = {start: {"start": start, **empty_counts()} for start in starts}
+    totals = empty_counts()
+    for row in result.get("counters", []):
+        point = by_start.get(row["_id"])
+        if point is None:
+            continue
+        for name in COUNTERS:
+            point[name] = row.get(name, 0)
+            totals[name] += row.get(name, 0)
+    for row in result.get("transitions", []):
+        point = by_start.get(row["_id"]["bucket"])
+        if point is None:
+            continue
+        status = row["_id"]["status"]
+        point["transitions"][status] = row["count"]
+        totals["transitions"][status] = totals["transitions"].get(status, 0) + row["count"]
+    return list(by_start.values()), totals
@@ -1,16 +1,61 @@
-from datetime import datetime, timezone, timedelta
-from typing import Dict, Any, List, Optional
-from collections import defaultdict
+import asyncio
+import hashlib
+from datetime import date, datetime, time, timezone, timedelta
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable, Hashable, AsyncIterator
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import structlog
-from app.database import get_database
+from pymongo import ReadPreference
+from app.config import settings
+from app.database import get_database, user_id_filter
 from app.models import TaskEvent, ProjectEvent, UserMetrics, ProjectMetrics
+from app.services.activity import activity_pipeline, bucket_range, build_series, BUCKETS
+from app.services.cache import ResponseCache
+from app.services.export import export_hint
+from app.services.hyperloglog import HyperLogLog
+from app.services.metrics_replica import MetricsReplica
+from app.services.pagination import after_cursor, encode_cursor
+from app.services.single_flight import SingleFlight
+from app.services.tdigest import TDigest
 
 logger = structlog.get_logger()
 
+# Daily HyperLogLog sketches kept by the task worker: metric -> what its scope is
+DISTINCT_METRICS = {"active_users": "platform", "project_tasks": "project"}
+
+CYCLE_TIME_QUANTILES = {"p50_hours": 0.5, "p90_hours": 0.9, "p99_hours": 0.99}
+
+
+def cycle_time_summary(digest: Optional[TDigest]) -> Dict[str, Any]:
+    """Completed-task count, mean and percentiles of a cycle-time digest"""
+    if digest is None or not digest.count:
+        return {"completed": 0, "mean_hours": None, **{name: None for name in CYCLE_TIME_QUANTILES}}
+    return {
+        "completed": int(digest.count),
+        "mean_hours": round(digest.mean, 2),
+        **{name: round(digest.quantile(q), 2) for name, q in CYCLE_TIME_QUANTILES.items()}
+    }
+
+
+def _stored_digest(doc: Optional[Dict[str, Any]]) -> Optional[TDigest]:
+    if doc is None or not doc.get("cycle_time_digest"):
+        return None
+    return TDigest.from_bytes(doc["cycle_time_digest"])
+
 
 class AnalyticsService:
-    def __init__(self):
+    def __init__(self, replica: Optional[MetricsReplica] = None):
         self.db = None
+        self.cache = ResponseCache(settings.RESPONSE_CACHE_MAX_ENTRIES, settings.RESPONSE_CACHE_TTL_SECONDS)
+        # Concurrent cache misses for the same response share one computation
+        self.single_flight = SingleFlight()
+        # Optional in-memory copy of the metrics collections; None when disabled
+        self.replica = replica
+
+    async def _resident(self, user_id: int):
+        """The user's replica entry, or None to read metrics from Mongo"""
+        if self.replica is None:
+            return None
+        return await self.replica.get(user_id)
 
     def _get_db(self):
         """Get database instance"""
@@ -18,16 +63,197 @@ class AnalyticsService:
             self.db = get_database()
         return self.db
 
-    async def get_user_dashboard(self, user_id: int) -> Dict[str, Any]:
+    async def user_version(self, user_id: int) -> Optional[Tuple[Any, ...]]:
+        """Cheap version stamp of a user's analytics.
+
+        Combines the metrics version the workers bump on every snapshot with
+        the newest event time, which moves as soon as an event is stored.
+        Both lookups are served from indexes. With the dashboard read model
+        enabled, its version is used instead: a single primary-key read.
+        """
+        dashboard = await self._dashboard_document(user_id, {"_id": 0, "version": 1, "updated_at": 1})
+        if dashboard is not None:
+            # The workers bump the read model's version on every event and snapshot
+            return ("dashboard", dashboard.get("version"), dashboard.get("updated_at"))
+        db = self._get_db()
+        user_filter = user_id_filter(user_id)
+        latest_event_query = db.task_events.find_one(
+            {"user_id": user_filter},
+            {"_id": 0, "timestamp": 1},
+            sort=[("timestamp", -1)]
+        )
+        entry = await self._resident(user_id)
+        if entry is not None:
+            doc, latest_event = entry.user, await latest_event_query
+        else:
+            doc, latest_event = await asyncio.gather(
+                db.user_metrics.find_one(
+                    {"user_id": user_filter},
+                    {"_id": 0, "version": 1, "updated_at": 1}
+                ),
+                latest_event_query
+            )
+        if doc is None:
+            return None
+        return (doc.get("version"), doc.get("updated_at"), latest_event and latest_event.get("timestamp"))
+
+    @staticmethod
+    def etag(user_id: int, endpoint: str, params: Tuple[Hashable, ...], version: Optional[Tuple[Any, ...]]) -> Optional[str]:
+        """Strong ETag for a response, or None when there is no version to derive it from"""
+        if version is None:
+            return None
+        digest = hashlib.sha1(repr((user_id, endpoint, params, version)).encode()).hexdigest()
+        return f'"{digest}"'
+
+    async def _cached(
+        self,
+        user_id: int,
+        endpoint: str,
+        params: Tuple[Hashable, ...],
+        compute: Callable[[], Awaitable[Any]],
+        version: Optional[Tuple[Any, ...]] = None
+    ) -> Any:
+        """Serve ``compute()`` from the response cache while the user's version is unchanged"""
+        if version is None:
+            version = await self.user_version(user_id)
+        key = (user_id, endpoint, params)
+        if version is not None:
+            cached = self.cache.get(key, version)
+            if cached is not None:
+                return cached
+        if settings.SINGLE_FLIGHT_ENABLED:
+            # The version is part of the key: a caller that saw newer data does not join an older computation
+            result = await self.single_flight.do((key, version), compute, endpoint)
+        else:
+            result = await compute()
+        # Users without metrics have nothing to cache and no version to validate against
+        if version is not None and result is not None:
+            self.cache.set(key, version, result)
+        return result
+
+    # Each getter accepts the version a caller already looked up (e.g. to build
+    # an ETag) so that it is not fetched twice.
+
+    async def get_user_dashboard(self, user_id: int, version: Optional[Tuple[Any, ...]] = None) -> Dict[str, Any]:
         """Get dashboard metrics for a user"""
+        return await self._cached(
+            user_id, "dashboard", (), lambda: self._compute_user_dashboard(user_id), version
+        )
+
+    async def get_project_analytics(
+        self,
+        project_id: int,
+        user_id: int,
+        version: Optional[Tuple[Any, ...]] = None
+    ) -> Dict[str, Any]:
+        """Get analytics for a specific project"""
+        return await self._cached(
+            user_id, "project", (project_id,), lambda: self._compute_project_analytics(project_id, user_id), version
+        )
+
+    async def get_task_summary(self, user_id: int, version: Optional[Tuple[Any, ...]] = None) -> Dict[str, Any]:
+        """Get task summary for a user"""
+        return await self._cached(
+            user_id, "task_summary", (), lambda: self._compute_task_summary(user_id), version
+        )
+
+    @staticmethod
+    def productivity_params(days: int, tz: str) -> Tuple[str, int, str]:
+        """Cache/ETag parameters of a productivity window; raises ValueError for unknown zones"""
+        try:
+            zone = ZoneInfo(tz)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown time zone: {tz}")
+        # The window moves with the user's calendar, so entries are per local day
+        return (datetime.now(zone).date().isoformat(), days, zone.key)
+
+    async def get_productivity_insights(
+        self,
+        user_id: int,
+        days: int = 30,
+        tz: str = "UTC",
+        version: Optional[Tuple[Any, ...]] = None
+    ) -> Dict[str, Any]:
+        """Get productivity insights for a user over the last ``days`` days in time zone ``tz``"""
+        params = self.productivity_params(days, tz)
+        return await self._cached(
+            user_id, "productivity", params,
+            lambda: self._compute_productivity_insights(user_id, days, ZoneInfo(params[2])), version
+        )
+
+    async def _metrics_with_recent_events(
+        self,
+        user_id: int,
+        event_filter: Dict[str, Any],
+        limit: int
+    ) -> Optional[Dict[str, Any]]:
+        """Fetch a user's metrics and their latest matching task events in one round trip"""
         db = self._get_db()
-        
-        # Try with string user_id first (most likely format in MongoDB)
-        user_metrics = await db.user_metrics.find_one({"user_id": str(user_id)})
+        user_filter = user_id_filter(user_id)
+        entry = await self._resident(user_id)
+        if entry is not None:
+            # Metrics come from memory; only the events are read from Mongo
+            if entry.user is None:
+                return None
+            recent_events = await db.task_events.find(
+                {"user_id": user_filter, **event_filter}
+            ).sort("timestamp", -1).limit(limit).to_list(limit)
+            return {**entry.user, "recent_events": recent_events}
 
-        # If not found, try with integer user_id
-        if user_metrics is None:
-            user_metrics = await db.user_metrics.find_one({"user_id": user_id})
+        pipeline = [
+            {"$match": {"user_id": user_filter}},
+            {"$limit": 1},
+            {"$lookup": {
+                "from": "task_events",
+                "pipeline": [
+                    {"$match": {"user_id": user_filter, **event_filter}},
+                    {"$sort": {"timestamp": -1}},
+                    {"$limit": limit}
+                ],
+                "as": "recent_events"
+            }}
+        ]
+        docs = await db.user_metrics.aggregate(pipeline).to_list(1)
+        return docs[0] if docs else None
+
+    async def _dashboard_document(
+        self,
+        user_id: int,
+        projection: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """The user's document in the workers' read model, or None when it is disabled or missing"""
+        if not settings.DASHBOARD_READ_MODEL_ENABLED:
+            return None
+        return await self._get_db().user_dashboards.find_one({"_id": user_id}, projection)
+
+    async def _dashboard_with_metrics(
+        self,
+        user_id: int,
+        projection: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """The user's read model document, or None until a metrics snapshot has written its totals.
+
+        The ring buffers are flushed every batch, so a new user's document can
+        exist before the snapshot; serving it then would pair activity with zero totals.
+        """
+        dashboard = await self._dashboard_document(user_id, projection)
+        if dashboard is None or "total_tasks" not in dashboard:
+            return None
+        return dashboard
+
+    async def _compute_user_dashboard(self, user_id: int) -> Dict[str, Any]:
+        dashboard = await self._dashboard_with_metrics(user_id, {"_id": 0, "recent_completions": 0})
+        if dashboard is not None:
+            return {
+                "total_tasks": dashboard["total_tasks"],
+                "completed_tasks": dashboard.get("completed_tasks", 0),
+                "active_projects": dashboard.get("active_projects", 0),
+                "completion_rate": dashboard.get("completion_rate", 0.0),
+                # Kept newest first by the workers
+                "recent_activity": dashboard.get("recent_activity", [])
+            }
+
+        user_metrics = await self._metrics_with_recent_events(user_id, {}, 10)
         
         if user_metrics is None:
             return {
@@ -38,10 +264,7 @@ class AnalyticsService:
                 "recent_activity": []
             }
 
-        # Get recent activity (last 10 events) - try string user_id first
-        recent_events = await db.task_events.find(
-            {"user_id": str(user_id)}
-        ).sort("timestamp", -1).limit(10).to_list(10)
+        recent_events = user_metrics["recent_events"]
 
         recent_activity = [
             {
@@ -49,7 +272,7 @@ class AnalyticsService:
                 "event": event["event"],
                 "task_id": event["task_id"],
                 "project_id": event["project_id"],
-                "timestamp": event["timestamp"].isoformat()
+                "timestamp": event["timestamp"]
             }
             for event in recent_events
         ]
@@ -62,34 +285,26 @@ class AnalyticsService:
             "recent_activity": recent_activity
         }
 
-    async def get_project_analytics(self, project_id: int, user_id: int) -> Dict[str, Any]:
-        """Get analytics for a specific project"""
+    async def _compute_project_analytics(self, project_id: int, user_id: int) -> Dict[str, Any]:
         db = self._get_db()
         
-        # Get project metrics - use string user_id
-        project_metrics = await db.project_metrics.find_one({
-            "project_id": project_id,
-            "user_id": str(user_id)
-        })
+        # Get project metrics
+        entry = await self._resident(user_id)
+        if entry is not None:
+            project_metrics = entry.projects.get(project_id)
+        else:
+            project_metrics = await db.project_metrics.find_one({
+                "project_id": project_id,
+                "user_id": user_id_filter(user_id)
+            })
         
         if project_metrics is None:
             return None
 
-        # Get task events for timeline - use string user_id
-        task_events = await db.task_events.find(
-            {"project_id": project_id, "user_id": str(user_id)}
-        ).sort("timestamp", 1).to_list(100)
-
-        # Build timeline
-        timeline = [
-            {
-                "event_type": event["event"],
-                "task_id": event["task_id"],
-                "timestamp": event["timestamp"].isoformat(),
-                "task_title": event["title"]
-            }
-            for event in task_events
-        ]
+        # First page of the timeline; clients continue from timeline_next_cursor
+        timeline, next_cursor = await self._timeline_page(
+            project_id, user_id, None, settings.TIMELINE_PAGE_SIZE
+        )
 
         # Task distribution by status (simplified)
         task_distribution = {
@@ -105,14 +320,127 @@ class AnalyticsService:
             "completion_rate": project_metrics["completion_rate"],
             "avg_completion_time_hours": project_metrics.get("avg_completion_time_hours"),
             "task_distribution": task_distribution,
-            "timeline": timeline
+            "timeline": timeline,
+            "timeline_next_cursor": next_cursor
         }
 
-    async def get_task_summary(self, user_id: int) -> Dict[str, Any]:
-        """Get task summary for a user"""
+    async def _owns_project(self, project_id: int, user_id: int) -> bool:
+        entry = await self._resident(user_id)
+        if entry is not None:
+            return project_id in entry.projects
         db = self._get_db()
-        
-        user_metrics = await db.user_metrics.find_one({"user_id": str(user_id)})
+        doc = await db.project_metrics.find_one(
+            {"project_id": project_id, "user_id": user_id_filter(user_id)},
+            {"_id": 1}
+        )
+        return doc is not None
+
+    @staticmethod
+    def _timeline_entry(event: Dict[str, Any]) -> Dict[str, Any]:
+        # Datetimes stay as they are; the response encoder serializes them in one pass
+        return {
+            "event_type": event["event"],
+            "task_id": event["task_id"],
+            "timestamp": event["timestamp"],
+            "task_title": event["title"]
+        }
+
+    def _timeline_query(self, project_id: int, user_id: int, cursor: Optional[str] = None) -> Dict[str, Any]:
+        query = {"project_id": project_id, "user_id": user_id_filter(user_id)}
+        if cursor:
+            query.update(after_cursor(cursor))
+        return query
+
+    async def _timeline_page(
+        self,
+        project_id: int,
+        user_id: int,
+        cursor: Optional[str],
+        limit: int
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One keyset page of a project's timeline plus the cursor of the next page"""
+        db = self._get_db()
+        # Fetch one extra event to know whether another page follows
+        events = await db.task_events.find(
+            self._timeline_query(project_id, user_id, cursor),
+            {"event": 1, "task_id": 1, "timestamp": 1, "title": 1}
+        ).sort([("timestamp", 1), ("_id", 1)]).limit(limit + 1).to_list(limit + 1)
+
+        next_cursor = None
+        if len(events) > limit:
+            events = events[:limit]
+            next_cursor = encode_cursor(events[-1]["timestamp"], events[-1]["_id"])
+        return [self._timeline_entry(event) for event in events], next_cursor
+
+    async def get_project_timeline(
+        self,
+        project_id: int,
+        user_id: int,
+        cursor: Optional[str] = None,
+        limit: int = 100
+    ) -> Optional[Dict[str, Any]]:
+        """Page through a project's timeline in (timestamp, _id) order"""
+        # Validate the cursor before touching the database
+        if cursor:
+            after_cursor(cursor)
+        if not await self._owns_project(project_id, user_id):
+            return None
+        events, next_cursor = await self._timeline_page(project_id, user_id, cursor, limit)
+        return {"events": events, "next_cursor": next_cursor}
+
+    async def stream_project_timeline(
+        self,
+        project_id: int,
+        user_id: int,
+        batch_size: int
+    ) -> Optional[AsyncIterator[Dict[str, Any]]]:
+        """Iterator over a project's whole timeline, or None if the project is not the user's"""
+        if not await self._owns_project(project_id, user_id):
+            return None
+        db = self._get_db()
+        cursor = db.task_events.find(
+            self._timeline_query(project_id, user_id),
+            {"event": 1, "task_id": 1, "timestamp": 1, "title": 1}
+        ).sort([("timestamp", 1), ("_id", 1)]).batch_size(batch_size)
+
+        async def entries():
+            # Only one server batch is held in memory at a time
+            async for event in cursor:
+                yield self._timeline_entry(event)
+
+        return entries()
+
+    def export_task_events(
+        self,
+        query: Dict[str, Any],
+        fields: List[str],
+        batch_size: int
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Cursor over the task events matching ``query`` in ``_id`` order, with only ``fields`` projected"""
+        db = self._get_db()
+        # Exports are bulk reads; keep them off the primary when there is a secondary
+        collection = db.get_collection("task_events", read_preference=ReadPreference.SECONDARY_PREFERRED)
+        return collection.find(
+            query, {field: 1 for field in fields}
+        ).sort("_id", 1).hint(export_hint(query)).batch_size(batch_size)
+
+    async def _compute_task_summary(self, user_id: int) -> Dict[str, Any]:
+        dashboard = await self._dashboard_with_metrics(user_id, {"_id": 0, "recent_activity": 0})
+        if dashboard is not None:
+            total_tasks = dashboard["total_tasks"]
+            completed_tasks = dashboard.get("completed_tasks", 0)
+            return {
+                "total_tasks": total_tasks,
+                "completed_tasks": completed_tasks,
+                "pending_tasks": total_tasks - completed_tasks,
+                "completion_rate": dashboard.get("completion_rate", 0.0),
+                "tasks_by_status": {"completed": completed_tasks, "pending": total_tasks - completed_tasks},
+                "recent_completions": dashboard.get("recent_completions", [])
+            }
+
+        user_metrics = await self._metrics_with_recent_events(
+            user_id, {"status": "completed", "event": "task_updated"}, 5
+        )
         if user_metrics is None:
             return {
                 "total_tasks": 0,
@@ -124,18 +452,14 @@ class AnalyticsService:
             }
 
         pending_tasks = user_metrics["total_tasks"] - user_metrics["completed_tasks"]
-
-        # Get recent completions - use string user_id
-        recent_completions = await db.task_events.find(
-            {"user_id": str(user_id), "status": "completed", "event": "task_updated"}
-        ).sort("timestamp", -1).limit(5).to_list(5)
+        recent_completions = user_metrics["recent_events"]
 
         recent_completions_data = [
             {
                 "task_id": event["task_id"],
                 "project_id": event["project_id"],
                 "title": event["title"],
-                "completed_at": event["timestamp"].isoformat()
+                "completed_at": event["timestamp"]
             }
             for event in recent_completions
         ]
@@ -152,29 +476,181 @@ class AnalyticsService:
             "recent_completions": recent_completions_data
         }
 
-    async def get_productivity_insights(self, user_id: int) -> Dict[str, Any]:
-        """Get productivity insights for a user"""
+    async def get_activity(
+        self,
+        user_id: int,
+        start: datetime,
+        end: datetime,
+        bucket: str,
+        project_id: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Task activity per UTC ``bucket`` over [start, end), for the user or one of their projects.
+
+        Reads the worker's pre-aggregated task_event_windows, so the cost
+        grows with the number of windows in the range rather than with the
+        number of events. History before the windows and events beyond the
+        allowed lateness are only counted once scripts/backfill_windows.py
+        has run. Returns None if the user does not own the project; raises
+        ValueError for an unusable range or bucket.
+        """
+        start, end, starts = bucket_range(start, end, bucket, settings.ACTIVITY_MAX_BUCKETS)
+        if project_id is not None and not await self._owns_project(project_id, user_id):
+            return None
+
+        db = self._get_db()
+        result = await db.task_event_windows.aggregate(activity_pipeline({
+            "user_id": user_id_filter(user_id),
+            # Per-user windows carry project_id None
+            "project_id": project_id,
+            "granularity": BUCKETS[bucket],
+            "window_start": {"$gte": start, "$lt": end}
+        }, bucket)).to_list(1)
+        series, totals = build_series(starts, result[0] if result else {})
+        return {
+            "bucket": bucket,
+            "start": start,
+            "end": end,
+            "project_id": project_id,
+            "series": series,
+            "totals": totals
+        }
+
+    async def get_cycle_times(self, user_id: int, version: Optional[Tuple[Any, ...]] = None) -> Dict[str, Any]:
+        """Cycle-time percentiles of a user and each of their projects"""
+        return await self._cached(
+            user_id, "cycle_times", (), lambda: self._compute_cycle_times(user_id), version
+        )
+
+    async def _compute_cycle_times(self, user_id: int) -> Dict[str, Any]:
+        db = self._get_db()
+        user_filter = user_id_filter(user_id)
+        # The task worker keeps a t-digest per user and per project; no events are read
+        user, projects = await asyncio.gather(
+            db.user_metrics.find_one({"user_id": user_filter}, {"_id": 0, "cycle_time_digest": 1}),
+            db.project_metrics.find(
+                {"user_id": user_filter, "cycle_time_digest": {"$exists": True}},
+                {"_id": 0, "project_id": 1, "project_name": 1, "cycle_time_digest": 1}
+            ).to_list(None)
+        )
+        return {
+            **cycle_time_summary(_stored_digest(user)),
+            "projects": [
+                {
+                    "project_id": project["project_id"],
+                    "project_name": project.get("project_name"),
+                    **cycle_time_summary(_stored_digest(project))
+                }
+                for project in projects
+            ]
+        }
+
+    async def merge_cycle_times(self, project_ids: Optional[List[int]] = None) -> Dict[str, Any]:
+        """Cycle-time percentiles merged from the stored digests of ``project_ids``, or of every user"""
+        db = self._get_db()
+        projection = {"_id": 0, "cycle_time_digest": 1}
+        if project_ids:
+            cursor = db.project_metrics.find(
+                {"project_id": {"$in": project_ids}, "cycle_time_digest": {"$exists": True}}, projection
+            )
+        else:
+            cursor = db.user_metrics.find({"cycle_time_digest": {"$exists": True}}, projection)
+        merged = TDigest()
+        digests = 0
+        async for doc in cursor:
+            merged.merge(_stored_digest(doc))
+            digests += 1
+        return {"digests": digests, **cycle_time_summary(merged)}
+
+    async def count_distinct(
+        self,
+        metric: str,
+        first_day: date,
+        last_day: date,
+        scope: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Estimated distinct count over the UTC days ``first_day``..``last_day``.
+
+        Merges the daily sketch shards the task worker writes per partition;
+        the estimate is within ``relative_standard_error`` one time in three
+        and within ``low``..``high`` (two standard errors) 95% of the time.
+        """
+        if metric not in DISTINCT_METRICS:
+            raise ValueError(f"metric must be one of {', '.join(DISTINCT_METRICS)}")
+        if last_day < first_day:
+            raise ValueError("from must not be after to")
+        days = (last_day - first_day).days + 1
+        if days > settings.DISTINCT_MAX_DAYS:
+            raise ValueError(f"Range covers more than {settings.DISTINCT_MAX_DAYS} days")
+
+        db = self._get_db()
+        cursor = db.distinct_sketches.find(
+            {
+                "metric": metric,
+                "scope": scope,
+                "day": {"$gte": datetime.combine(first_day, time.min), "$lte": datetime.combine(last_day, time.min)}
+            },
+            {"_id": 0, "registers": 1}
+        )
+        merged: Optional[HyperLogLog] = None
+        sketches = 0
+        async for doc in cursor:
+            sketch = HyperLogLog.from_bytes(doc["registers"])
+            if merged is None:
+                merged = sketch
+            else:
+                merged.merge(sketch)
+            sketches += 1
+
+        result = {
+            "metric": metric,
+            "scope": scope,
+            "from": first_day,
+            "to": last_day,
+            "days": days,
+            "sketches": sketches,
+            "estimate": 0,
+            "relative_standard_error": None,
+            "low": 0,
+            "high": 0
+        }
+        if merged is not None:
+            estimate = merged.count()
+            error = merged.relative_error
+            result.update({
+                "estimate": estimate,
+                "relative_standard_error": round(error, 4),
+                "low": max(0, int(estimate * (1 - 2 * error))),
+                "high": int(estimate * (1 + 2 * error) + 0.5)
+            })
+        return result
+
+    async def _compute_productivity_insights(self, user_id: int, days: int, tz: ZoneInfo) -> Dict[str, Any]:
         db = self._get_db()
         
-        # Get task events from last 30 days
-        thirty_days_ago = datetime.now(timezone.utc) - timedelta(days=30)
+        # The window covers the last `days` calendar days in the user's time zone, today included
+        today = datetime.now(tz).date()
+        first_day = today - timedelta(days=days - 1)
+        window_start = datetime.combine(first_day, time.min, tzinfo=tz).astimezone(timezone.utc)
         
-        task_events = await db.task_events.find({
-            "user_id": str(user_id),
-            "timestamp": {"$gte": thirty_days_ago},
-            "event": "task_updated",
-            "status": "completed"
-        }).to_list(1000)
-
-        # Calculate daily completions
-        daily_completions = defaultdict(int)
-        for event in task_events:
-            date_key = event["timestamp"].strftime("%Y-%m-%d")
-            daily_completions[date_key] += 1
+        # Count completions per local day in Mongo; only the per-day counts come back
+        daily = await db.task_events.aggregate([
+            {"$match": {
+                "user_id": user_id_filter(user_id),
+                "event": "task_updated",
+                "status": "completed",
+                "timestamp": {"$gte": window_start}
+            }},
+            {"$group": {
+                "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp", "timezone": tz.key}},
+                "count": {"$sum": 1}
+            }},
+            {"$sort": {"_id": 1}}
+        ]).to_list(None)
+        daily_completions = {day["_id"]: day["count"] for day in daily}
 
         # Calculate weekly summary
-        total_completions = len(task_events)
-        avg_daily = total_completions / 30 if total_completions > 0 else 0
+        total_completions = sum(daily_completions.values())
+        avg_daily = total_completions / days if total_completions > 0 else 0
         
         # Simple productivity score (0-100)
         productivity_score = min(100, avg_daily * 20)  # Scale appropriately
@@ -189,7 +665,7 @@ class AnalyticsService:
             recommendations.append("Great job staying consistent!")
 
         return {
-            "daily_completions": dict(daily_completions),
+            "daily_completions": daily_completions,
             "weekly_summary": {
                 "total_completions": total_completions,
                 "avg_daily_completions": round(avg_daily, 2),
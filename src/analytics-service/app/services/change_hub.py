@@ -0,0 +1,164 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+import structlog
+from pymongo.errors import OperationFailure, PyMongoError
+from app.config import settings
+from app.database import get_database
+from app.models import coerce_user_id
+
+logger = structlog.get_logger()
+
+WATCHED_COLLECTIONS = ["user_metrics", "project_metrics"]
+
+# Returned by Mongo when change streams are unavailable (standalone server)
+CHANGE_STREAMS_UNSUPPORTED = {40573}
+# The resume token fell off the oplog
+CHANGE_STREAM_HISTORY_LOST = 286
+
+# (collection, operation, document); deletes only carry the document's _id
+Listener = Callable[[str, str, Dict[str, Any]], Awaitable[None]]
+
+
+class ChangeHub:
+    """One watcher per process over the metrics collections, fanned out in memory.
+
+    Connections subscribe to a user id and receive a wake-up whenever that
+    user's ``user_metrics`` or ``project_metrics`` change; listeners receive
+    every changed document. The watcher uses a change stream and keeps its
+    resume token across reconnects. On a standalone server, where change
+    streams do not exist, it falls back to polling ``updated_at``.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+        self._listeners: List[Listener] = []
+        self._reset_callbacks: List[Callable[[], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self.resume_token: Optional[Dict[str, Any]] = None
+        self.mode: Optional[str] = None
+        # Set while a change stream is open
+        self.watching = asyncio.Event()
+        self.changes = 0
+
+    @property
+    def connections(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        # A single pending wake-up is enough: the subscriber re-reads current state
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        queues = self._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+
+    def add_listener(self, listener: Listener, on_reset: Optional[Callable[[], None]] = None):
+        """Receive every change; ``on_reset`` is called when changes may have been missed"""
+        self._listeners.append(listener)
+        if on_reset is not None:
+            self._reset_callbacks.append(on_reset)
+
+    def _reset(self):
+        self.resume_token = None
+        for callback in self._reset_callbacks:
+            callback()
+
+    async def publish(self, collection: str, document: Dict[str, Any], operation: str = "update"):
+        """Deliver one changed document to the listeners and wake its user's subscribers"""
+        self.changes += 1
+        for listener in self._listeners:
+            try:
+                await listener(collection, operation, document)
+            except Exception as e:
+                logger.error("Change listener failed", error=str(e), exc_info=True)
+        for queue in self._subscribers.get(coerce_user_id(document.get("user_id")), ()):
+            if queue.empty():
+                queue.put_nowait(collection)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        mode = settings.LIVE_UPDATES_MODE
+        while True:
+            try:
+                if mode == "poll":
+                    self.mode = "poll"
+                    await self._poll()
+                else:
+                    await self._watch()
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if mode == "auto" and e.code in CHANGE_STREAMS_UNSUPPORTED:
+                    logger.warning("Change streams unavailable, polling metrics instead", error=str(e))
+                    mode = "poll"
+                    continue
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    self._reset()
+                logger.error("Metrics watcher failed", error=str(e))
+            except PyMongoError as e:
+                logger.error("Metrics watcher failed", error=str(e))
+            # Not watching until the stream is reopened
+            self.mode = None
+            self.watching.clear()
+            await asyncio.sleep(settings.LIVE_RETRY_SECONDS)
+
+    async def _watch(self):
+        db = get_database()
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": WATCHED_COLLECTIONS},
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]}
+        }}]
+        async with db.watch(pipeline, full_document="updateLookup", resume_after=self.resume_token) as stream:
+            self.mode = "change_stream"
+            self.watching.set()
+            logger.info("Watching metrics change stream", resumed=self.resume_token is not None)
+            async for change in stream:
+                self.resume_token = stream.resume_token
+                if change["operationType"] == "delete":
+                    await self.publish(change["ns"]["coll"], change["documentKey"], "delete")
+                    continue
+                document = change.get("fullDocument")
+                if document is not None:
+                    await self.publish(change["ns"]["coll"], document)
+
+    async def _poll(self):
+        db = get_database()
+        since = datetime.now(timezone.utc)
+        while True:
+            await asyncio.sleep(settings.LIVE_POLL_SECONDS)
+            polled_at = datetime.now(timezone.utc)
+            # Overlap the previous poll: updated_at is stamped on the workers' clocks
+            window = {"updated_at": {"$gt": since - timedelta(seconds=settings.LIVE_POLL_OVERLAP_SECONDS)}}
+            for collection in WATCHED_COLLECTIONS:
+                async for document in db[collection].find(window):
+                    await self.publish(collection, document)
+            since = polled_at
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "running": self._task is not None and not self._task.done(),
+            "connections": self.connections,
+            "users": len(self._subscribers),
+            "changes": self.changes,
+        }
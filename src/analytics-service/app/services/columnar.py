@@ -0,0 +1,428 @@
+import asyncio
+import fcntl
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+import structlog
+from bson import ObjectId
+from app.config import settings
+from app.database import get_database
+from app.models import coerce_user_id
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # The columnar mode is optional
+    pa = pc = ds = pq = None
+
+logger = structlog.get_logger()
+
+# Snapshotted collections and the columns kept of each
+SOURCES = {
+    "task_events": {
+        "event": "string",
+        "task_id": "int64",
+        "project_id": "int64",
+        "user_id": "int64",
+        "status": "string",
+        "timestamp": "timestamp",
+    },
+    "project_events": {
+        "event": "string",
+        "project_id": "int64",
+        "user_id": "int64",
+        "name": "string",
+        "timestamp": "timestamp",
+    },
+}
+
+STATE_FILE = "state.json"
+LOCK_FILE = "refresh.lock"
+TREND_BUCKETS = ("day", "week")
+
+
+def _schema(columns: Dict[str, str]):
+    types = {
+        "string": pa.string(),
+        "int64": pa.int64(),
+        "timestamp": pa.timestamp("ms", tz="UTC"),
+    }
+    return pa.schema([pa.field(name, types[kind]) for name, kind in columns.items()])
+
+
+def _utc(ts: datetime) -> datetime:
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(timezone.utc)
+
+
+def _renamed(table, names: Dict[str, str]):
+    return table.rename_columns([names.get(name, name) for name in table.column_names])
+
+
+def _rows(table, order_by: str, descending: bool = True) -> List[Dict[str, Any]]:
+    return table.sort_by([(order_by, "descending" if descending else "ascending")]).to_pylist()
+
+
+class ColumnarStore:
+    """Parquet snapshots of the event collections for scan-heavy reports.
+
+    ``refresh()`` appends the events inserted since the ingest watermark as
+    a new Parquet part per collection and advances the watermark. The
+    watermark is on insertion time (the ``_id`` timestamp) rather than event
+    time, so late events are still picked up, and it trails the clock by
+    ``COLUMNAR_INGEST_LAG_SECONDS`` so events still being inserted with
+    slightly older ids are not skipped. Parts are compacted once there are
+    more than ``COLUMNAR_MAX_PARTS``. With several server processes only
+    the one holding the refresh lock writes; the others reopen the parts
+    when the watermark moves. No process keeps the history in memory: each
+    report scans only the columns it needs from the parts, skipping row
+    groups outside its time range, with vectorized compute kernels, and
+    never touches Mongo.
+    """
+
+    def __init__(self, path: str):
+        if pa is None:
+            raise RuntimeError("COLUMNAR_ENABLED requires pyarrow")
+        self.path = path
+        self.datasets: Dict[str, Any] = {}
+        self.rows: Dict[str, int] = {}
+        self.state: Dict[str, Any] = {}
+        self._loaded_state: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _file(self, *parts: str) -> str:
+        return os.path.join(self.path, *parts)
+
+    def _read_state(self) -> Dict[str, Any]:
+        try:
+            with open(self._file(STATE_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_state(self, state: Dict[str, Any]):
+        tmp = self._file(STATE_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        # The state lists the parts; a part written before a crash but never listed is ignored
+        os.replace(tmp, self._file(STATE_FILE))
+
+    async def _run_blocking(self, fn: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def _ingest(self, collection: str, since: Optional[datetime], through: datetime) -> Optional[str]:
+        """Write the events inserted in [since, through) as a new part; returns its file name"""
+        schema = _schema(SOURCES[collection])
+        id_range: Dict[str, Any] = {"$lt": ObjectId.from_datetime(through)}
+        if since is not None:
+            id_range["$gte"] = ObjectId.from_datetime(since)
+        cursor = get_database()[collection].find(
+            {"_id": id_range}, {name: 1 for name in schema.names}
+        ).sort("_id", 1).batch_size(settings.COLUMNAR_BATCH_SIZE)
+
+        name = f"part-{int(through.timestamp())}.parquet"
+        tmp = self._file(collection, name + ".tmp")
+        writer = None
+        columns: Dict[str, List[Any]] = {field: [] for field in schema.names}
+
+        def write_batch():
+            nonlocal writer
+            if writer is None:
+                writer = pq.ParquetWriter(tmp, schema, compression="zstd")
+            writer.write_table(pa.table(
+                [pa.array(columns[field], type=schema.field(field).type) for field in schema.names], schema=schema
+            ))
+            for values in columns.values():
+                values.clear()
+
+        try:
+            async for doc in cursor:
+                for field in schema.names:
+                    columns[field].append(doc.get(field))
+                if "user_id" in columns:
+                    columns["user_id"][-1] = coerce_user_id(columns["user_id"][-1])
+                if len(columns["timestamp"]) >= settings.COLUMNAR_BATCH_SIZE:
+                    await self._run_blocking(write_batch)
+            if columns["timestamp"]:
+                await self._run_blocking(write_batch)
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            return None
+        os.replace(tmp, self._file(collection, name))
+        return name
+
+    def _compact(self, collection: str, parts: List[str]) -> List[str]:
+        """Rewrite ``parts`` as one file, a batch at a time; returns the new part list"""
+        name = f"compacted-{parts[-1]}"
+        tmp = self._file(collection, name + ".tmp")
+        with pq.ParquetWriter(tmp, _schema(SOURCES[collection]), compression="zstd") as writer:
+            for part in parts:
+                for batch in pq.ParquetFile(self._file(collection, part)).iter_batches(settings.COLUMNAR_BATCH_SIZE):
+                    writer.write_batch(batch)
+        os.replace(tmp, self._file(collection, name))
+        return [name]
+
+    async def refresh(self) -> Dict[str, Any]:
+        """Ingest new events if this process holds the refresh lock; then reload the tables if they moved"""
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file(LOCK_FILE), "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                writer = True
+            except BlockingIOError:
+                # Another process is the writer; the lock is released when its file closes
+                writer = False
+            if writer:
+                await self._refresh_locked()
+        await self._reload()
+        return self.stats()
+
+    async def _refresh_locked(self):
+        state = self._read_state()
+        # Whole seconds: ObjectId timestamps have second resolution
+        through = (datetime.now(timezone.utc) - timedelta(seconds=settings.COLUMNAR_INGEST_LAG_SECONDS)).replace(
+            microsecond=0
+        )
+        for collection in SOURCES:
+            os.makedirs(self._file(collection), exist_ok=True)
+            entry = state.get(collection, {"ingested_through": None, "parts": []})
+            # Other processes read the parts lazily and may scan the ones compacted
+            # away by the previous refresh until they reload, so those go only now
+            for name in entry.get("obsolete", []):
+                try:
+                    os.remove(self._file(collection, name))
+                except FileNotFoundError:
+                    pass
+            since = datetime.fromisoformat(entry["ingested_through"]) if entry["ingested_through"] else None
+            if since is not None and since >= through:
+                continue
+            part = await self._ingest(collection, since, through)
+            parts = entry["parts"] + ([part] if part else [])
+            if len(parts) > settings.COLUMNAR_MAX_PARTS:
+                compacted = await self._run_blocking(self._compact, collection, parts)
+                obsolete, parts = parts, compacted
+            else:
+                obsolete = []
+            state[collection] = {"ingested_through": through.isoformat(), "parts": parts, "obsolete": obsolete}
+            self._write_state(state)
+            logger.info("Columnar snapshot refreshed", collection=collection, through=through.isoformat(),
+                        new_part=part, parts=len(parts))
+
+    async def _reload(self):
+        state = self._read_state()
+        if state == self._loaded_state:
+            return
+
+        def load():
+            # Opening a dataset only reads the part footers; rows are read per report
+            datasets = {}
+            for collection, columns in SOURCES.items():
+                parts = state.get(collection, {}).get("parts", [])
+                schema = _schema(columns)
+                if parts:
+                    datasets[collection] = ds.dataset(
+                        [self._file(collection, part) for part in parts], schema=schema, format="parquet"
+                    )
+                else:
+                    datasets[collection] = ds.dataset(schema.empty_table())
+            return datasets, {collection: dataset.count_rows() for collection, dataset in datasets.items()}
+
+        self.datasets, self.rows = await self._run_blocking(load)
+        self.state = state
+        self._loaded_state = state
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.datasets)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "collections": {
+                collection: {
+                    "rows": self.rows.get(collection, 0),
+                    "ingested_through": self.state.get(collection, {}).get("ingested_through"),
+                    "parts": len(self.state.get(collection, {}).get("parts", [])),
+                }
+                for collection in SOURCES
+            },
+        }
+
+    # Reports; all of them run in the executor and scan the parts
+
+    def _task_events(
+        self,
+        columns: List[str],
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ):
+        """``columns`` of the task events in [start, end); the range prunes row groups by their statistics"""
+        dataset = self.datasets["task_events"]
+        ts_type = dataset.schema.field("timestamp").type
+        condition = None
+        if start is not None:
+            condition = pc.field("timestamp") >= pa.scalar(_utc(start), type=ts_type)
+        if end is not None:
+            before = pc.field("timestamp") < pa.scalar(_utc(end), type=ts_type)
+            condition = before if condition is None else condition & before
+        return dataset.to_table(columns=columns, filter=condition)
+
+    @staticmethod
+    def _with_flags(table):
+        created = pc.cast(pc.equal(table["event"], "task_created"), pa.int64())
+        completed = pc.cast(
+            pc.and_kleene(pc.equal(table["event"], "task_updated"), pc.equal(table["status"], "completed")),
+            pa.int64()
+        )
+        return table.append_column("created", pc.fill_null(created, 0)).append_column(
+            "completed", pc.fill_null(completed, 0)
+        )
+
+    def _trends(self, start: datetime, end: datetime, bucket: str) -> List[Dict[str, Any]]:
+        table = self._with_flags(self._task_events(
+            ["event", "status", "user_id", "project_id", "timestamp"], start, end
+        ))
+        table = table.append_column(
+            "bucket", pc.floor_temporal(table["timestamp"], unit=bucket, week_starts_monday=True)
+        )
+        grouped = table.group_by("bucket").aggregate([
+            ("event", "count"),
+            ("created", "sum"),
+            ("completed", "sum"),
+            ("user_id", "count_distinct"),
+            ("project_id", "count_distinct"),
+        ])
+        grouped = _renamed(grouped, {
+            "bucket": "start",
+            "event_count": "events",
+            "created_sum": "created",
+            "completed_sum": "completed",
+            "user_id_count_distinct": "active_users",
+            "project_id_count_distinct": "active_projects",
+        })
+        return _rows(grouped, "start", descending=False)
+
+    async def trends(self, start: datetime, end: datetime, bucket: str = "day") -> List[Dict[str, Any]]:
+        """Events, creations, completions and distinct active users and projects per day or week"""
+        if bucket not in TREND_BUCKETS:
+            raise ValueError(f"bucket must be one of {', '.join(TREND_BUCKETS)}")
+        if start >= end:
+            raise ValueError("from must be before to")
+        return await self._run_blocking(self._trends, start, end, bucket)
+
+    def _cohorts(self, weeks: int) -> List[Dict[str, Any]]:
+        table = self._task_events(["user_id", "timestamp"])
+        activity = table.select(["user_id"]).append_column(
+            "week", pc.floor_temporal(table["timestamp"], unit="week", week_starts_monday=True)
+        ).group_by(["user_id", "week"]).aggregate([])
+        first = _renamed(activity.group_by("user_id").aggregate([("week", "min")]), {"week_min": "cohort"})
+        joined = activity.join(first, "user_id")
+        offset = pc.divide(
+            pc.cast(pc.subtract(joined["week"], joined["cohort"]), pa.int64()),
+            7 * 24 * 3600 * 1000
+        )
+        joined = joined.append_column("offset", offset).filter(pc.field("offset") < weeks)
+        counts = joined.group_by(["cohort", "offset"]).aggregate([("user_id", "count")])
+
+        cohorts: Dict[datetime, List[int]] = {}
+        for row in counts.to_pylist():
+            cohorts.setdefault(row["cohort"], [0] * weeks)[row["offset"]] = row["user_id_count"]
+        return [
+            {
+                "cohort": cohort,
+                "users": active[0],
+                "active": active,
+                "retention": [round(count / active[0], 4) if active[0] else 0.0 for count in active],
+            }
+            for cohort, active in sorted(cohorts.items())
+        ]
+
+    async def cohorts(self, weeks: int = 12) -> List[Dict[str, Any]]:
+        """Weekly cohorts by first task event, with the users of each active in every following week"""
+        return await self._run_blocking(self._cohorts, weeks)
+
+    def _compare_projects(
+        self,
+        project_ids: Optional[List[int]],
+        start: Optional[datetime],
+        end: Optional[datetime],
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        table = self._with_flags(self._task_events(
+            ["event", "status", "task_id", "user_id", "project_id", "timestamp"], start, end
+        )).filter(pc.is_valid(pc.field("project_id")))
+        if project_ids:
+            table = table.filter(pc.is_in(table["project_id"], value_set=pa.array(project_ids, pa.int64())))
+        table = table.append_column("day", pc.floor_temporal(table["timestamp"], unit="day"))
+        grouped = table.group_by("project_id").aggregate([
+            ("event", "count"),
+            ("created", "sum"),
+            ("completed", "sum"),
+            ("task_id", "count_distinct"),
+            ("user_id", "count_distinct"),
+            ("day", "count_distinct"),
+            ("timestamp", "max"),
+        ])
+        grouped = _renamed(grouped, {
+            "event_count": "events",
+            "created_sum": "created",
+            "completed_sum": "completed",
+            "task_id_count_distinct": "tasks",
+            "user_id_count_distinct": "users",
+            "day_count_distinct": "active_days",
+            "timestamp_max": "last_activity",
+        })
+        rows = _rows(grouped, "completed")[:limit]
+
+        # Latest name of each project from the project events
+        projects = self.datasets["project_events"].to_table(
+            columns=["project_id", "name", "timestamp"],
+            filter=pc.is_valid(pc.field("name")) & pc.field("project_id").isin(
+                pa.array([row["project_id"] for row in rows], pa.int64())
+            )
+        )
+        names = {
+            row["project_id"]: row["name"]
+            for row in _rows(projects.select(["project_id", "name", "timestamp"]), "timestamp", descending=False)
+        }
+        for row in rows:
+            row["project_name"] = names.get(row["project_id"])
+            row["completion_ratio"] = round(row["completed"] / row["created"], 4) if row["created"] else None
+        return rows
+
+    async def compare_projects(
+        self,
+        project_ids: Optional[List[int]] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """Activity of projects side by side, most completions first"""
+        return await self._run_blocking(self._compare_projects, project_ids, start, end, limit)
+
+    async def run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error("Columnar refresh failed", error=str(e), exc_info=True)
+            await asyncio.sleep(settings.COLUMNAR_REFRESH_SECONDS)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,183 @@
+import io
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+from app.database import user_id_filter
+from app.models import coerce_user_id
+from app.responses import dumps
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow export is optional
+    pa = None
+
+# Exportable task_events fields and their Arrow types; _id is always exported
+# (as a hex string) because it is the resume cursor
+EXPORT_FIELDS = {
+    "event": "string",
+    "task_id": "int64",
+    "project_id": "int64",
+    "user_id": "int64",
+    "username": "string",
+    "title": "string",
+    "status": "string",
+    "timestamp": "timestamp",
+}
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+
+def export_fields(fields: Optional[List[str]]) -> List[str]:
+    """Requested fields in export order; raises ValueError for unknown ones"""
+    if not fields:
+        return list(EXPORT_FIELDS)
+    unknown = sorted(set(fields) - set(EXPORT_FIELDS))
+    if unknown:
+        raise ValueError(f"Unknown fields {', '.join(unknown)}; choose from {', '.join(EXPORT_FIELDS)}")
+    return [field for field in EXPORT_FIELDS if field in fields]
+
+
+def export_query(
+    user_id: Optional[int] = None,
+    project_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None
+) -> Dict[str, Any]:
+    """task_events filter of an export; ``cursor`` is the ``_id`` of the last event already received"""
+    query: Dict[str, Any] = {}
+    if user_id is not None:
+        query["user_id"] = user_id_filter(user_id)
+    if project_id is not None:
+        query["project_id"] = project_id
+    if start is not None or end is not None:
+        query["timestamp"] = {}
+        if start is not None:
+            query["timestamp"]["$gte"] = start
+        if end is not None:
+            query["timestamp"]["$lt"] = end
+    if cursor:
+        try:
+            query["_id"] = {"$gt": ObjectId(cursor)}
+        except (InvalidId, TypeError):
+            raise ValueError("Invalid cursor")
+    return query
+
+
+def export_hint(query: Dict[str, Any]) -> List[Any]:
+    """Index that walks the matching events in _id order, so the server never sorts in memory"""
+    if "user_id" in query:
+        return [("user_id", 1), ("_id", 1)]
+    if "project_id" in query:
+        return [("project_id", 1), ("_id", 1)]
+    return [("_id", 1)]
+
+
+def _row(doc: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    row = {"_id": str(doc["_id"])}
+    for field in fields:
+        row[field] = doc.get(field)
+    return row
+
+
+async def ndjson_chunks(
+    docs: AsyncIterator[Dict[str, Any]],
+    fields: List[str],
+    batch_size: int,
+    compress: bool = True
+) -> AsyncIterator[bytes]:
+    """NDJSON of ``docs``, gzip-compressed unless ``compress`` is False, one chunk per batch"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    lines: List[bytes] = []
+
+    def chunk() -> bytes:
+        data = b"".join(lines)
+        lines.clear()
+        return compressor.compress(data) if compressor else data
+
+    async for doc in docs:
+        lines.append(dumps(_row(doc, fields)) + b"\n")
+        if len(lines) >= batch_size:
+            data = chunk()
+            if data:
+                yield data
+    data = chunk()
+    if compressor:
+        data += compressor.flush()
+    if data:
+        yield data
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write target of the Arrow stream writer, drained after every batch"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _arrow_schema(fields: List[str]):
+    types = {
+        "string": pa.string(),
+        "int64": pa.int64(),
+        "timestamp": pa.timestamp("ms", tz="UTC"),
+    }
+    return pa.schema(
+        [pa.field("_id", pa.string(), nullable=False)]
+        + [pa.field(field, types[EXPORT_FIELDS[field]]) for field in fields]
+    )
+
+
+async def arrow_chunks(
+    docs: AsyncIterator[Dict[str, Any]],
+    fields: List[str],
+    batch_size: int,
+    compress: bool = True
+) -> AsyncIterator[bytes]:
+    """Arrow IPC stream of ``docs``, one record batch per ``batch_size`` events (zstd buffers unless disabled)"""
+    if pa is None:
+        raise RuntimeError("Arrow export requires pyarrow")
+    schema = _arrow_schema(fields)
+    sink = _ChunkSink()
+    options = pa.ipc.IpcWriteOptions(compression="zstd" if compress else None)
+    writer = pa.ipc.new_stream(sink, schema, options=options)
+    columns: Dict[str, List[Any]] = {name: [] for name in schema.names}
+
+    def write_batch():
+        writer.write_batch(pa.record_batch(
+            [pa.array(columns[name], type=schema.field(name).type) for name in schema.names], schema=schema
+        ))
+        for values in columns.values():
+            values.clear()
+
+    async for doc in docs:
+        row = _row(doc, fields)
+        if "user_id" in row:
+            row["user_id"] = coerce_user_id(row["user_id"])
+        for name in schema.names:
+            columns[name].append(row[name])
+        if len(columns["_id"]) >= batch_size:
+            write_batch()
+            yield sink.drain()
+    if columns["_id"]:
+        write_batch()
+    writer.close()
+    data = sink.drain()
+    if data:
+        yield data
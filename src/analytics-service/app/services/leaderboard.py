@@ -0,0 +1,233 @@
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+import structlog
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.config import settings
+from app.database import get_database
+
+logger = structlog.get_logger()
+
+USER_VIEW = "leaderboard_users"
+PROJECT_VIEW = "leaderboard_projects"
+TOTALS_VIEW = "platform_totals"
+VIEW_STATE = "materialized_view_state"
+# Document in VIEW_STATE naming the one process allowed to refresh
+REFRESH_LEASE = "leaderboard_refresh_lease"
+
+# Sort keys an admin can rank by; each has a descending index on the views
+RANKINGS = ("completed_tasks", "completion_rate", "last_activity")
+
+
+def _isoformat_dates(doc: Dict[str, Any]) -> Dict[str, Any]:
+    for field in ("last_activity", "refreshed_at"):
+        if isinstance(doc.get(field), datetime):
+            doc[field] = doc[field].isoformat()
+    return doc
+
+
+class LeaderboardService:
+    """Cross-user rankings served from materialized views.
+
+    ``refresh()`` merges the ``user_metrics``/``project_metrics`` documents
+    updated since the previous run into compact view collections with
+    ``$merge``, then recomputes the platform totals from those views. Reads
+    only ever touch the views, through their ranking indexes.
+
+    Every API process runs the scheduler, but only the holder of a lease
+    document refreshes: a full refresh deletes the rows it did not rewrite,
+    which would drop rows another process merged concurrently.
+    """
+
+    def __init__(self):
+        self.db = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_full_refresh: Optional[datetime] = None
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def _get_db(self):
+        """Get database instance"""
+        if self.db is None:
+            self.db = get_database()
+        return self.db
+
+    async def create_indexes(self):
+        db = self._get_db()
+        # $merge requires a unique index on its "on" fields
+        await db[USER_VIEW].create_index([("user_id", 1)], unique=True)
+        await db[PROJECT_VIEW].create_index([("project_id", 1), ("user_id", 1)], unique=True)
+        for field in RANKINGS:
+            await db[USER_VIEW].create_index([(field, -1)])
+            await db[PROJECT_VIEW].create_index([(field, -1)])
+
+    async def hold_lease(self) -> bool:
+        """Take or renew the refresh lease; False while another process holds it"""
+        db = self._get_db()
+        now = datetime.now(timezone.utc)
+        try:
+            await db[VIEW_STATE].find_one_and_update(
+                {"_id": REFRESH_LEASE, "$or": [{"holder": self.holder}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"holder": self.holder, "expires_at": now + timedelta(seconds=settings.LEADERBOARD_LEASE_SECONDS)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # The lease exists and is held by a live process
+            return False
+        return True
+
+    async def refresh(self, full: bool = False) -> Dict[str, Any]:
+        """Merge changed metrics into the views and recompute the platform totals.
+
+        Raises RuntimeError when another process holds the refresh lease.
+        """
+        if not await self.hold_lease():
+            raise RuntimeError("Another process is refreshing the leaderboards")
+        db = self._get_db()
+        started = datetime.now(timezone.utc)
+        state = await db[VIEW_STATE].find_one({"_id": USER_VIEW}) or {}
+        since = None
+        if not full and state.get("refreshed_through"):
+            # Overlap the previous run: snapshots stamp updated_at on the workers' clocks
+            since = state["refreshed_through"] - timedelta(seconds=settings.LEADERBOARD_REFRESH_OVERLAP_SECONDS)
+
+        await db.user_metrics.aggregate(self._user_pipeline(since, started)).to_list(None)
+        await db.project_metrics.aggregate(self._project_pipeline(since, started)).to_list(None)
+        # A run that outlived its lease must not delete what the new holder merged
+        if full and await self.hold_lease():
+            # Incremental runs never see deleted sources; a full run drops what it did not rewrite
+            await db[USER_VIEW].delete_many({"refreshed_at": {"$lt": started}})
+            await db[PROJECT_VIEW].delete_many({"refreshed_at": {"$lt": started}})
+        await db[USER_VIEW].aggregate(self._totals_pipeline(started)).to_list(None)
+
+        await db[VIEW_STATE].update_one(
+            {"_id": USER_VIEW}, {"$set": {"refreshed_through": started}}, upsert=True
+        )
+        elapsed = (datetime.now(timezone.utc) - started).total_seconds()
+        logger.info("Leaderboards refreshed", full=full, since=since.isoformat() if since else None, seconds=elapsed)
+        return {"full": full, "refreshed_through": started, "seconds": elapsed}
+
+    @staticmethod
+    def _changed_since(since: Optional[datetime]) -> List[Dict[str, Any]]:
+        return [{"$match": {"updated_at": {"$gte": since}}}] if since else []
+
+    def _user_pipeline(self, since: Optional[datetime], started: datetime) -> List[Dict[str, Any]]:
+        return self._changed_since(since) + [
+            {"$project": {
+                "_id": 0,
+                "user_id": 1,
+                "username": 1,
+                "total_tasks": {"$ifNull": ["$total_tasks", 0]},
+                "completed_tasks": {"$ifNull": ["$completed_tasks", 0]},
+                "completion_rate": {"$ifNull": ["$completion_rate", 0.0]},
+                "active_projects": {"$ifNull": ["$active_projects", 0]},
+                "last_activity": 1,
+                "refreshed_at": {"$literal": started}
+            }},
+            {"$merge": {"into": USER_VIEW, "on": "user_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+        ]
+
+    def _project_pipeline(self, since: Optional[datetime], started: datetime) -> List[Dict[str, Any]]:
+        return self._changed_since(since) + [
+            {"$project": {
+                "_id": 0,
+                "project_id": 1,
+                "user_id": 1,
+                "username": 1,
+                "project_name": 1,
+                "total_tasks": {"$ifNull": ["$total_tasks", 0]},
+                "completed_tasks": {"$ifNull": ["$completed_tasks", 0]},
+                "completion_rate": {"$ifNull": ["$completion_rate", 0.0]},
+                "last_activity": 1,
+                "refreshed_at": {"$literal": started}
+            }},
+            {"$merge": {
+                "into": PROJECT_VIEW,
+                "on": ["project_id", "user_id"],
+                "whenMatched": "replace",
+                "whenNotMatched": "insert"
+            }}
+        ]
+
+    @staticmethod
+    def _totals_pipeline(started: datetime) -> List[Dict[str, Any]]:
+        # Runs over the compact user view, never over the source collections
+        return [
+            {"$group": {
+                "_id": "platform",
+                "users": {"$sum": 1},
+                "total_tasks": {"$sum": "$total_tasks"},
+                "completed_tasks": {"$sum": "$completed_tasks"},
+                "active_projects": {"$sum": "$active_projects"},
+                "last_activity": {"$max": "$last_activity"}
+            }},
+            {"$set": {
+                "completion_rate": {"$cond": [
+                    {"$gt": ["$total_tasks", 0]},
+                    {"$divide": ["$completed_tasks", "$total_tasks"]},
+                    0.0
+                ]},
+                "refreshed_at": {"$literal": started}
+            }},
+            {"$merge": {"into": TOTALS_VIEW, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+        ]
+
+    async def top_users(self, by: str, limit: int) -> List[Dict[str, Any]]:
+        return await self._top(USER_VIEW, by, limit)
+
+    async def top_projects(self, by: str, limit: int) -> List[Dict[str, Any]]:
+        return await self._top(PROJECT_VIEW, by, limit)
+
+    async def _top(self, view: str, by: str, limit: int) -> List[Dict[str, Any]]:
+        if by not in RANKINGS:
+            raise ValueError(f"by must be one of {', '.join(RANKINGS)}")
+        query: Dict[str, Any] = {}
+        if by == "completion_rate":
+            # A single completed task is not a 100% completion rate worth ranking
+            query["total_tasks"] = {"$gte": settings.LEADERBOARD_MIN_TASKS}
+        db = self._get_db()
+        docs = await db[view].find(query, {"_id": 0}).sort(by, -1).limit(limit).to_list(limit)
+        return [_isoformat_dates(doc) for doc in docs]
+
+    async def totals(self) -> Optional[Dict[str, Any]]:
+        db = self._get_db()
+        doc = await db[TOTALS_VIEW].find_one({"_id": "platform"}, {"_id": 0})
+        return _isoformat_dates(doc) if doc is not None else None
+
+    async def run(self):
+        """Refresh on a schedule; a full refresh every LEADERBOARD_FULL_REFRESH_SECONDS reconciles deletes"""
+        await self.create_indexes()
+        while True:
+            now = datetime.now(timezone.utc)
+            full = (
+                self._last_full_refresh is None
+                or (now - self._last_full_refresh).total_seconds() >= settings.LEADERBOARD_FULL_REFRESH_SECONDS
+            )
+            try:
+                if await self.hold_lease():
+                    await self.refresh(full=full)
+                    if full:
+                        self._last_full_refresh = now
+                else:
+                    # A process that takes over later starts with a full refresh
+                    self._last_full_refresh = None
+            except Exception as e:
+                logger.error("Leaderboard refresh failed", error=str(e), exc_info=True)
+            await asyncio.sleep(settings.LEADERBOARD_REFRESH_SECONDS)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
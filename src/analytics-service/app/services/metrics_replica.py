@@ -0,0 +1,192 @@
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import structlog
+from app.database import get_database, user_id_filter
+from app.models import coerce_user_id
+from app.services.change_hub import ChangeHub
+
+logger = structlog.get_logger()
+
+USER_FIELDS = {
+    "_id": 1, "user_id": 1, "username": 1, "total_tasks": 1, "completed_tasks": 1, "active_projects": 1,
+    "completion_rate": 1, "avg_completion_time_hours": 1, "last_activity": 1, "version": 1, "updated_at": 1,
+}
+PROJECT_FIELDS = {
+    "_id": 1, "project_id": 1, "user_id": 1, "username": 1, "project_name": 1, "total_tasks": 1,
+    "completed_tasks": 1, "completion_rate": 1, "avg_completion_time_hours": 1, "last_activity": 1,
+    "updated_at": 1,
+}
+
+
+def _newer(incoming: Dict[str, Any], current: Optional[Dict[str, Any]]) -> bool:
+    if current is None or incoming.get("updated_at") is None or current.get("updated_at") is None:
+        return True
+    return incoming["updated_at"] >= current["updated_at"]
+
+
+class _Entry:
+    __slots__ = ("user", "projects")
+
+    def __init__(self):
+        self.user: Optional[Dict[str, Any]] = None
+        self.projects: Dict[int, Dict[str, Any]] = {}
+
+
+class MetricsReplica:
+    """In-process copy of ``user_metrics``/``project_metrics`` for recently active users.
+
+    Entries are complete per user (the metrics document and all of its
+    projects) and are kept current by the process's ``ChangeHub``. Users are
+    loaded on first read and evicted least-recently-used beyond
+    ``max_users``; concurrent reads of a user being loaded wait for that
+    load, so a half-built entry is never served. Reads are only served while the hub is on a change stream:
+    polling cannot observe deletes, so the replica steps aside in that mode.
+    """
+
+    def __init__(self, hub: ChangeHub, max_users: int):
+        self.hub = hub
+        self.max_users = max_users
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        # Document _id -> user_id, to route deletes that only carry the _id
+        self._owners: Dict[Any, int] = {}
+        # Loads in flight, and the entries they build (changes are folded into those too)
+        self._loading: Dict[int, "asyncio.Future[_Entry]"] = {}
+        self._building: Dict[int, _Entry] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        hub.add_listener(self.apply, on_reset=self.clear)
+
+    @property
+    def serving(self) -> bool:
+        return self.hub.mode == "change_stream"
+
+    def clear(self):
+        self._entries.clear()
+        self._owners.clear()
+        # Loads in flight may have missed changes: they serve their caller but are not kept
+        self._building.clear()
+        logger.warning("Metrics replica cleared; users reload on next read")
+
+    async def bootstrap(self):
+        """Load the most recently active users, up to ``max_users``"""
+        db = get_database()
+        users = await db.user_metrics.find({}, USER_FIELDS).sort("last_activity", -1).limit(self.max_users).to_list(None)
+        for user in users:
+            entry = _Entry()
+            self._put_user(entry, user)
+            self._insert(coerce_user_id(user["user_id"]), entry)
+        batch_size = 1000
+        for i in range(0, len(users), batch_size):
+            ids = [user["user_id"] for user in users[i:i + batch_size]]
+            async for project in db.project_metrics.find({"user_id": {"$in": ids}}, PROJECT_FIELDS):
+                self._put_project(project)
+        logger.info("Metrics replica bootstrapped", users=len(self._entries))
+
+    def _entry(self, user_id: int) -> Optional[_Entry]:
+        """Entry that changes to ``user_id`` are folded into: resident, or being loaded"""
+        entry = self._entries.get(user_id)
+        return entry if entry is not None else self._building.get(user_id)
+
+    def _insert(self, user_id: int, entry: _Entry):
+        self._entries[user_id] = entry
+        while len(self._entries) > self.max_users:
+            _, evicted = self._entries.popitem(last=False)
+            if evicted.user is not None:
+                self._owners.pop(evicted.user["_id"], None)
+            for project in evicted.projects.values():
+                self._owners.pop(project["_id"], None)
+            self.evictions += 1
+
+    def _put_user(self, entry: _Entry, user: Dict[str, Any]):
+        if _newer(user, entry.user):
+            entry.user = user
+            self._owners[user["_id"]] = coerce_user_id(user["user_id"])
+
+    def _put_project(self, project: Dict[str, Any]):
+        user_id = coerce_user_id(project["user_id"])
+        entry = self._entry(user_id)
+        if entry is None:
+            return
+        current = entry.projects.get(project["project_id"])
+        if _newer(project, current):
+            entry.projects[project["project_id"]] = project
+            self._owners[project["_id"]] = user_id
+
+    async def apply(self, collection: str, operation: str, document: Dict[str, Any]):
+        """ChangeHub listener: fold one change into the entries that are resident"""
+        if operation == "delete":
+            user_id = self._owners.pop(document["_id"], None)
+            entry = self._entry(user_id) if user_id is not None else None
+            if entry is None:
+                return
+            if collection == "user_metrics":
+                entry.user = None
+            elif collection == "project_metrics":
+                entry.projects = {
+                    pid: project for pid, project in entry.projects.items() if project["_id"] != document["_id"]
+                }
+            return
+
+        if collection == "user_metrics":
+            entry = self._entry(coerce_user_id(document.get("user_id")))
+            if entry is not None:
+                self._put_user(entry, {field: document.get(field) for field in USER_FIELDS})
+        elif collection == "project_metrics":
+            self._put_project({field: document.get(field) for field in PROJECT_FIELDS})
+
+    async def _load(self, user_id: int) -> _Entry:
+        """Load a user and make them resident; changes arriving meanwhile are merged by updated_at"""
+        entry = self._building[user_id] = _Entry()
+        try:
+            db = get_database()
+            user = await db.user_metrics.find_one({"user_id": user_id_filter(user_id)}, USER_FIELDS)
+            if user is not None:
+                self._put_user(entry, user)
+            async for project in db.project_metrics.find({"user_id": user_id_filter(user_id)}, PROJECT_FIELDS):
+                self._put_project(project)
+        finally:
+            kept = self._building.pop(user_id, None) is entry
+        if kept:
+            self._insert(user_id, entry)
+        return entry
+
+    async def get(self, user_id: int) -> Optional[_Entry]:
+        """The user's resident entry (loading it on a miss), or None when not serving.
+
+        A resident entry whose ``user`` is None means the user has no metrics.
+        """
+        if not self.serving:
+            return None
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry
+        self.misses += 1
+        loading = self._loading.get(user_id)
+        if loading is None:
+            loading = self._loading[user_id] = asyncio.ensure_future(self._load(user_id))
+            loading.add_done_callback(lambda future: self._loaded(user_id, future))
+        # A caller that goes away does not cancel the load the others wait for
+        return await asyncio.shield(loading)
+
+    def _loaded(self, user_id: int, future: "asyncio.Future[_Entry]"):
+        self._loading.pop(user_id, None)
+        if not future.cancelled():
+            # Retrieved here too, in case every waiter went away before it failed
+            future.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "serving": self.serving,
+            "users": len(self._entries),
+            "documents": len(self._owners),
+            "max_users": self.max_users,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
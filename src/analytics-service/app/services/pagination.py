@@ -0,0 +1,31 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+
+
+def encode_cursor(timestamp: datetime, object_id: ObjectId) -> str:
+    """Opaque token for the position just after the document (timestamp, _id)"""
+    payload = json.dumps({"t": timestamp.isoformat(), "id": str(object_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[datetime, ObjectId]:
+    """Inverse of ``encode_cursor``; raises ValueError for tokens it did not produce"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["t"]), ObjectId(payload["id"])
+    except (ValueError, TypeError, KeyError, InvalidId):
+        raise ValueError("Invalid cursor")
+
+
+def after_cursor(token: str) -> Dict[str, Any]:
+    """Keyset filter for documents sorted by (timestamp, _id) ascending that follow ``token``"""
+    timestamp, object_id = decode_cursor(token)
+    return {"$or": [
+        {"timestamp": {"$gt": timestamp}},
+        {"timestamp": timestamp, "_id": {"$gt": object_id}}
+    ]}
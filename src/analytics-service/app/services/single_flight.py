@@ -0,0 +1,53 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+from app.instrumentation import SINGLE_FLIGHT_CALLS
+
+
+class SingleFlight:
+    """Runs concurrent calls with the same key once and shares the outcome.
+
+    The first caller of a key starts the computation as a task; callers that
+    arrive while it is running await the same task instead of starting their
+    own, and all of them get its result or its exception. The key is
+    released as soon as the task finishes, so nothing is cached here. A
+    caller that is cancelled (its client went away) stops waiting without
+    cancelling the computation the others are waiting for.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.collapsed = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, compute: Callable[[], Awaitable[Any]], label: str = "") -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._release(key, done))
+            self.leaders += 1
+            SINGLE_FLIGHT_CALLS.labels(label, "leader").inc()
+        else:
+            self.collapsed += 1
+            SINGLE_FLIGHT_CALLS.labels(label, "collapsed").inc()
+        return await asyncio.shield(task)
+
+    def _release(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even when every caller stopped waiting
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        calls = self.leaders + self.collapsed
+        return {
+            "in_flight": self.in_flight,
+            "leaders": self.leaders,
+            "collapsed": self.collapsed,
+            "collapse_rate": round(self.collapsed / calls, 4) if calls else 0.0,
+        }
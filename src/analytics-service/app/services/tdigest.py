@@ -0,0 +1,123 @@
+import base64
+import math
+import struct
+from typing import List, Optional, Tuple
+
+# version, compression, min, max, centroid count
+_HEADER = struct.Struct("<BHddI")
+# mean, weight; float32 keeps a digest of ~100 centroids under 1 KB
+_CENTROID = struct.Struct("<ff")
+_FORMAT_VERSION = 1
+
+
+class TDigest:
+    """Mergeable quantile sketch (merging t-digest with the k1 scale function).
+
+    Centroids near the tails stay small, so extreme quantiles are accurate
+    while the digest stays bounded at roughly ``compression`` centroids
+    however many values it has seen. Two digests merge by pooling their
+    centroids and compressing again.
+    """
+
+    def __init__(self, compression: int = 100):
+        self.compression = compression
+        self.centroids: List[Tuple[float, float]] = []
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer: List[Tuple[float, float]] = []
+
+    @property
+    def count(self) -> float:
+        return sum(weight for _, weight in self.centroids) + sum(weight for _, weight in self._buffer)
+
+    @property
+    def mean(self) -> Optional[float]:
+        points = self.centroids + self._buffer
+        total = sum(weight for _, weight in points)
+        return sum(mean * weight for mean, weight in points) / total if total else None
+
+    def add(self, value: float, weight: float = 1.0):
+        self._buffer.append((value, weight))
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self._buffer) >= self.compression * 5:
+            self._compress()
+
+    def merge(self, other: "TDigest"):
+        self._buffer.extend(other.centroids)
+        self._buffer.extend(other._buffer)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if len(self._buffer) >= self.compression * 5:
+            self._compress()
+
+    def _k(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+    def _compress(self):
+        points = sorted(self.centroids + self._buffer)
+        self._buffer = []
+        if not points:
+            return
+        total = sum(weight for _, weight in points)
+        merged = []
+        so_far = 0.0
+        mean, weight = points[0]
+        k_lower = self._k(0.0)
+        for point_mean, point_weight in points[1:]:
+            if self._k((so_far + weight + point_weight) / total) - k_lower <= 1:
+                weight += point_weight
+                mean += (point_mean - mean) * point_weight / weight
+            else:
+                merged.append((mean, weight))
+                so_far += weight
+                k_lower = self._k(so_far / total)
+                mean, weight = point_mean, point_weight
+        merged.append((mean, weight))
+        self.centroids = merged
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self._buffer:
+            self._compress()
+        if not self.centroids:
+            return None
+        total = self.count
+        target = q * total
+        # Interpolate between centroid centres, anchored at the exact min and max
+        points = [(0.0, self.min)]
+        cumulative = 0.0
+        for mean, weight in self.centroids:
+            points.append((cumulative + weight / 2, mean))
+            cumulative += weight
+        points.append((total, self.max))
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            if target <= x1:
+                if x1 == x0:
+                    return y1
+                return y0 + (y1 - y0) * (target - x0) / (x1 - x0)
+        return self.max
+
+    def to_bytes(self) -> bytes:
+        if self._buffer:
+            self._compress()
+        header = _HEADER.pack(_FORMAT_VERSION, self.compression, self.min, self.max, len(self.centroids))
+        return header + b"".join(_CENTROID.pack(mean, weight) for mean, weight in self.centroids)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TDigest":
+        version, compression, minimum, maximum, count = _HEADER.unpack_from(data)
+        if version != _FORMAT_VERSION:
+            raise ValueError(f"Unsupported t-digest format {version}")
+        digest = cls(compression)
+        digest.min, digest.max = minimum, maximum
+        digest.centroids = [
+            _CENTROID.unpack_from(data, _HEADER.size + i * _CENTROID.size) for i in range(count)
+        ]
+        return digest
+
+    def to_base64(self) -> str:
+        return base64.b64encode(self.to_bytes()).decode()
+
+    @classmethod
+    def from_base64(cls, data: Optional[str], compression: int = 100) -> "TDigest":
+        return cls.from_bytes(base64.b64decode(data)) if data else cls(compression)
@@ -0,0 +1,94 @@
+"""Compare dashboard/summary read latency: two queries vs one $lookup aggregation.
+
+Run against a database prepared with ``benchmarks.seed``:
+    MONGODB_URL=mongodb://localhost:27017 python -m benchmarks.bench_dashboard --requests 2000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.config import settings
+from app.database import mongodb
+from app.services.analytics_service import AnalyticsService
+
+
+async def two_round_trips(db, user_id: int, event_filter: dict, limit: int):
+    """The previous read path: metrics document, then a separate events query."""
+    metrics = await db.user_metrics.find_one({"user_id": user_id})
+    events = await db.task_events.find(
+        {"user_id": user_id, **event_filter}
+    ).sort("timestamp", -1).limit(limit).to_list(limit)
+    return metrics, events
+
+
+async def one_round_trip(service: AnalyticsService, user_id: int, event_filter: dict, limit: int):
+    return await service._metrics_with_recent_events(user_id, event_filter, limit)
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]
+    return {
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p50_ms": round(pick(0.50), 3),
+        "p95_ms": round(pick(0.95), 3),
+        "p99_ms": round(pick(0.99), 3),
+    }
+
+
+async def measure(name, call, user_ids, concurrency):
+    samples = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(user_id):
+        async with semaphore:
+            started = time.perf_counter()
+            await call(user_id)
+            samples.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(user_id) for user_id in user_ids))
+    elapsed = time.perf_counter() - started
+    print(name, percentiles(samples), f"throughput={len(samples) / elapsed:.0f}/s")
+
+
+async def run(requests: int, users: int, concurrency: int):
+    mongodb.client = AsyncIOMotorClient(settings.MONGODB_URL)
+    mongodb.database = mongodb.client[settings.DATABASE_NAME]
+    db = mongodb.database
+    service = AnalyticsService()
+    user_ids = [random.randint(1, users) for _ in range(requests)]
+    cases = {
+        "dashboard": ({}, 10),
+        "summary": ({"status": "completed", "event": "task_updated"}, 5),
+    }
+    for case, (event_filter, limit) in cases.items():
+        # Warm up the connection pool and the working set before measuring
+        for user_id in user_ids[:50]:
+            await two_round_trips(db, user_id, event_filter, limit)
+        await measure(
+            f"{case} before (find_one + find)",
+            lambda user_id: two_round_trips(db, user_id, event_filter, limit),
+            user_ids, concurrency,
+        )
+        await measure(
+            f"{case} after ($lookup aggregate)",
+            lambda user_id: one_round_trip(service, user_id, event_filter, limit),
+            user_ids, concurrency,
+        )
+    mongodb.client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=1000, help="Number of seeded users to sample from")
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.users, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
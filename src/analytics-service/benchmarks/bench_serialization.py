@@ -0,0 +1,103 @@
+"""Requests/sec on GET /analytics/projects/{id}: model validation + stdlib JSON vs the orjson path.
+
+Runs in process over the ASGI interface with the service stubbed out, so only
+routing and serialization are measured (no MongoDB needed):
+    python -m benchmarks.bench_serialization --requests 2000 --timeline 100 1000
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from fastapi import Depends, FastAPI
+import httpx
+from app.api import analytics
+from app.auth import get_admin_user
+from app.main import app
+from app.models import ProjectAnalyticsResponse
+
+PROJECT_ID = 1
+PATH = f"/api/v1/analytics/projects/{PROJECT_ID}"
+
+
+def project_payload(timeline: int):
+    started = datetime(2024, 1, 1)
+    return {
+        "project_id": PROJECT_ID,
+        "project_name": "Benchmark project",
+        "total_tasks": timeline,
+        "completed_tasks": timeline // 2,
+        "completion_rate": 0.5,
+        "avg_completion_time_hours": 12.5,
+        "task_distribution": {"completed": timeline // 2, "pending": timeline - timeline // 2},
+        "timeline": [
+            {
+                "event_type": "task_updated",
+                "task_id": i,
+                "timestamp": started + timedelta(minutes=i),
+                "task_title": f"Task {i}"
+            }
+            for i in range(timeline)
+        ],
+        "timeline_next_cursor": str(ObjectId()),
+    }
+
+
+def legacy_app(payload) -> FastAPI:
+    """The previous path: isoformat per item, then the model validated and re-encoded by FastAPI."""
+    legacy = FastAPI()
+
+    @legacy.get("/api/v1/analytics/projects/{project_id}", response_model=ProjectAnalyticsResponse)
+    async def get_project_analytics(project_id: int, current_user: dict = Depends(get_admin_user)):
+        data = dict(payload, timeline=[
+            dict(entry, timestamp=entry["timestamp"].isoformat()) for entry in payload["timeline"]
+        ])
+        return ProjectAnalyticsResponse(**data)
+
+    return legacy
+
+
+async def requests_per_second(target: FastAPI, requests: int) -> float:
+    transport = httpx.ASGITransport(app=target)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(50):
+            (await client.get(PATH)).raise_for_status()
+        started = time.perf_counter()
+        for _ in range(requests):
+            await client.get(PATH)
+        return requests / (time.perf_counter() - started)
+
+
+async def run(requests: int, timelines):
+    user = {"user_id": 1, "username": "bench", "role": "Admin"}
+    service = analytics.analytics_service
+
+    async def user_version(user_id):
+        return None
+
+    for timeline in timelines:
+        payload = project_payload(timeline)
+
+        async def get_project_analytics(project_id, user_id, version=None):
+            return payload
+
+        service.user_version = user_version
+        service.get_project_analytics = get_project_analytics
+        legacy = legacy_app(payload)
+        for target in (legacy, app):
+            target.dependency_overrides[get_admin_user] = lambda: user
+        before = await requests_per_second(legacy, requests)
+        after = await requests_per_second(app, requests)
+        print(f"timeline={timeline}: before {before:.0f} req/s, after {after:.0f} req/s ({after / before:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--timeline", type=int, nargs="+", default=[100, 1000], help="Timeline entries per response")
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.timeline))
+
+
+if __name__ == "__main__":
+    main()
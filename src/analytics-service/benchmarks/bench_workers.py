@@ -0,0 +1,102 @@
+"""Throughput of the gunicorn serving mode across worker counts and per-worker pool sizes.
+
+Starts ``gunicorn app.main:app -c gunicorn.conf.py`` for each combination and
+drives the dashboard and project endpoints over HTTP. Run against a database
+prepared with ``benchmarks.seed``:
+    MONGODB_URL=mongodb://localhost:27017 python -m benchmarks.bench_workers --workers 1 2 4 --pool 10 50
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+import httpx
+from benchmarks.bench_dashboard import percentiles
+
+PORT = 8765
+
+
+async def wait_until_up(client: httpx.AsyncClient, process: subprocess.Popen, deadline: float = 60):
+    started = time.monotonic()
+    while time.monotonic() - started < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("gunicorn did not become healthy")
+
+
+async def drive(client: httpx.AsyncClient, paths, users: int, requests: int, concurrency: int):
+    samples = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        user_id = random.randint(1, users)
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(
+                random.choice(paths),
+                headers={"X-User-Id": str(user_id), "X-Username": f"user{user_id}"}
+            )
+            samples.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 500:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return len(samples) / (time.perf_counter() - started), percentiles(samples), errors
+
+
+async def run(workers, pools, users: int, requests: int, concurrency: int):
+    paths = ["/api/v1/analytics/dashboard", "/api/v1/analytics/tasks/summary", "/api/v1/analytics/projects/1"]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    for worker_count in workers:
+        for pool in pools:
+            env = dict(
+                os.environ,
+                WEB_CONCURRENCY=str(worker_count),
+                GUNICORN_BIND=f"127.0.0.1:{PORT}",
+                MONGODB_MAX_POOL_SIZE=str(pool),
+                MONGODB_MIN_POOL_SIZE=str(pool // 2),
+                MONGODB_PREWARM_CONNECTIONS=str(pool // 2),
+                LEADERBOARD_REFRESH_ENABLED="false",
+                GUNICORN_LOG_LEVEL="warning",
+            )
+            process = subprocess.Popen(
+                [sys.executable, "-m", "gunicorn", "app.main:app", "-c", "gunicorn.conf.py"], env=env
+            )
+            try:
+                async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=30) as client:
+                    await wait_until_up(client, process)
+                    await drive(client, paths, users, min(requests, 500), concurrency)
+                    throughput, latency, errors = await drive(client, paths, users, requests, concurrency)
+                print(
+                    f"workers={worker_count} pool={pool} (max {worker_count * pool} connections):",
+                    f"{throughput:.0f} req/s", latency, f"errors={errors}"
+                )
+            finally:
+                process.terminate()
+                process.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--pool", type=int, nargs="+", default=[10, 50], help="MONGODB_MAX_POOL_SIZE per worker")
+    parser.add_argument("--users", type=int, default=1000, help="Number of seeded users to sample from")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(run(args.workers, args.pool, args.users, args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
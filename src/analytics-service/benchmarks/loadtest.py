@@ -0,0 +1,241 @@
+"""Load test the analytics API at increasing request rates and compare against a baseline.
+
+Seeds a throwaway database on a local MongoDB (``docker run -p 27017:27017 mongo:7``
+is enough; no Kafka or gateway needed), serves the FastAPI app in process, and
+offers each rate open-loop: requests start on schedule whether or not earlier
+ones finished, and latency is measured from the scheduled start, so queueing
+shows up in the percentiles instead of silently lowering the rate.
+
+    MONGODB_URL=mongodb://localhost:27017 python -m benchmarks.loadtest --seed \\
+        --rates 50 100 200 400 --output benchmarks/results/current.json \\
+        --baseline benchmarks/results/baseline.json
+
+Exits with status 1 when an endpoint regressed against the baseline.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+import httpx
+from benchmarks.bench_dashboard import percentiles
+from benchmarks.seed import heavy_users, seed_database
+from app.config import settings
+from app.database import mongodb
+from app.main import app
+
+ENDPOINTS: Dict[str, Callable[[int, int], str]] = {
+    "dashboard": lambda user_id, project_id: "/api/v1/analytics/dashboard",
+    "task_summary": lambda user_id, project_id: "/api/v1/analytics/tasks/summary",
+    "productivity": lambda user_id, project_id: "/api/v1/analytics/productivity?days=30",
+    "project": lambda user_id, project_id: f"/api/v1/analytics/projects/{project_id}",
+    "project_timeline": lambda user_id, project_id: f"/api/v1/analytics/projects/{project_id}/timeline?limit=100",
+}
+
+
+class Workload:
+    """Picks who asks for what: ``heavy_share`` of the requests come from the heavy-tail users"""
+
+    def __init__(self, users: int, projects_per_user: int, heavy_fraction: float, heavy_share: float):
+        self.users = users
+        self.projects_per_user = projects_per_user
+        self.heavy = sorted(heavy_users(users, heavy_fraction))
+        self.heavy_share = heavy_share if self.heavy else 0.0
+
+    def next_request(self):
+        if random.random() < self.heavy_share:
+            user_id = random.choice(self.heavy)
+        else:
+            user_id = random.randint(1, self.users)
+        endpoint = random.choice(list(ENDPOINTS))
+        path = ENDPOINTS[endpoint](user_id, random.randint(1, self.projects_per_user))
+        return endpoint, path, {"X-User-Id": str(user_id), "X-Username": f"user{user_id}"}
+
+
+async def run_stage(client: httpx.AsyncClient, workload: Workload, rate: float, duration: float,
+                    max_in_flight: int) -> Dict[str, Any]:
+    samples: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    dropped = 0
+    in_flight = 0
+    loop = asyncio.get_running_loop()
+
+    async def one(endpoint: str, path: str, headers: Dict[str, str], scheduled: float):
+        nonlocal in_flight
+        try:
+            response = await client.get(path, headers=headers)
+            if response.status_code >= 500:
+                errors[endpoint] += 1
+            else:
+                samples[endpoint].append((loop.time() - scheduled) * 1000)
+        except httpx.HTTPError:
+            errors[endpoint] += 1
+        finally:
+            in_flight -= 1
+
+    tasks = []
+    started = loop.time()
+    for i in range(int(rate * duration)):
+        scheduled = started + i / rate
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        endpoint, path, headers = workload.next_request()
+        if in_flight >= max_in_flight:
+            # The server is not keeping up; count the request instead of queueing without bound
+            dropped += 1
+            errors[endpoint] += 1
+            continue
+        in_flight += 1
+        tasks.append(asyncio.create_task(one(endpoint, path, headers, scheduled)))
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - started
+
+    endpoints = {}
+    for endpoint in sorted(set(samples) | set(errors)):
+        completed = samples.get(endpoint, [])
+        endpoints[endpoint] = {
+            "requests": len(completed) + errors.get(endpoint, 0),
+            "errors": errors.get(endpoint, 0),
+            "throughput": round(len(completed) / elapsed, 2),
+            **(percentiles(completed) if completed else {}),
+        }
+    return {"rate": rate, "duration": duration, "seconds": round(elapsed, 3), "dropped": dropped,
+            "endpoints": endpoints}
+
+
+def saturated(stage: Dict[str, Any], slo_ms: float, max_error_rate: float) -> bool:
+    for result in stage["endpoints"].values():
+        if result["requests"] and result["errors"] / result["requests"] > max_error_rate:
+            return True
+        if result.get("p99_ms", 0) > slo_ms:
+            return True
+    return False
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions of ``current`` against ``baseline`` at the rates both ran"""
+    regressions = []
+    baseline_stages = {stage["rate"]: stage for stage in baseline["stages"]}
+    for stage in current["stages"]:
+        before_stage = baseline_stages.get(stage["rate"])
+        if before_stage is None:
+            continue
+        for endpoint, after in stage["endpoints"].items():
+            before = before_stage["endpoints"].get(endpoint)
+            if before is None:
+                continue
+            for metric in ("p50_ms", "p95_ms", "p99_ms"):
+                if metric in before and metric in after and after[metric] > before[metric] * (1 + tolerance):
+                    regressions.append(
+                        f"rate={stage['rate']} {endpoint} {metric}: {before[metric]} -> {after[metric]}"
+                    )
+            if after["throughput"] < before["throughput"] * (1 - tolerance):
+                regressions.append(
+                    f"rate={stage['rate']} {endpoint} throughput: {before['throughput']} -> {after['throughput']}"
+                )
+    return regressions
+
+
+def print_stage(stage: Dict[str, Any]):
+    print(f"rate={stage['rate']}/s dropped={stage['dropped']}")
+    for endpoint, result in stage["endpoints"].items():
+        latency = " ".join(f"{key}={result[key]}" for key in ("p50_ms", "p95_ms", "p99_ms") if key in result)
+        print(f"  {endpoint:<18} {result['throughput']:>8}/s errors={result['errors']} {latency}")
+
+
+async def drive(client: httpx.AsyncClient, args) -> List[Dict[str, Any]]:
+    workload = Workload(args.users, args.projects_per_user, args.heavy_fraction, args.heavy_share)
+    # Warm the pool, caches and code paths before the first measured stage
+    await run_stage(client, workload, args.rates[0], min(args.duration, 5), args.max_in_flight)
+    stages = []
+    for rate in args.rates:
+        stage = await run_stage(client, workload, rate, args.duration, args.max_in_flight)
+        print_stage(stage)
+        stages.append(stage)
+        if saturated(stage, args.slo_ms, args.max_error_rate):
+            print(f"Saturated at {rate}/s; not offering higher rates")
+            break
+    return stages
+
+
+async def run(args) -> Dict[str, Any]:
+    settings.DATABASE_NAME = args.database
+    # Only the request path is under test
+    settings.LEADERBOARD_REFRESH_ENABLED = False
+
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    async with app.router.lifespan_context(app):
+        if args.seed:
+            print(f"Seeding {args.users} users into {args.database}")
+            await seed_database(
+                mongodb.database, args.users, args.events_per_user, args.projects_per_user,
+                args.heavy_fraction, args.heavy_multiplier, drop=True
+            )
+        if args.base_url:
+            client = httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30)
+        else:
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=30)
+        async with client:
+            stages = await drive(client, args)
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "target": args.base_url or "in-process",
+            "users": args.users,
+            "events_per_user": args.events_per_user,
+            "projects_per_user": args.projects_per_user,
+            "heavy_fraction": args.heavy_fraction,
+            "heavy_multiplier": args.heavy_multiplier,
+            "heavy_share": args.heavy_share,
+            "duration": args.duration,
+        },
+        "stages": stages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default="analytics_loadtest", help="Database to seed and serve from")
+    parser.add_argument("--seed", action="store_true", help="Drop and reseed the database first")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--events-per-user", type=int, default=200)
+    parser.add_argument("--projects-per-user", type=int, default=5)
+    parser.add_argument("--heavy-fraction", type=float, default=0.01, help="Share of users with heavy-tail volume")
+    parser.add_argument("--heavy-multiplier", type=int, default=50, help="Event volume of heavy users, in multiples")
+    parser.add_argument("--heavy-share", type=float, default=0.2, help="Share of requests made by heavy users")
+    parser.add_argument("--rates", type=float, nargs="+", default=[50, 100, 200, 400], help="Requests/sec to offer")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per rate")
+    parser.add_argument("--max-in-flight", type=int, default=500)
+    parser.add_argument("--slo-ms", type=float, default=1000, help="Stop once any endpoint's p99 exceeds this")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--base-url", help="Drive a running server instead of the in-process app")
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--baseline", help="Results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    args = parser.parse_args()
+    args.rates = sorted(args.rates)
+
+    results = asyncio.run(run(args))
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
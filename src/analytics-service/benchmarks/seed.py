@@ -0,0 +1,126 @@
+"""Seed a local MongoDB with synthetic analytics data for the benchmarks.
+
+A ``--heavy-fraction`` of the users get ``--heavy-multiplier`` times the events,
+the long tail that dominates p99 in production.
+
+Usage:
+    MONGODB_URL=mongodb://localhost:27017 python -m benchmarks.seed --users 1000 --events-per-user 200
+"""
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.config import settings
+from app.database import create_indexes, mongodb
+
+STATUSES = ["todo", "in_progress", "completed"]
+
+
+def user_documents(user_id: int, events_per_user: int, projects_per_user: int, now: datetime):
+    events = []
+    for i in range(events_per_user):
+        status = random.choice(STATUSES)
+        events.append({
+            "event": random.choice(["task_created", "task_updated", "task_updated", "task_deleted"]),
+            "task_id": user_id * events_per_user + i,
+            "project_id": random.randint(1, projects_per_user),
+            "user_id": user_id,
+            "username": f"user{user_id}",
+            "title": f"Task {i}",
+            "status": status,
+            "timestamp": now - timedelta(minutes=random.randint(0, 60 * 24 * 90)),
+        })
+    completed = sum(1 for e in events if e["status"] == "completed")
+    projects = []
+    for project_id in range(1, projects_per_user + 1):
+        project_events = [e for e in events if e["project_id"] == project_id]
+        project_completed = sum(1 for e in project_events if e["status"] == "completed")
+        projects.append({
+            "project_id": project_id,
+            "user_id": user_id,
+            "username": f"user{user_id}",
+            "project_name": f"Project {project_id}",
+            "total_tasks": len(project_events),
+            "completed_tasks": project_completed,
+            "completion_rate": project_completed / len(project_events) if project_events else 0.0,
+            "avg_completion_time_hours": None,
+            "created_at_project": min((e["timestamp"] for e in project_events), default=now),
+            "last_activity": max((e["timestamp"] for e in project_events), default=now),
+            "created_at": now,
+            "updated_at": now,
+        })
+    metrics = {
+        "user_id": user_id,
+        "username": f"user{user_id}",
+        "total_tasks": events_per_user,
+        "completed_tasks": completed,
+        "active_projects": projects_per_user,
+        "completion_rate": completed / events_per_user if events_per_user else 0.0,
+        "avg_completion_time_hours": None,
+        "last_activity": max((e["timestamp"] for e in events), default=now),
+        "version": 1,
+        "created_at": now,
+        "updated_at": now,
+    }
+    return metrics, projects, events
+
+
+def heavy_users(users: int, heavy_fraction: float):
+    """The user ids that get the heavy-tail event volume"""
+    count = int(users * heavy_fraction)
+    return set(random.Random(users).sample(range(1, users + 1), count)) if count else set()
+
+
+async def seed_database(db, users: int, events_per_user: int, projects_per_user: int,
+                        heavy_fraction: float = 0.0, heavy_multiplier: int = 1, drop: bool = False):
+    if drop:
+        await db.user_metrics.drop()
+        await db.project_metrics.drop()
+        await db.task_events.drop()
+    await create_indexes()
+
+    now = datetime.now(timezone.utc)
+    heavy = heavy_users(users, heavy_fraction)
+    for user_id in range(1, users + 1):
+        volume = events_per_user * heavy_multiplier if user_id in heavy else events_per_user
+        metrics, projects, events = user_documents(user_id, volume, projects_per_user, now)
+        await db.user_metrics.replace_one({"user_id": metrics["user_id"]}, metrics, upsert=True)
+        for project in projects:
+            await db.project_metrics.replace_one(
+                {"project_id": project["project_id"], "user_id": user_id}, project, upsert=True
+            )
+        if events:
+            await db.task_events.insert_many(events, ordered=False)
+    return heavy
+
+
+async def seed(users: int, events_per_user: int, projects_per_user: int, heavy_fraction: float,
+               heavy_multiplier: int, drop: bool):
+    mongodb.client = AsyncIOMotorClient(settings.MONGODB_URL)
+    mongodb.database = mongodb.client[settings.DATABASE_NAME]
+    heavy = await seed_database(
+        mongodb.database, users, events_per_user, projects_per_user, heavy_fraction, heavy_multiplier, drop
+    )
+    print(f"Seeded {users} users with {events_per_user} events each ({len(heavy)} heavy users with "
+          f"{events_per_user * heavy_multiplier}) into {settings.DATABASE_NAME}")
+    mongodb.client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--events-per-user", type=int, default=200)
+    parser.add_argument("--projects-per-user", type=int, default=5)
+    parser.add_argument("--heavy-fraction", type=float, default=0.01, help="Share of users with heavy-tail volume")
+    parser.add_argument("--heavy-multiplier", type=int, default=50, help="Event volume of heavy users, in multiples")
+    parser.add_argument("--drop", action="store_true", help="Drop the seeded collections first")
+    args = parser.parse_args()
+    asyncio.run(seed(
+        args.users, args.events_per_user, args.projects_per_user,
+        args.heavy_fraction, args.heavy_multiplier, args.drop
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Production serving: N uvicorn worker processes under gunicorn.
+
+    gunicorn app.main:app -c gunicorn.conf.py
+
+Each worker runs the FastAPI lifespan on its own, so it opens its own MongoDB
+pool (MONGODB_MAX_POOL_SIZE/MONGODB_MIN_POOL_SIZE, pre-warmed with
+MONGODB_PREWARM_CONNECTIONS) after the fork. Workers are recycled after
+GUNICORN_MAX_REQUESTS requests, staggered by the jitter so they do not all
+restart at once, and get GUNICORN_GRACEFUL_TIMEOUT seconds to finish in-flight
+requests on shutdown.
+"""
+import multiprocessing
+import os
+import shutil
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Graceful recycling
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+# Restart a worker whose event loop stops heartbeating; open live streams do not count against it
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+accesslog = None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    # Worker metrics are aggregated from files in this directory; start from an empty one
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
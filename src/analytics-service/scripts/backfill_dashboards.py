@@ -0,0 +1,149 @@
+"""Build the user_dashboards read model for users that predate it, online and in batches.
+
+The task worker only pushes events it consumes into a user's ring buffers, so
+users with older history start with short buffers and without the metrics
+of a snapshot. This merges each user's latest events and completions from
+``task_events`` and their ``user_metrics`` into the read model. The merge is
+a set union inside a single update, so it is safe next to the workers and
+safe to re-run; metrics the workers already wrote are kept.
+
+Rollout:
+    1. Deploy the workers (they start maintaining user_dashboards)
+    2. MONGODB_URL=... python -m scripts.backfill_dashboards --batch-size 500
+    3. Redeploy the API with DASHBOARD_READ_MODEL_ENABLED=true
+"""
+import argparse
+import asyncio
+from typing import Any, Dict, List
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from app.config import settings
+from app.database import user_id_filter
+from app.models import coerce_user_id
+
+METRIC_FIELDS = ["username", "total_tasks", "completed_tasks", "completion_rate", "active_projects"]
+
+
+async def user_batches(collection, batch_size: int, pause: float):
+    """Yield batches of user_metrics documents in ``_id`` order, resuming after the last one seen."""
+    last_id = None
+    while True:
+        query = {} if last_id is None else {"_id": {"$gt": last_id}}
+        batch = await collection.find(
+            query, {"user_id": 1, **{field: 1 for field in METRIC_FIELDS}}
+        ).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            return
+        last_id = batch[-1]["_id"]
+        yield batch
+        if pause:
+            await asyncio.sleep(pause)
+
+
+# Entries are shaped exactly like the task worker's (app/dashboards.py) so the
+# union recognizes events that are already in a ring buffer
+
+def activity_entry(event: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "task",
+        "event": event["event"],
+        "task_id": event.get("task_id"),
+        "project_id": event.get("project_id"),
+        "timestamp": event["timestamp"],
+    }
+
+
+def completion_entry(event: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "task_id": event.get("task_id"),
+        "project_id": event.get("project_id"),
+        "title": event.get("title"),
+        "completed_at": event["timestamp"],
+    }
+
+
+def merged(field: str, entries: List[Dict[str, Any]], sort_field: str, size: int) -> Dict[str, Any]:
+    """Union of the stored ring buffer and ``entries``, newest first and trimmed to ``size``"""
+    return {"$slice": [
+        {"$sortArray": {
+            "input": {"$setUnion": [{"$ifNull": [f"${field}", []]}, {"$literal": entries}]},
+            "sortBy": {sort_field: -1},
+        }},
+        size,
+    ]}
+
+
+def backfill_update(
+    metrics: Dict[str, Any],
+    activity: List[Dict[str, Any]],
+    completions: List[Dict[str, Any]],
+    activity_size: int,
+    completions_size: int
+) -> List[Dict[str, Any]]:
+    """Pipeline update merging a user's history into their read model document"""
+    defaults = {"total_tasks": 0, "completed_tasks": 0, "completion_rate": 0.0, "active_projects": 0}
+    fields = {
+        field: {"$ifNull": [f"${field}", {"$literal": metrics.get(field, defaults.get(field))}]}
+        for field in METRIC_FIELDS
+    }
+    return [{"$set": {
+        "user_id": coerce_user_id(metrics["user_id"]),
+        **fields,
+        "recent_activity": merged("recent_activity", activity, "timestamp", activity_size),
+        "recent_completions": merged("recent_completions", completions, "completed_at", completions_size),
+        "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]},
+        "updated_at": "$$NOW",
+    }}]
+
+
+async def backfill(db: AsyncIOMotorDatabase, batch_size: int, pause: float, activity_size: int, completions_size: int) -> Dict[str, int]:
+    stats = {"users": 0, "skipped": 0}
+    async for batch in user_batches(db.user_metrics, batch_size, pause):
+        for metrics in batch:
+            user_id = coerce_user_id(metrics.get("user_id"))
+            if not isinstance(user_id, int):
+                stats["skipped"] += 1
+                continue
+            user_filter = user_id_filter(user_id)
+            events = await db.task_events.find(
+                {"user_id": user_filter}
+            ).sort("timestamp", -1).limit(activity_size).to_list(activity_size)
+            completed = await db.task_events.find(
+                {"user_id": user_filter, "status": "completed", "event": "task_updated"}
+            ).sort("timestamp", -1).limit(completions_size).to_list(completions_size)
+            await db.user_dashboards.update_one(
+                {"_id": user_id},
+                backfill_update(
+                    metrics,
+                    [activity_entry(event) for event in events],
+                    [completion_entry(event) for event in completed],
+                    activity_size,
+                    completions_size,
+                ),
+                upsert=True,
+            )
+            stats["users"] += 1
+    return stats
+
+
+async def run(batch_size: int, pause: float, activity_size: int, completions_size: int):
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    db = client[settings.DATABASE_NAME]
+    try:
+        print("user_dashboards", await backfill(db, batch_size, pause, activity_size, completions_size))
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.1, help="Seconds to sleep between batches")
+    # Must match the task worker's DASHBOARD_RECENT_ACTIVITY / DASHBOARD_RECENT_COMPLETIONS
+    parser.add_argument("--recent-activity", type=int, default=10)
+    parser.add_argument("--recent-completions", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.batch_size, args.pause, args.recent_activity, args.recent_completions))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Rebuild closed task_event_windows from task_events, online and in batches.
+
+The task worker only counts the events it consumes, so activity from before
+the windows existed reads as zeros, and an event arriving later than
+WINDOW_ALLOWED_LATENESS_SECONDS is left out of its already closed windows.
+Both are still in ``task_events``: this recounts each user's hour and day
+windows that ended before ``--until`` from it and stores them as closed
+windows. Counts are set rather than incremented, so it is safe to re-run;
+windows the worker still has open are skipped and left to the worker.
+
+Rollout:
+    1. Deploy the task worker (it starts maintaining task_event_windows)
+    2. MONGODB_URL=... python -m scripts.backfill_windows --batch-size 500
+    3. Re-run it now and then to recover events dropped by the allowed lateness
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app.config import settings
+from app.database import user_id_filter
+from app.models import coerce_user_id
+
+GRANULARITIES = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+DUPLICATE_KEY = 11000
+
+# (window_start, project_id or None for the per-user window)
+WindowKey = Tuple[datetime, Optional[int]]
+
+
+def count_pipeline(user_filter: Any, granularity: str, until: datetime) -> List[Dict[str, Any]]:
+    """Event counts per window, project, event and status of one user"""
+    return [
+        {"$match": {"user_id": user_filter, "timestamp": {"$lt": until}}},
+        # The worker stores an event again when Kafka redelivers it; count it once
+        {"$group": {"_id": {
+            "task_id": "$task_id",
+            "project_id": "$project_id",
+            "event": "$event",
+            "status": "$status",
+            "timestamp": "$timestamp",
+        }}},
+        {"$group": {
+            "_id": {
+                "window_start": {"$dateTrunc": {"date": "$_id.timestamp", "unit": granularity, "timezone": "UTC"}},
+                "project_id": "$_id.project_id",
+                "event": "$_id.event",
+                "status": "$_id.status",
+            },
+            "count": {"$sum": 1},
+        }},
+    ]
+
+
+def window_counts(groups: List[Dict[str, Any]]) -> Dict[WindowKey, Dict[str, Any]]:
+    """Window counters from ``count_pipeline`` groups, counted like the task worker counts events"""
+    windows: Dict[WindowKey, Dict[str, Any]] = {}
+    for group in groups:
+        key, count = group["_id"], group["count"]
+        scopes = [None]
+        if key.get("project_id"):
+            scopes.append(key["project_id"])
+        for project_id in scopes:
+            window = windows.setdefault((key["window_start"], project_id), {
+                "events": 0, "created": 0, "deleted": 0, "updated": 0, "completed": 0, "transitions": {},
+            })
+            window["events"] += count
+            if key["event"] == "task_created":
+                window["created"] += count
+            elif key["event"] == "task_deleted":
+                window["deleted"] += count
+            elif key["event"] == "task_updated":
+                window["updated"] += count
+                status = key.get("status")
+                if status:
+                    window["transitions"][status] = window["transitions"].get(status, 0) + count
+                    if status == "completed":
+                        window["completed"] += count
+    return windows
+
+
+def window_ops(
+    user_id: int,
+    granularity: str,
+    windows: Dict[WindowKey, Dict[str, Any]],
+    until: datetime
+) -> List[UpdateOne]:
+    """Upserts of a user's windows that ended before ``until``; open windows collide and are skipped"""
+    size = GRANULARITIES[granularity]
+    now = datetime.now(timezone.utc)
+    ops = []
+    for (start, project_id), counts in windows.items():
+        if start + size > until:
+            continue
+        key = {"granularity": granularity, "window_start": start, "user_id": user_id, "project_id": project_id}
+        ops.append(UpdateOne(
+            {**key, "closed": {"$ne": False}},
+            {"$set": {**counts, "window_end": start + size, "closed": True, "backfilled_at": now}},
+            upsert=True,
+        ))
+    return ops
+
+
+async def backfill(db: AsyncIOMotorDatabase, batch_size: int, pause: float, until: datetime) -> Dict[str, int]:
+    stats = {"users": 0, "skipped": 0, "windows": 0, "open": 0}
+    last_id = None
+    while True:
+        query = {} if last_id is None else {"_id": {"$gt": last_id}}
+        batch = await db.user_metrics.find(query, {"user_id": 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            return stats
+        last_id = batch[-1]["_id"]
+        for metrics in batch:
+            user_id = coerce_user_id(metrics.get("user_id"))
+            if not isinstance(user_id, int):
+                stats["skipped"] += 1
+                continue
+            for granularity in GRANULARITIES:
+                groups = await db.task_events.aggregate(
+                    count_pipeline(user_id_filter(user_id), granularity, until)
+                ).to_list(None)
+                ops = window_ops(user_id, granularity, window_counts(groups), until)
+                if not ops:
+                    continue
+                try:
+                    await db.task_event_windows.bulk_write(ops, ordered=False)
+                    stats["windows"] += len(ops)
+                except BulkWriteError as e:
+                    errors = e.details.get("writeErrors", [])
+                    if any(err.get("code") != DUPLICATE_KEY for err in errors):
+                        raise
+                    # Still open in the worker, which keeps counting them
+                    stats["open"] += len(errors)
+                    stats["windows"] += len(ops) - len(errors)
+            stats["users"] += 1
+        if pause:
+            await asyncio.sleep(pause)
+
+
+async def run(batch_size: int, pause: float, until: datetime):
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    db = client[settings.DATABASE_NAME]
+    try:
+        print("task_event_windows", await backfill(db, batch_size, pause, until))
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.1, help="Seconds to sleep between batches")
+    # Well past the worker's WINDOW_ALLOWED_LATENESS_SECONDS, so it is done with these windows
+    parser.add_argument(
+        "--until", type=datetime.fromisoformat, default=None,
+        help="Only rebuild windows ending before this UTC time (default: start of yesterday)"
+    )
+    args = parser.parse_args()
+    until = args.until
+    if until is None:
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        until = today - timedelta(days=1)
+    # Naive UTC, the form Mongo returns window starts in
+    if until.tzinfo is not None:
+        until = until.astimezone(timezone.utc).replace(tzinfo=None)
+    asyncio.run(run(args.batch_size, args.pause, until))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Rewrite legacy string user ids to the canonical int form, online and in batches.
+
+Safe to run while the workers and the API are serving traffic, and safe to
+re-run: each batch only touches documents whose ``user_id`` is still a string.
+
+Rollout:
+    1. Deploy the API and workers with USER_ID_MIGRATION_COMPAT=true
+    2. MONGODB_URL=... python -m scripts.migrate_user_ids --batch-size 500
+    3. Redeploy with USER_ID_MIGRATION_COMPAT=false once the run reports nothing left
+"""
+import argparse
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+from app.config import settings
+from app.models import coerce_user_id
+
+# Event collections have no unique key on user_id and are converted in place
+EVENT_COLLECTIONS = ["task_events", "project_events"]
+
+# Unique key of each derived collection, excluding user_id. A string document
+# whose int twin already exists (written by an upgraded worker) is merged into it.
+KEYED_COLLECTIONS = {
+    "user_metrics": [],
+    "project_metrics": ["project_id"],
+    "task_event_windows": ["granularity", "window_start", "project_id"],
+}
+
+# Window counters are additive: twins are summed instead of picking a winner
+WINDOW_COUNTERS = ["events", "created", "deleted", "updated", "completed", "late_events"]
+
+LEGACY_FILTER = {"user_id": {"$type": "string"}}
+
+
+class MigrationStats:
+    def __init__(self):
+        self.converted = 0
+        self.merged = 0
+        self.skipped = 0
+
+    def __repr__(self):
+        return f"converted={self.converted} merged={self.merged} skipped={self.skipped}"
+
+
+async def legacy_batches(collection, batch_size: int, pause: float):
+    """Yield batches of legacy documents in ``_id`` order, resuming after the last one seen."""
+    last_id = None
+    while True:
+        query = dict(LEGACY_FILTER)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await collection.find(query).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            return
+        last_id = batch[-1]["_id"]
+        yield batch
+        if pause:
+            await asyncio.sleep(pause)
+
+
+def canonical_id(doc: Dict[str, Any]) -> Optional[int]:
+    user_id = coerce_user_id(doc["user_id"])
+    return user_id if isinstance(user_id, int) else None
+
+
+async def migrate_events(collection, batch_size: int, pause: float) -> MigrationStats:
+    stats = MigrationStats()
+    async for batch in legacy_batches(collection, batch_size, pause):
+        convertible = [doc["_id"] for doc in batch if canonical_id(doc) is not None]
+        stats.skipped += len(batch) - len(convertible)
+        if not convertible:
+            continue
+        # Conditional on the type so a concurrent writer's int value is never overwritten
+        result = await collection.update_many(
+            {"_id": {"$in": convertible}, **LEGACY_FILTER},
+            [{"$set": {"user_id": {"$toInt": {"$trim": {"input": "$user_id"}}}}}],
+        )
+        stats.converted += result.modified_count
+    return stats
+
+
+def merge_update(collection_name: str, legacy: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """Update folding a legacy document into its int twin."""
+    if collection_name == "task_event_windows":
+        inc = {field: legacy.get(field, 0) for field in WINDOW_COUNTERS if legacy.get(field)}
+        for status, count in (legacy.get("transitions") or {}).items():
+            inc[f"transitions.{status}"] = count
+        return {"$inc": inc, "$set": {"updated_at": datetime.now(timezone.utc)}}
+
+    # Metrics twins were written from the workers' complete local state, so their
+    # values win; the legacy document only fills fields the twin has never had.
+    missing = {
+        field: value for field, value in legacy.items()
+        if field not in current and field not in ("_id", "user_id")
+    }
+    update: Dict[str, Any] = {"$inc": {"version": 1}}
+    if missing:
+        update["$set"] = missing
+    if legacy.get("last_activity"):
+        update["$max"] = {"last_activity": legacy["last_activity"]}
+    if legacy.get("created_at"):
+        update["$min"] = {"created_at": legacy["created_at"]}
+    return update
+
+
+async def migrate_keyed(db: AsyncIOMotorDatabase, collection_name: str, batch_size: int, pause: float) -> MigrationStats:
+    collection = db[collection_name]
+    key_fields = KEYED_COLLECTIONS[collection_name]
+    stats = MigrationStats()
+    async for batch in legacy_batches(collection, batch_size, pause):
+        for legacy in batch:
+            user_id = canonical_id(legacy)
+            if user_id is None:
+                stats.skipped += 1
+                continue
+            twin_filter = {"user_id": user_id, **{field: legacy.get(field) for field in key_fields}}
+            twin = await collection.find_one(twin_filter)
+            if twin is None:
+                try:
+                    result = await collection.update_one(
+                        {"_id": legacy["_id"], **LEGACY_FILTER}, {"$set": {"user_id": user_id}}
+                    )
+                    stats.converted += result.modified_count
+                    continue
+                except DuplicateKeyError:
+                    # A worker created the int twin between the lookup and the update
+                    twin = await collection.find_one(twin_filter)
+            await collection.update_one({"_id": twin["_id"]}, merge_update(collection_name, legacy, twin))
+            await collection.delete_one({"_id": legacy["_id"]})
+            stats.merged += 1
+    return stats
+
+
+async def migrate(batch_size: int, pause: float):
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    db = client[settings.DATABASE_NAME]
+    try:
+        for name in EVENT_COLLECTIONS:
+            print(name, await migrate_events(db[name], batch_size, pause))
+        for name in KEYED_COLLECTIONS:
+            print(name, await migrate_keyed(db, name, batch_size, pause))
+        for name in [*EVENT_COLLECTIONS, *KEYED_COLLECTIONS]:
+            remaining = await db[name].count_documents(LEGACY_FILTER)
+            if remaining:
+                print(f"{name}: {remaining} documents keep a non-numeric string user_id")
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.1, help="Seconds to sleep between batches")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.batch_size, args.pause))
+
+
+if __name__ == "__main__":
+    main()
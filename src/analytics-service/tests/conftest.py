@@ -0,0 +1,55 @@
+import pytest
+from unittest.mock import Mock, AsyncMock
+from datetime import datetime, timezone
+from fastapi.testclient import TestClient
+from app.main import app
+from app.auth import get_admin_user
+from app.api import analytics
+
+
+# API fixtures shared by the endpoint tests. Tests change the data by
+# parametrizing ``user_metrics``, ``recent_events`` or ``current_user``.
+
+@pytest.fixture
+def user_metrics():
+    return {
+        "user_id": 1,
+        "total_tasks": 4,
+        "completed_tasks": 2,
+        "active_projects": 1,
+        "completion_rate": 0.5,
+        "version": 1,
+        "updated_at": datetime(2024, 1, 1, tzinfo=timezone.utc),
+    }
+
+
+@pytest.fixture
+def recent_events():
+    return []
+
+
+@pytest.fixture
+def current_user():
+    return {"user_id": 1, "username": "testuser", "role": "User"}
+
+
+@pytest.fixture
+def mock_db(user_metrics, recent_events):
+    """Mongo as seen by the analytics endpoints; reads return copies of the current ``user_metrics``"""
+    db = Mock()
+    db.user_metrics.find_one = AsyncMock(side_effect=lambda *args, **kwargs: dict(user_metrics))
+    db.user_metrics.aggregate.return_value.to_list = AsyncMock(
+        side_effect=lambda *args: [dict(user_metrics, recent_events=recent_events)]
+    )
+    latest = max((event["timestamp"] for event in recent_events), default=user_metrics["updated_at"])
+    db.task_events.find_one = AsyncMock(return_value={"timestamp": latest})
+    return db
+
+
+@pytest.fixture
+def client(mock_db, current_user, monkeypatch):
+    monkeypatch.setattr(analytics.analytics_service, "db", mock_db)
+    analytics.analytics_service.cache.clear()
+    app.dependency_overrides[get_admin_user] = lambda: current_user
+    yield TestClient(app)
+    app.dependency_overrides.clear()
@@ -1,8 +1,11 @@
 import pytest
 import asyncio
 from unittest.mock import Mock, AsyncMock
+from app.config import settings
 from app.services.analytics_service import AnalyticsService
 from app.models import TaskEvent, ProjectEvent
+from app.services.pagination import decode_cursor
+from bson import ObjectId
 from datetime import datetime, timezone
 
 
@@ -15,8 +18,10 @@ def analytics_service():
 def mock_db():
     db = Mock()
     db.user_metrics = Mock()
+    db.user_metrics.find_one = AsyncMock(return_value=None)
     db.project_metrics = Mock()
     db.task_events = Mock()
+    db.task_events.find_one = AsyncMock(return_value=None)
     db.project_events = Mock()
     return db
 
@@ -50,8 +55,7 @@ class TestAnalyticsService:
     @pytest.mark.asyncio
     async def test_get_user_dashboard_no_data(self, analytics_service, mock_db, monkeypatch):
         """Test dashboard with no user data"""
-        mock_db.user_metrics.find_one = AsyncMock(return_value=None)
-        mock_db.task_events.find.return_value.sort.return_value.limit.return_value.to_list = AsyncMock(return_value=[])
+        mock_db.user_metrics.aggregate.return_value.to_list = AsyncMock(return_value=[])
         
         monkeypatch.setattr(analytics_service, '_get_db', lambda: mock_db)
         
@@ -70,20 +74,18 @@ class TestAnalyticsService:
             "total_tasks": 10,
             "completed_tasks": 7,
             "active_projects": 3,
-            "completion_rate": 0.7
+            "completion_rate": 0.7,
+            "recent_events": [
+                {
+                    "event": "task_updated",
+                    "task_id": 1,
+                    "project_id": 1,
+                    "timestamp": datetime.now(timezone.utc)
+                }
+            ]
         }
         
-        recent_events = [
-            {
-                "event_type": "completed",
-                "task_id": 1,
-                "project_id": 1,
-                "timestamp": datetime.now(timezone.utc)
-            }
-        ]
-        
-        mock_db.user_metrics.find_one = AsyncMock(return_value=user_metrics)
-        mock_db.task_events.find.return_value.sort.return_value.limit.return_value.to_list = AsyncMock(return_value=recent_events)
+        mock_db.user_metrics.aggregate.return_value.to_list = AsyncMock(return_value=[user_metrics])
         
         monkeypatch.setattr(analytics_service, '_get_db', lambda: mock_db)
         
@@ -94,6 +96,11 @@ class TestAnalyticsService:
         assert result["active_projects"] == 3
         assert result["completion_rate"] == 0.7
         assert len(result["recent_activity"]) == 1
+        # Metrics and recent events come from a single aggregation
+        pipeline = mock_db.user_metrics.aggregate.call_args[0][0]
+        assert pipeline[0] == {"$match": {"user_id": 1}}
+        assert pipeline[-1]["$lookup"]["from"] == "task_events"
+        mock_db.task_events.find.assert_not_called()
 
     @pytest.mark.asyncio
     async def test_get_task_summary(self, analytics_service, mock_db, monkeypatch):
@@ -101,20 +108,18 @@ class TestAnalyticsService:
         user_metrics = {
             "total_tasks": 15,
             "completed_tasks": 10,
-            "completion_rate": 0.667
+            "completion_rate": 0.667,
+            "recent_events": [
+                {
+                    "task_id": 1,
+                    "project_id": 1,
+                    "title": "Completed Task",
+                    "timestamp": datetime.now(timezone.utc)
+                }
+            ]
         }
         
-        recent_completions = [
-            {
-                "task_id": 1,
-                "project_id": 1,
-                "task_data": {"title": "Completed Task"},
-                "timestamp": datetime.now(timezone.utc)
-            }
-        ]
-        
-        mock_db.user_metrics.find_one = AsyncMock(return_value=user_metrics)
-        mock_db.task_events.find.return_value.sort.return_value.limit.return_value.to_list = AsyncMock(return_value=recent_completions)
+        mock_db.user_metrics.aggregate.return_value.to_list = AsyncMock(return_value=[user_metrics])
         
         monkeypatch.setattr(analytics_service, '_get_db', lambda: mock_db)
         
@@ -126,6 +131,82 @@ class TestAnalyticsService:
         assert result["completion_rate"] == 0.667
         assert result["tasks_by_status"]["completed"] == 10
         assert result["tasks_by_status"]["pending"] == 5
+        assert result["recent_completions"][0]["title"] == "Completed Task"
+
+    @pytest.mark.asyncio
+    async def test_dashboard_and_summary_from_read_model(self, analytics_service, mock_db, monkeypatch):
+        """Test that the dashboard, task summary and version are single reads of the user's read model"""
+        now = datetime.now(timezone.utc)
+        dashboard = {
+            "total_tasks": 4,
+            "completed_tasks": 1,
+            "active_projects": 2,
+            "completion_rate": 0.25,
+            "version": 9,
+            "updated_at": now,
+            "recent_activity": [
+                {"type": "task", "event": "task_updated", "task_id": 3, "project_id": 1, "timestamp": now}
+            ],
+            "recent_completions": [
+                {"task_id": 3, "project_id": 1, "title": "Ship it", "completed_at": now}
+            ]
+        }
+        mock_db.user_dashboards = Mock()
+        mock_db.user_dashboards.find_one = AsyncMock(return_value=dashboard)
+        monkeypatch.setattr(settings, "DASHBOARD_READ_MODEL_ENABLED", True)
+        monkeypatch.setattr(analytics_service, '_get_db', lambda: mock_db)
+
+        result = await analytics_service.get_user_dashboard(1)
+        summary = await analytics_service.get_task_summary(1)
+
+        assert result["active_projects"] == 2
+        assert result["recent_activity"][0]["task_id"] == 3
+        assert summary["pending_tasks"] == 3
+        assert summary["recent_completions"][0]["title"] == "Ship it"
+        assert await analytics_service.user_version(1) == ("dashboard", 9, now)
+        assert mock_db.user_dashboards.find_one.call_args[0][0] == {"_id": 1}
+        mock_db.user_metrics.aggregate.assert_not_called()
+        mock_db.task_events.find_one.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_read_model_falls_back_when_missing(self, analytics_service, mock_db, monkeypatch):
+        """Test that users without a read model document are served from metrics and events"""
+        mock_db.user_dashboards = Mock()
+        mock_db.user_dashboards.find_one = AsyncMock(return_value=None)
+        mock_db.user_metrics.aggregate.return_value.to_list = AsyncMock(return_value=[])
+        monkeypatch.setattr(settings, "DASHBOARD_READ_MODEL_ENABLED", True)
+        monkeypatch.setattr(analytics_service, '_get_db', lambda: mock_db)
+
+        result = await analytics_service.get_user_dashboard(1)
+
+        assert result["total_tasks"] == 0
+        mock_db.user_metrics.aggregate.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_read_model_falls_back_before_first_snapshot(self, analytics_service, mock_db, monkeypatch):
+        """Test that a document with ring buffers but no snapshot totals is not served"""
+        now = datetime.utcnow()
+        mock_db.user_dashboards = Mock()
+        mock_db.user_dashboards.find_one = AsyncMock(return_value={
+            "version": 1,
+            "updated_at": now,
+            "recent_activity": [
+                {"type": "task", "event": "task_created", "task_id": 3, "project_id": 1, "timestamp": now}
+            ]
+        })
+        mock_db.user_metrics.aggregate.return_value.to_list = AsyncMock(return_value=[{
+            "total_tasks": 6, "completed_tasks": 2, "active_projects": 1, "completion_rate": 2 / 6,
+            "recent_events": []
+        }])
+        monkeypatch.setattr(settings, "DASHBOARD_READ_MODEL_ENABLED", True)
+        monkeypatch.setattr(analytics_service, '_get_db', lambda: mock_db)
+
+        result = await analytics_service.get_user_dashboard(1)
+        summary = await analytics_service.get_task_summary(1)
+
+        assert result["total_tasks"] == 6
+        assert summary["pending_tasks"] == 4
+        assert mock_db.user_metrics.aggregate.call_count == 2
 
     @pytest.mark.asyncio
     async def test_get_project_analytics_not_found(self, analytics_service, mock_db, monkeypatch):
@@ -152,15 +233,16 @@ class TestAnalyticsService:
         
         task_events = [
             {
-                "event_type": "created",
+                "_id": ObjectId(),
+                "event": "task_created",
                 "task_id": 1,
-                "task_data": {"title": "Task 1"},
+                "title": "Task 1",
                 "timestamp": datetime.now(timezone.utc)
             }
         ]
         
         mock_db.project_metrics.find_one = AsyncMock(return_value=project_metrics)
-        mock_db.task_events.find.return_value.sort.return_value.to_list = AsyncMock(return_value=task_events)
+        mock_db.task_events.find.return_value.sort.return_value.limit.return_value.to_list = AsyncMock(return_value=task_events)
         
         monkeypatch.setattr(analytics_service, '_get_db', lambda: mock_db)
         
@@ -173,24 +255,124 @@ class TestAnalyticsService:
         assert result["completion_rate"] == 0.625
         assert result["task_distribution"]["completed"] == 5
         assert result["task_distribution"]["pending"] == 3
+        assert result["timeline"][0]["task_title"] == "Task 1"
+        assert result["timeline_next_cursor"] is None
+
+    @pytest.mark.asyncio
+    async def test_get_project_timeline_pages_with_cursor(self, analytics_service, mock_db, monkeypatch):
+        """Test that a full page returns a cursor that resumes after its last event"""
+        now = datetime.now(timezone.utc)
+        task_events = [
+            {"_id": ObjectId(), "event": "task_created", "task_id": i, "title": f"Task {i}", "timestamp": now}
+            for i in range(3)
+        ]
+        
+        mock_db.project_metrics.find_one = AsyncMock(return_value={"_id": ObjectId()})
+        mock_db.task_events.find.return_value.sort.return_value.limit.return_value.to_list = AsyncMock(return_value=task_events)
+        
+        monkeypatch.setattr(analytics_service, '_get_db', lambda: mock_db)
+        
+        page = await analytics_service.get_project_timeline(1, 1, limit=2)
+        
+        assert [event["task_id"] for event in page["events"]] == [0, 1]
+        assert decode_cursor(page["next_cursor"]) == (now, task_events[1]["_id"])
+        
+        await analytics_service.get_project_timeline(1, 1, cursor=page["next_cursor"], limit=2)
+        query = mock_db.task_events.find.call_args[0][0]
+        assert query["$or"][1] == {"timestamp": now, "_id": {"$gt": task_events[1]["_id"]}}
+
+    @pytest.mark.asyncio
+    async def test_get_project_timeline_invalid_cursor(self, analytics_service, mock_db, monkeypatch):
+        """Test that a malformed cursor is rejected"""
+        monkeypatch.setattr(analytics_service, '_get_db', lambda: mock_db)
+        
+        with pytest.raises(ValueError):
+            await analytics_service.get_project_timeline(1, 1, cursor="not-a-cursor")
 
     @pytest.mark.asyncio
     async def test_get_productivity_insights(self, analytics_service, mock_db, monkeypatch):
         """Test productivity insights calculation"""
-        task_events = [
-            {
-                "timestamp": datetime.now(timezone.utc)
-            }
+        daily = [
+            {"_id": "2024-01-01", "count": 2},
+            {"_id": "2024-01-02", "count": 5}
         ]
         
-        mock_db.task_events.find.return_value.to_list = AsyncMock(return_value=task_events)
+        mock_db.task_events.aggregate.return_value.to_list = AsyncMock(return_value=daily)
         
         monkeypatch.setattr(analytics_service, '_get_db', lambda: mock_db)
         
-        result = await analytics_service.get_productivity_insights(1)
+        result = await analytics_service.get_productivity_insights(1, days=7, tz="Europe/Copenhagen")
         
         assert "daily_completions" in result
         assert "weekly_summary" in result
         assert "productivity_score" in result
         assert "recommendations" in result
-        assert isinstance(result["recommendations"], list)
\ No newline at end of file
+        assert isinstance(result["recommendations"], list)
+        assert result["daily_completions"] == {"2024-01-01": 2, "2024-01-02": 5}
+        assert result["weekly_summary"]["total_completions"] == 7
+        assert result["weekly_summary"]["avg_daily_completions"] == 1.0
+        assert result["weekly_summary"]["most_productive_day"] == "2024-01-02"
+
+        # Days are grouped server-side in the requested time zone
+        pipeline = mock_db.task_events.aggregate.call_args[0][0]
+        date_key = pipeline[1]["$group"]["_id"]["$dateToString"]
+        assert date_key["timezone"] == "Europe/Copenhagen"
+
+    @pytest.mark.asyncio
+    async def test_get_productivity_insights_unknown_time_zone(self, analytics_service, mock_db, monkeypatch):
+        """Test that an unknown time zone is rejected before querying"""
+        monkeypatch.setattr(analytics_service, '_get_db', lambda: mock_db)
+        
+        with pytest.raises(ValueError):
+            await analytics_service.get_productivity_insights(1, tz="Mars/Olympus_Mons")
+        mock_db.task_events.aggregate.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_get_activity_monthly_from_day_windows(self, analytics_service, mock_db, monkeypatch):
+        """Test that months are rolled up from day windows and zero-filled"""
+        mock_db.task_event_windows.aggregate.return_value.to_list = AsyncMock(return_value=[{
+            "counters": [
+                {"_id": datetime(2024, 2, 1), "events": 9, "created": 4, "updated": 5, "deleted": 0, "completed": 3}
+            ],
+            "transitions": [
+                {"_id": {"bucket": datetime(2024, 2, 1), "status": "completed"}, "count": 3},
+                {"_id": {"bucket": datetime(2024, 2, 1), "status": "in_progress"}, "count": 2}
+            ]
+        }])
+        monkeypatch.setattr(analytics_service, '_get_db', lambda: mock_db)
+
+        result = await analytics_service.get_activity(
+            1, datetime(2024, 1, 15, tzinfo=timezone.utc), datetime(2024, 4, 1, tzinfo=timezone.utc), "month"
+        )
+
+        assert [point["start"] for point in result["series"]] == [
+            datetime(2024, 1, 1), datetime(2024, 2, 1), datetime(2024, 3, 1)
+        ]
+        assert result["series"][0]["completed"] == 0
+        assert result["series"][1]["transitions"] == {"completed": 3, "in_progress": 2}
+        assert result["totals"]["created"] == 4
+        match = mock_db.task_event_windows.aggregate.call_args[0][0][0]["$match"]
+        assert match["granularity"] == "day"
+        assert match["project_id"] is None
+        assert match["window_start"] == {"$gte": datetime(2024, 1, 1), "$lt": datetime(2024, 4, 1)}
+
+    @pytest.mark.asyncio
+    async def test_get_activity_rejects_too_many_buckets(self, analytics_service, mock_db, monkeypatch):
+        """Test that a year of hourly buckets is refused before querying"""
+        monkeypatch.setattr(analytics_service, '_get_db', lambda: mock_db)
+
+        with pytest.raises(ValueError):
+            await analytics_service.get_activity(1, datetime(2023, 1, 1), datetime(2024, 1, 1), "hour")
+        mock_db.task_event_windows.aggregate.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_get_project_activity_not_owned(self, analytics_service, mock_db, monkeypatch):
+        """Test that another user's project returns None"""
+        mock_db.project_metrics.find_one = AsyncMock(return_value=None)
+        monkeypatch.setattr(analytics_service, '_get_db', lambda: mock_db)
+
+        result = await analytics_service.get_activity(
+            1, datetime(2024, 1, 1), datetime(2024, 1, 8), "day", project_id=5
+        )
+
+        assert result is None
@@ -0,0 +1,77 @@
+import pytest
+from unittest.mock import Mock, AsyncMock
+from app.services.analytics_service import AnalyticsService
+from app.services.cache import ResponseCache
+from datetime import datetime, timezone
+
+
+class TestResponseCache:
+    def test_hit_requires_same_version(self):
+        """Test that entries are only served for the version they were stored with"""
+        cache = ResponseCache(max_entries=10, ttl_seconds=60)
+        cache.set("k", 1, {"value": 1})
+
+        assert cache.get("k", 1) == {"value": 1}
+        assert cache.get("k", 2) is None
+        assert cache.get("k", 1) is None  # invalidated by the version mismatch
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 2
+        assert stats["invalidations"] == 1
+
+    def test_ttl_expiry(self, monkeypatch):
+        """Test that entries older than the TTL are not served"""
+        now = [1000.0]
+        monkeypatch.setattr("app.services.cache.time.monotonic", lambda: now[0])
+        cache = ResponseCache(max_entries=10, ttl_seconds=5)
+        cache.set("k", 1, "value")
+
+        now[0] += 6
+        assert cache.get("k", 1) is None
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first"""
+        cache = ResponseCache(max_entries=2, ttl_seconds=60)
+        cache.set("a", 1, "a")
+        cache.set("b", 1, "b")
+        cache.get("a", 1)
+        cache.set("c", 1, "c")
+
+        assert cache.get("b", 1) is None
+        assert cache.get("a", 1) == "a"
+        assert cache.get("c", 1) == "c"
+        assert cache.stats()["evictions"] == 1
+
+
+class TestAnalyticsServiceCaching:
+    @pytest.mark.asyncio
+    async def test_dashboard_served_from_cache_until_version_changes(self, monkeypatch):
+        """Test that a cached dashboard skips the aggregation until the user's version changes"""
+        service = AnalyticsService()
+        user_metrics = {
+            "user_id": 1,
+            "total_tasks": 4,
+            "completed_tasks": 2,
+            "active_projects": 1,
+            "completion_rate": 0.5,
+            "version": 1,
+            "updated_at": datetime.now(timezone.utc),
+        }
+        db = Mock()
+        db.user_metrics.find_one = AsyncMock(side_effect=lambda *args, **kwargs: dict(user_metrics))
+        db.task_events.find_one = AsyncMock(return_value=None)
+        db.user_metrics.aggregate.return_value.to_list = AsyncMock(
+            side_effect=lambda *args: [dict(user_metrics, recent_events=[])]
+        )
+        monkeypatch.setattr(service, "_get_db", lambda: db)
+
+        first = await service.get_user_dashboard(1)
+        second = await service.get_user_dashboard(1)
+        assert first == second
+        assert db.user_metrics.aggregate.call_count == 1
+
+        user_metrics["version"] = 2
+        await service.get_user_dashboard(1)
+        assert db.user_metrics.aggregate.call_count == 2
+        assert service.cache.stats()["hits"] == 1
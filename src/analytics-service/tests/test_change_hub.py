@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from pymongo.errors import OperationFailure
+from app.services.change_hub import ChangeHub
+
+
+class TestChangeHub:
+    @pytest.mark.asyncio
+    async def test_publish_wakes_only_that_users_subscribers(self):
+        """Test that a change fans out to the user's connections and no one else's"""
+        hub = ChangeHub()
+        first = hub.subscribe(1)
+        second = hub.subscribe(1)
+        other = hub.subscribe(2)
+
+        await hub.publish("user_metrics", {"user_id": 1})
+
+        assert first.get_nowait() == "user_metrics"
+        assert second.get_nowait() == "user_metrics"
+        assert other.empty()
+
+    @pytest.mark.asyncio
+    async def test_pending_wake_ups_are_coalesced(self):
+        """Test that a burst of changes leaves a single pending wake-up"""
+        hub = ChangeHub()
+        queue = hub.subscribe(1)
+
+        for _ in range(5):
+            await hub.publish("project_metrics", {"user_id": 1})
+
+        assert queue.qsize() == 1
+
+    @pytest.mark.asyncio
+    async def test_listeners_receive_every_document(self):
+        """Test that listeners see all changes and unsubscribing forgets the user"""
+        hub = ChangeHub()
+        listener = AsyncMock()
+        hub.add_listener(listener)
+        queue = hub.subscribe(3)
+        hub.unsubscribe(3, queue)
+
+        await hub.publish("user_metrics", {"user_id": 3, "total_tasks": 1})
+
+        listener.assert_awaited_once_with("user_metrics", "update", {"user_id": 3, "total_tasks": 1})
+        assert hub.stats()["connections"] == 0
+        assert hub.stats()["users"] == 0
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_polling_without_change_streams(self, monkeypatch):
+        """Test that a standalone server switches the watcher to polling"""
+        hub = ChangeHub()
+        monkeypatch.setattr(hub, "_watch", AsyncMock(side_effect=OperationFailure("not a replica set", code=40573)))
+        polling = asyncio.Event()
+
+        async def poll():
+            polling.set()
+            await asyncio.Event().wait()
+
+        monkeypatch.setattr(hub, "_poll", poll)
+
+        hub.start()
+        await asyncio.wait_for(polling.wait(), timeout=1)
+        assert hub.stats()["mode"] == "poll"
+        await hub.stop()
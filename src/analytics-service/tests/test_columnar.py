@@ -0,0 +1,135 @@
+import os
+from datetime import datetime, timedelta, timezone
+import pytest
+from bson import ObjectId
+from app.config import settings
+
+pytest.importorskip("pyarrow")
+from app.services import columnar  # noqa: E402
+from app.services.columnar import ColumnarStore  # noqa: E402
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def event(days_ago, event="task_updated", status=None, task_id=1, project_id=1, user_id=1, inserted=None):
+    ts = NOW - timedelta(days=days_ago)
+    return {
+        "_id": ObjectId.from_datetime(inserted or NOW - timedelta(minutes=5)),
+        "event": event,
+        "task_id": task_id,
+        "project_id": project_id,
+        "user_id": user_id,
+        "status": status,
+        "timestamp": ts.replace(tzinfo=None)
+    }
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, *args):
+        self.docs = sorted(self.docs, key=lambda doc: doc["_id"])
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def __aiter__(self):
+        return self._docs()
+
+    async def _docs(self):
+        for doc in self.docs:
+            yield doc
+
+
+class Collection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection):
+        id_range = query["_id"]
+        return Cursor([
+            doc for doc in self.docs
+            if doc["_id"] < id_range["$lt"] and ("$gte" not in id_range or doc["_id"] >= id_range["$gte"])
+        ])
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = {"task_events": Collection([]), "project_events": Collection([])}
+    monkeypatch.setattr(columnar, "get_database", lambda: db)
+    return db
+
+
+@pytest.fixture
+def store(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "COLUMNAR_INGEST_LAG_SECONDS", 0)
+    monkeypatch.setattr(settings, "COLUMNAR_BATCH_SIZE", 2)
+    return ColumnarStore(str(tmp_path))
+
+
+class TestColumnarStore:
+    @pytest.mark.asyncio
+    async def test_refresh_ingests_only_past_the_watermark(self, store, db, monkeypatch):
+        """Test that refreshes append events inserted since the watermark, late ones included, and compact parts"""
+        monkeypatch.setattr(settings, "COLUMNAR_MAX_PARTS", 2)
+        monkeypatch.setattr(settings, "COLUMNAR_INGEST_LAG_SECONDS", 3600)
+        docs = db["task_events"].docs
+        docs.extend(event(days, inserted=NOW - timedelta(days=days)) for days in (3, 2, 1))
+        # Timestamped ten days ago, inserted within the ingest lag
+        docs.append(event(10, inserted=NOW - timedelta(minutes=30)))
+        await store.refresh()
+        assert store.stats()["collections"]["task_events"]["rows"] == 3
+
+        monkeypatch.setattr(settings, "COLUMNAR_INGEST_LAG_SECONDS", 600)
+        await store.refresh()
+        assert store.stats()["collections"]["task_events"]["rows"] == 4
+        assert store.stats()["collections"]["task_events"]["parts"] == 2
+
+        docs.append(event(0))
+        monkeypatch.setattr(settings, "COLUMNAR_INGEST_LAG_SECONDS", 0)
+        await store.refresh()
+
+        stats = store.stats()["collections"]["task_events"]
+        assert stats["rows"] == 5
+        assert stats["parts"] == 1
+        def files():
+            return [name for name in os.listdir(os.path.join(store.path, "task_events")) if name.endswith(".parquet")]
+
+        # Compacted parts outlive one refresh, for processes that have not reopened the parts yet
+        assert len(files()) == 4
+        await store.refresh()
+        assert files() == store.state["task_events"]["parts"]
+
+    @pytest.mark.asyncio
+    async def test_trends_and_project_comparison(self, store, db):
+        """Test that trend buckets and project comparisons aggregate the snapshot"""
+        db["task_events"].docs = [
+            event(1, "task_created", task_id=1, project_id=1, user_id=1),
+            event(1, "task_updated", "completed", task_id=1, project_id=1, user_id=1),
+            event(1, "task_created", task_id=2, project_id=2, user_id=2),
+            event(0, "task_updated", "completed", task_id=2, project_id=2, user_id=2),
+            event(0, "task_created", task_id=3, project_id=2, user_id=3),
+        ]
+        db["project_events"].docs = [
+            {"_id": ObjectId.from_datetime(NOW - timedelta(days=5)), "event": "project_created", "project_id": 2,
+             "user_id": 2, "name": "Launch", "timestamp": (NOW - timedelta(days=5)).replace(tzinfo=None)}
+        ]
+        await store.refresh()
+
+        trends = await store.trends(NOW - timedelta(days=2), NOW + timedelta(days=1), "day")
+        assert [point["events"] for point in trends] == [3, 2]
+        assert [point["completed"] for point in trends] == [1, 1]
+        assert [point["active_users"] for point in trends] == [2, 2]
+
+        projects = await store.compare_projects()
+        assert sorted(project["project_id"] for project in projects) == [1, 2]
+        launch = next(project for project in projects if project["project_id"] == 2)
+        assert launch["project_name"] == "Launch"
+        assert launch["created"] == 2
+        assert launch["tasks"] == 2
+        assert launch["completion_ratio"] == 0.5
+
+        with pytest.raises(ValueError):
+            await store.trends(NOW, NOW - timedelta(days=1))
@@ -0,0 +1,32 @@
+import pytest
+from unittest.mock import Mock, AsyncMock
+from app import database
+from app.database import client_options, prewarm_connections
+
+
+class TestClientOptions:
+    def test_unset_timeouts_are_left_to_the_driver(self, monkeypatch):
+        """Test that zero-valued optional timeouts are not passed to Motor"""
+        monkeypatch.setattr(database.settings, "MONGODB_MAX_POOL_SIZE", 20)
+        monkeypatch.setattr(database.settings, "MONGODB_MIN_POOL_SIZE", 5)
+        monkeypatch.setattr(database.settings, "MONGODB_SOCKET_TIMEOUT_MS", 0)
+        monkeypatch.setattr(database.settings, "MONGODB_WAIT_QUEUE_TIMEOUT_MS", 2000)
+
+        options = client_options()
+
+        assert options["maxPoolSize"] == 20
+        assert options["minPoolSize"] == 5
+        assert options["waitQueueTimeoutMS"] == 2000
+        assert "socketTimeoutMS" not in options
+
+    @pytest.mark.asyncio
+    async def test_prewarm_is_capped_by_the_pool_size(self, monkeypatch):
+        """Test that pre-warming never asks for more connections than the pool holds"""
+        client = Mock()
+        client.admin.command = AsyncMock(return_value={"ok": 1})
+        monkeypatch.setattr(database.mongodb, "client", client)
+        monkeypatch.setattr(database.settings, "MONGODB_MAX_POOL_SIZE", 3)
+
+        await prewarm_connections(10)
+
+        assert client.admin.command.call_count == 3
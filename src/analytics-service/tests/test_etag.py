@@ -0,0 +1,28 @@
+class TestConditionalGet:
+    def test_matching_etag_returns_304_without_computing(self, client, mock_db):
+        """Test that a current If-None-Match short-circuits before the dashboard aggregation"""
+        first = client.get("/api/v1/analytics/dashboard")
+        assert first.status_code == 200
+        etag = first.headers["etag"]
+        assert etag.startswith('"')
+
+        second = client.get("/api/v1/analytics/dashboard", headers={"If-None-Match": etag})
+        assert second.status_code == 304
+        assert second.headers["etag"] == etag
+        assert mock_db.user_metrics.aggregate.call_count == 1
+
+    def test_etag_changes_with_version(self, client, user_metrics):
+        """Test that a worker snapshot (version bump) invalidates the ETag"""
+        etag = client.get("/api/v1/analytics/tasks/summary").headers["etag"]
+        user_metrics["version"] = 2
+
+        response = client.get("/api/v1/analytics/tasks/summary", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+    def test_etag_is_per_endpoint_and_parameters(self, client):
+        """Test that different views of the same user do not share a validator"""
+        dashboard = client.get("/api/v1/analytics/dashboard").headers["etag"]
+
+        response = client.get("/api/v1/analytics/tasks/summary", headers={"If-None-Match": dashboard})
+        assert response.status_code == 200
@@ -0,0 +1,123 @@
+import gzip
+import json
+from datetime import datetime
+import pytest
+from unittest.mock import Mock
+from bson import ObjectId
+from fastapi.testclient import TestClient
+from app.api import analytics
+from app.main import app
+from app.services import export
+from app.services.analytics_service import AnalyticsService
+
+
+ADMIN_HEADERS = {"X-User-Id": "1", "X-Username": "admin", "X-User-Role": "Admin"}
+USER_HEADERS = {"X-User-Id": "2", "X-Username": "alice", "X-User-Role": "User"}
+
+
+def events(count):
+    return [
+        {
+            "_id": ObjectId(),
+            "event": "task_updated",
+            "task_id": i,
+            "project_id": 2,
+            "user_id": 7,
+            "username": "alice",
+            "status": "completed",
+            "timestamp": datetime(2024, 1, 1, 12, 0, i % 60)
+        }
+        for i in range(count)
+    ]
+
+
+async def iterate(docs):
+    for doc in docs:
+        yield doc
+
+
+async def collect(chunks):
+    return [chunk async for chunk in chunks]
+
+
+class TestExportQuery:
+    def test_filters_and_resume_cursor(self):
+        """Test that the filter covers user, time range and resumes after the cursor _id"""
+        last = ObjectId()
+        query = export.export_query(
+            user_id=7, start=datetime(2024, 1, 1), end=datetime(2024, 2, 1), cursor=str(last)
+        )
+
+        assert query == {
+            "user_id": 7,
+            "timestamp": {"$gte": datetime(2024, 1, 1), "$lt": datetime(2024, 2, 1)},
+            "_id": {"$gt": last}
+        }
+        assert export.export_hint(query) == [("user_id", 1), ("_id", 1)]
+        assert export.export_hint(export.export_query(project_id=2)) == [("project_id", 1), ("_id", 1)]
+
+    def test_rejects_bad_cursor_and_fields(self):
+        """Test that unknown fields and malformed cursors are rejected"""
+        with pytest.raises(ValueError):
+            export.export_query(cursor="not-an-id")
+        with pytest.raises(ValueError):
+            export.export_fields(["task_id", "password"])
+        assert export.export_fields(["timestamp", "task_id"]) == ["task_id", "timestamp"]
+
+    def test_service_projects_and_hints(self, monkeypatch):
+        """Test that the export cursor projects the fields and walks the hinted index in _id order"""
+        db = Mock()
+        service = AnalyticsService()
+        monkeypatch.setattr(service, '_get_db', lambda: db)
+
+        service.export_task_events({"project_id": 2}, ["task_id", "status"], 5000)
+
+        collection = db.get_collection.return_value
+        assert collection.find.call_args[0] == ({"project_id": 2}, {"task_id": 1, "status": 1})
+        collection.find.return_value.sort.assert_called_with("_id", 1)
+        collection.find.return_value.sort.return_value.hint.assert_called_with([("project_id", 1), ("_id", 1)])
+
+
+class TestExportFormats:
+    @pytest.mark.asyncio
+    async def test_gzip_ndjson_in_batches(self):
+        """Test that NDJSON is gzipped, projected and carries the _id to resume from"""
+        docs = events(2500)
+
+        chunks = await collect(export.ndjson_chunks(iterate(docs), ["task_id", "timestamp"], 1000))
+
+        lines = gzip.decompress(b"".join(chunks)).splitlines()
+        assert len(lines) == 2500
+        first = json.loads(lines[0])
+        assert first == {"_id": str(docs[0]["_id"]), "task_id": 0, "timestamp": "2024-01-01T12:00:00+00:00"}
+        assert json.loads(lines[-1])["_id"] == str(docs[-1]["_id"])
+
+    @pytest.mark.asyncio
+    async def test_arrow_stream(self):
+        """Test that the Arrow IPC stream holds every event with typed columns"""
+        pa = pytest.importorskip("pyarrow")
+        docs = events(25)
+
+        chunks = await collect(export.arrow_chunks(iterate(docs), export.export_fields(None), 10))
+
+        table = pa.ipc.open_stream(b"".join(chunks)).read_all()
+        assert table.num_rows == 25
+        assert table.schema.field("timestamp").type == pa.timestamp("ms", tz="UTC")
+        assert table.column("task_id").to_pylist() == list(range(25))
+        assert table.column("title").null_count == 25
+
+
+class TestExportEndpoint:
+    def test_requires_admin_role(self, monkeypatch):
+        """Test that only the Admin role can export, and that other users never reach the database"""
+        export_task_events = Mock(side_effect=lambda *args: iterate(events(3)))
+        monkeypatch.setattr(analytics.analytics_service, "export_task_events", export_task_events)
+        client = TestClient(app)
+
+        assert client.get("/api/v1/admin/export/task-events", headers=USER_HEADERS).status_code == 403
+        assert client.get("/api/v1/admin/export/task-events").status_code == 401
+        export_task_events.assert_not_called()
+
+        response = client.get("/api/v1/admin/export/task-events?compress=false", headers=ADMIN_HEADERS)
+        assert response.status_code == 200
+        assert len(response.content.splitlines()) == 3
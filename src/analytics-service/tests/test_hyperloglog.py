@@ -0,0 +1,80 @@
+from datetime import date
+import pytest
+from unittest.mock import Mock
+from bson import Binary
+from app.services.analytics_service import AnalyticsService
+from app.services.hyperloglog import HyperLogLog
+
+
+def sketch_of(items):
+    sketch = HyperLogLog()
+    for item in items:
+        sketch.add(item)
+    return sketch
+
+
+class TestHyperLogLog:
+    @pytest.mark.parametrize("cardinality", [1, 100, 3000, 50000])
+    def test_estimate_within_error_bound(self, cardinality):
+        """Test that estimates stay within three standard errors at small and large cardinalities"""
+        sketch = sketch_of(f"user-{i}" for i in range(cardinality))
+
+        assert sketch.count() == pytest.approx(cardinality, rel=3 * sketch.relative_error)
+
+    def test_merge_counts_the_union(self):
+        """Test that merged shards estimate the union and match a register-wise max"""
+        first = sketch_of(range(0, 30000))
+        second = sketch_of(range(20000, 50000))
+        expected = bytearray(map(max, first.registers, second.registers))
+
+        assert first.merge(second) is True
+        assert first.registers == expected
+        assert first.count() == pytest.approx(50000, rel=3 * first.relative_error)
+        assert first.merge(sketch_of(range(100))) is False
+
+    def test_encoding_is_sparse_until_dense_is_smaller(self):
+        """Test that small sketches encode a few bytes per item and large ones as raw registers"""
+        small = sketch_of(range(10))
+        large = sketch_of(range(100000))
+
+        assert len(small.to_bytes()) < 40
+        assert len(large.to_bytes()) == 2 + 4096
+        for sketch in (small, large):
+            assert HyperLogLog.from_bytes(sketch.to_bytes()).registers == sketch.registers
+
+
+class TestCountDistinct:
+    @pytest.mark.asyncio
+    async def test_merges_daily_shards(self, monkeypatch):
+        """Test that the shards of every day in the range are merged into one estimate"""
+        shards = [sketch_of(range(day * 500, day * 500 + 1000)) for day in range(7)]
+        docs = [{"registers": Binary(shard.to_bytes())} for shard in shards]
+
+        class Cursor:
+            def __aiter__(self):
+                return self._docs()
+
+            async def _docs(self):
+                for doc in docs:
+                    yield doc
+
+        db = Mock()
+        db.distinct_sketches.find = Mock(return_value=Cursor())
+        service = AnalyticsService()
+        monkeypatch.setattr(service, '_get_db', lambda: db)
+
+        result = await service.count_distinct("project_tasks", date(2024, 1, 1), date(2024, 1, 7), scope=3)
+
+        assert result["days"] == 7
+        assert result["sketches"] == 7
+        assert result["estimate"] == pytest.approx(4000, rel=0.05)
+        assert result["low"] < 4000 < result["high"]
+        query = db.distinct_sketches.find.call_args[0][0]
+        assert query["scope"] == 3
+        assert query["day"]["$lte"].day == 7
+
+    @pytest.mark.asyncio
+    async def test_rejects_reversed_range(self):
+        """Test that a range ending before it starts is rejected"""
+        with pytest.raises(ValueError):
+            await AnalyticsService().count_distinct("active_users", date(2024, 1, 7), date(2024, 1, 1))
@@ -0,0 +1,80 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import Mock
+from fastapi.testclient import TestClient
+from app import instrumentation
+from app.instrumentation import RequestTrace, command_listener, command_shape, _current_trace
+from app.main import app
+
+
+def started_event(request_id, command_name, command):
+    return SimpleNamespace(request_id=request_id, command_name=command_name, command=command)
+
+
+def succeeded_event(request_id, command_name, reply, micros=2500):
+    return SimpleNamespace(request_id=request_id, command_name=command_name, reply=reply, duration_micros=micros)
+
+
+class TestCommandShape:
+    def test_literals_are_masked(self):
+        """Test that queries differing only in their values share a shape"""
+        first = command_shape("find", {
+            "find": "task_events", "filter": {"user_id": {"$in": [1, "1"]}, "project_id": 3}, "sort": {"timestamp": 1}
+        })
+        second = command_shape("find", {
+            "find": "task_events", "filter": {"user_id": {"$in": [2, "2"]}, "project_id": 9}, "sort": {"timestamp": 1}
+        })
+
+        assert first == second
+        assert first == 'find {"filter":{"user_id":{"$in":"?"},"project_id":"?"},"sort":{"timestamp":1}}'
+
+    def test_pipeline_stages_keep_their_structure(self):
+        """Test that aggregation stages are kept while their arguments are masked"""
+        shape = command_shape("aggregate", {
+            "aggregate": "user_metrics", "pipeline": [{"$match": {"user_id": 1}}, {"$limit": 1}]
+        })
+
+        assert shape == 'aggregate {"pipeline":[{"$match":{"user_id":"?"}},{"$limit":"?"}]}'
+
+
+class TestCommandListener:
+    def test_commands_are_attributed_to_the_current_request(self):
+        """Test that a command issued inside a request lands in that request's trace"""
+        trace = RequestTrace()
+        token = _current_trace.set(trace)
+        try:
+            command_listener.started(started_event(1, "find", {"find": "task_events", "filter": {"project_id": 3}}))
+            reply = {"cursor": {"firstBatch": [{"a": 1}, {"a": 2}]}, "ok": 1}
+            command_listener.succeeded(succeeded_event(1, "find", reply))
+        finally:
+            _current_trace.reset(token)
+
+        assert len(trace.commands) == 1
+        record = trace.commands[0]
+        assert record.collection == "task_events"
+        assert record.documents == 2
+        assert record.bytes > 0
+        assert trace.mongo_seconds == pytest.approx(0.0025)
+
+
+class TestMiddleware:
+    def test_metrics_expose_route_templates(self):
+        """Test that latency is labelled with the route template, not the raw path"""
+        client = TestClient(app)
+        client.get("/api/v1/analytics/health")
+
+        body = client.get("/metrics").text
+
+        assert 'http_request_duration_seconds_count{method="GET",route="/api/v1/analytics/health",status="200"}' in body
+
+    def test_slow_requests_are_logged(self, monkeypatch):
+        """Test that requests above SLOW_REQUEST_MS are logged"""
+        monkeypatch.setattr(instrumentation.settings, "SLOW_REQUEST_MS", 0)
+        logger = Mock()
+        monkeypatch.setattr(instrumentation, "logger", logger)
+
+        TestClient(app).get("/api/v1/analytics/health")
+
+        logger.warning.assert_called_once()
+        assert logger.warning.call_args.kwargs["route"] == "/api/v1/analytics/health"
+        assert logger.warning.call_args.kwargs["queries"] == []
@@ -0,0 +1,115 @@
+import pytest
+from unittest.mock import Mock, AsyncMock
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+from app.config import settings
+from app.services.leaderboard import LeaderboardService, USER_VIEW, PROJECT_VIEW, VIEW_STATE, REFRESH_LEASE
+
+
+@pytest.fixture
+def mock_db():
+    db = Mock()
+    collections = {}
+
+    def collection(name):
+        if name not in collections:
+            coll = Mock()
+            coll.aggregate.return_value.to_list = AsyncMock(return_value=[])
+            coll.find_one = AsyncMock(return_value=None)
+            coll.update_one = AsyncMock()
+            coll.delete_many = AsyncMock()
+            coll.find_one_and_update = AsyncMock()
+            collections[name] = coll
+        return collections[name]
+
+    db.__getitem__ = Mock(side_effect=collection)
+    db.user_metrics = collection("user_metrics")
+    db.project_metrics = collection("project_metrics")
+    return db
+
+
+@pytest.fixture
+def leaderboard(mock_db):
+    service = LeaderboardService()
+    service.db = mock_db
+    return service
+
+
+class TestLeaderboardService:
+    @pytest.mark.asyncio
+    async def test_incremental_refresh_merges_only_changed_metrics(self, leaderboard, mock_db):
+        """Test that a refresh after a previous run only selects metrics updated since then"""
+        previous = datetime(2024, 1, 1, 12, 0, 0)
+        mock_db["materialized_view_state"].find_one = AsyncMock(return_value={"refreshed_through": previous})
+
+        await leaderboard.refresh()
+
+        pipeline = mock_db.user_metrics.aggregate.call_args[0][0]
+        overlap = timedelta(seconds=settings.LEADERBOARD_REFRESH_OVERLAP_SECONDS)
+        assert pipeline[0] == {"$match": {"updated_at": {"$gte": previous - overlap}}}
+        assert pipeline[-1]["$merge"]["into"] == USER_VIEW
+        assert mock_db.project_metrics.aggregate.call_args[0][0][-1]["$merge"]["on"] == ["project_id", "user_id"]
+        mock_db[PROJECT_VIEW].delete_many.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_full_refresh_rewrites_everything_and_drops_stale_rows(self, leaderboard, mock_db):
+        """Test that a full refresh scans all metrics and removes rows it did not rewrite"""
+        mock_db["materialized_view_state"].find_one = AsyncMock(
+            return_value={"refreshed_through": datetime(2024, 1, 1)}
+        )
+
+        await leaderboard.refresh(full=True)
+
+        assert "$match" not in mock_db.user_metrics.aggregate.call_args[0][0][0]
+        mock_db[USER_VIEW].delete_many.assert_awaited_once()
+        mock_db[PROJECT_VIEW].delete_many.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_completion_rate_ranking_requires_minimum_tasks(self, leaderboard, mock_db):
+        """Test that users with too few tasks are left out of the completion rate ranking"""
+        mock_db[USER_VIEW].find.return_value.sort.return_value.limit.return_value.to_list = AsyncMock(return_value=[])
+
+        await leaderboard.top_users("completion_rate", 10)
+
+        query = mock_db[USER_VIEW].find.call_args[0][0]
+        assert query == {"total_tasks": {"$gte": settings.LEADERBOARD_MIN_TASKS}}
+        mock_db[USER_VIEW].find.return_value.sort.assert_called_with("completion_rate", -1)
+
+    @pytest.mark.asyncio
+    async def test_unknown_ranking_is_rejected(self, leaderboard):
+        """Test that only indexed ranking fields can be sorted on"""
+        with pytest.raises(ValueError):
+            await leaderboard.top_projects("username", 10)
+
+    @pytest.mark.asyncio
+    async def test_refresh_takes_the_lease(self, leaderboard, mock_db):
+        """Test that a refresh takes or renews the lease for this process"""
+        await leaderboard.refresh()
+
+        query, update = mock_db[VIEW_STATE].find_one_and_update.call_args[0]
+        assert query["_id"] == REFRESH_LEASE
+        assert {"holder": leaderboard.holder} in query["$or"]
+        assert update["$set"]["holder"] == leaderboard.holder
+        assert mock_db[VIEW_STATE].find_one_and_update.call_args[1]["upsert"] is True
+
+    @pytest.mark.asyncio
+    async def test_refresh_refused_while_another_process_holds_the_lease(self, leaderboard, mock_db):
+        """Test that only the lease holder merges into the views"""
+        mock_db[VIEW_STATE].find_one_and_update = AsyncMock(side_effect=DuplicateKeyError("E11000"))
+
+        with pytest.raises(RuntimeError):
+            await leaderboard.refresh(full=True)
+
+        mock_db.user_metrics.aggregate.assert_not_called()
+        mock_db[USER_VIEW].delete_many.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_full_refresh_keeps_rows_after_losing_the_lease(self, leaderboard, mock_db):
+        """Test that a full run that lost its lease midway does not delete rows"""
+        mock_db[VIEW_STATE].find_one_and_update = AsyncMock(side_effect=[None, DuplicateKeyError("E11000")])
+
+        await leaderboard.refresh(full=True)
+
+        mock_db.user_metrics.aggregate.assert_called_once()
+        mock_db[USER_VIEW].delete_many.assert_not_called()
+        mock_db[PROJECT_VIEW].delete_many.assert_not_called()
@@ -0,0 +1,125 @@
+import asyncio
+import pytest
+from unittest.mock import Mock, AsyncMock
+from datetime import datetime, timedelta
+from bson import ObjectId
+from app.services.analytics_service import AnalyticsService
+from app.services.change_hub import ChangeHub
+from app.services.metrics_replica import MetricsReplica
+
+
+def user_doc(user_id, total_tasks, updated_at):
+    return {
+        "_id": ObjectId(), "user_id": user_id, "username": f"user{user_id}", "total_tasks": total_tasks,
+        "completed_tasks": 0, "active_projects": 0, "completion_rate": 0.0, "version": 1, "updated_at": updated_at,
+    }
+
+
+@pytest.fixture
+def mock_db(monkeypatch):
+    db = Mock()
+    db.user_metrics.find_one = AsyncMock(return_value=None)
+    db.project_metrics.find.return_value.__aiter__ = lambda self: _empty()
+    monkeypatch.setattr("app.services.metrics_replica.get_database", lambda: db)
+    return db
+
+
+async def _empty():
+    return
+    yield
+
+
+@pytest.fixture
+def replica(mock_db):
+    hub = ChangeHub()
+    hub.mode = "change_stream"
+    return MetricsReplica(hub, max_users=2)
+
+
+class TestMetricsReplica:
+    @pytest.mark.asyncio
+    async def test_changes_update_resident_users_only(self, replica, mock_db):
+        """Test that the change feed updates loaded users, keeps the newest copy and ignores others"""
+        now = datetime(2024, 1, 1)
+        mock_db.user_metrics.find_one = AsyncMock(return_value=user_doc(1, 1, now))
+        await replica.get(1)
+
+        await replica.apply("user_metrics", "update", user_doc(1, 5, now + timedelta(seconds=1)))
+        await replica.apply("user_metrics", "update", user_doc(1, 3, now))  # older, out of order
+        await replica.apply("user_metrics", "update", user_doc(2, 9, now))  # not resident
+
+        entry = await replica.get(1)
+        assert entry.user["total_tasks"] == 5
+        assert replica.stats()["users"] == 1
+        assert mock_db.user_metrics.find_one.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_project_delete_is_routed_by_id(self, replica):
+        """Test that a delete, which only carries the _id, removes the resident project"""
+        await replica.get(1)
+        project = {"_id": ObjectId(), "project_id": 7, "user_id": 1, "updated_at": datetime(2024, 1, 1)}
+        await replica.apply("project_metrics", "insert", project)
+        assert 7 in (await replica.get(1)).projects
+
+        await replica.apply("project_metrics", "delete", {"_id": project["_id"]})
+        assert (await replica.get(1)).projects == {}
+
+    @pytest.mark.asyncio
+    async def test_least_recently_used_user_is_evicted(self, replica):
+        """Test that residency is bounded by max_users"""
+        await replica.get(1)
+        await replica.get(2)
+        await replica.get(1)
+        await replica.get(3)
+
+        stats = replica.stats()
+        assert stats["users"] == 2
+        assert stats["evictions"] == 1
+        assert 2 not in replica._entries
+
+    @pytest.mark.asyncio
+    async def test_not_serving_without_change_stream(self, replica):
+        """Test that the replica steps aside when the hub is polling"""
+        replica.hub.mode = "poll"
+        assert await replica.get(1) is None
+
+    @pytest.mark.asyncio
+    async def test_dashboard_metrics_come_from_memory(self, replica, monkeypatch):
+        """Test that a resident user's dashboard only queries the recent events"""
+        service = AnalyticsService(replica=replica)
+        entry = await replica.get(1)
+        entry.user = user_doc(1, 4, datetime(2024, 1, 1))
+        db = Mock()
+        db.task_events.find_one = AsyncMock(return_value=None)
+        db.task_events.find.return_value.sort.return_value.limit.return_value.to_list = AsyncMock(return_value=[])
+        monkeypatch.setattr(service, "_get_db", lambda: db)
+
+        result = await service.get_user_dashboard(1)
+
+        assert result["total_tasks"] == 4
+        db.user_metrics.find_one.assert_not_called()
+        db.user_metrics.aggregate.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_reads_wait_for_one_load(self, replica, mock_db):
+        """Test that a read during a user's load waits for it instead of seeing a half-built entry"""
+        now = datetime(2024, 1, 1)
+        loaded = asyncio.Event()
+
+        async def find_one(*args, **kwargs):
+            await loaded.wait()
+            return user_doc(1, 4, now)
+
+        mock_db.user_metrics.find_one = AsyncMock(side_effect=find_one)
+        first = asyncio.ensure_future(replica.get(1))
+        second = asyncio.ensure_future(replica.get(1))
+        await asyncio.sleep(0)
+        assert replica.stats()["users"] == 0
+        loaded.set()
+
+        entries = await asyncio.gather(first, second)
+
+        assert entries[0] is entries[1]
+        assert entries[1].user["total_tasks"] == 4
+        assert mock_db.user_metrics.find_one.call_count == 1
+        assert replica.stats()["users"] == 1
@@ -0,0 +1,14 @@
+import pytest
+from app.models import coerce_user_id
+
+
+class TestCoerceUserId:
+    @pytest.mark.parametrize("value,expected", [("7", 7), (" 7 ", 7), ("-3", -3), (42, 42)])
+    def test_numeric_strings_become_ints(self, value, expected):
+        """Test that ASCII numeric strings, as stored by older producers, are converted"""
+        assert coerce_user_id(value) == expected
+
+    @pytest.mark.parametrize("value", ["²", "٣", "7a", "", "-", "+5"])
+    def test_other_strings_are_left_alone(self, value):
+        """Test that strings Mongo's $toInt would reject are not converted"""
+        assert coerce_user_id(value) == value
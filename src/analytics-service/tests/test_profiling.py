@@ -0,0 +1,114 @@
+import asyncio
+import json
+import os
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.config import settings
+from app import profiling
+from app.profiling import capture_profile
+
+
+ADMIN_HEADERS = {"X-User-Id": "1", "X-Username": "admin", "X-User-Role": "Admin"}
+USER_HEADERS = {"X-User-Id": "2", "X-Username": "alice", "X-User-Role": "User"}
+
+
+def spin(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class TestProfiling:
+    @pytest.mark.asyncio
+    async def test_capture_profile_writes_files(self, tmp_path):
+        """Test that a capture produces folded stacks, allocations, task stacks and a summary"""
+        stop = threading.Event()
+        busy = threading.Thread(target=spin, args=(stop,), name="busy")
+        busy.start()
+        try:
+            summary = await capture_profile(0.2, str(tmp_path), interval=0.01)
+        finally:
+            stop.set()
+            busy.join()
+
+        for path in summary["files"].values():
+            assert os.path.exists(path)
+        assert summary["cpu_samples"] > 0
+        assert summary["event_loop_lag"]["samples"] > 0
+
+        with open(summary["files"]["cpu"]) as f:
+            first_line = f.readline().strip()
+        stack, count = first_line.rsplit(" ", 1)
+        assert ";" in stack
+        assert int(count) > 0
+
+        with open(summary["files"]["summary"]) as f:
+            assert json.load(f)["pid"] == os.getpid()
+
+    @pytest.mark.asyncio
+    async def test_idle_threads_are_not_sampled(self, tmp_path):
+        """Test that only threads using CPU show up in the profile, not ones blocked waiting"""
+        stop = threading.Event()
+        idle = threading.Thread(target=stop.wait, name="idle")
+        busy = threading.Thread(target=spin, args=(stop,), name="busy")
+        idle.start()
+        busy.start()
+        try:
+            summary = await capture_profile(0.3, str(tmp_path), interval=0.01)
+        finally:
+            stop.set()
+            idle.join()
+            busy.join()
+
+        with open(summary["files"]["cpu"]) as f:
+            roots = {line.split(";", 1)[0] for line in f}
+        assert "busy" in roots
+        assert "idle" not in roots
+
+    @pytest.mark.asyncio
+    async def test_one_capture_at_a_time(self, tmp_path):
+        """Test that a second capture is refused while one is running"""
+        first = asyncio.create_task(capture_profile(0.2, str(tmp_path), interval=0.01))
+        await asyncio.sleep(0.05)
+
+        with pytest.raises(RuntimeError):
+            await capture_profile(0.2, str(tmp_path))
+        assert (await first)["cpu_samples"] > 0
+
+    def test_profile_endpoint_requires_admin(self, monkeypatch):
+        """Test that only the Admin role can start a capture"""
+        monkeypatch.setattr(settings, "PROFILING_ENABLED", True)
+        client = TestClient(app)
+
+        response = client.post("/api/v1/admin/profile?seconds=1", headers=USER_HEADERS)
+        assert response.status_code == 403
+
+    def test_profile_endpoint_conflict_while_capturing(self, monkeypatch):
+        """Test that a capture requested while another runs in the process answers 409"""
+        monkeypatch.setattr(settings, "PROFILING_ENABLED", True)
+
+        lock = asyncio.Lock()
+        asyncio.run(lock.acquire())
+        monkeypatch.setattr(profiling, "_capture_lock", lock)
+        client = TestClient(app)
+
+        response = client.post("/api/v1/admin/profile?seconds=1", headers=ADMIN_HEADERS)
+        assert response.status_code == 409
+
+    def test_profile_endpoint_disabled(self, monkeypatch):
+        """Test that the profile endpoint is hidden unless enabled"""
+        monkeypatch.setattr(settings, "PROFILING_ENABLED", False)
+        client = TestClient(app)
+
+        response = client.post("/api/v1/admin/profile?seconds=1", headers=ADMIN_HEADERS)
+        assert response.status_code == 404
+
+    def test_profile_endpoint_rejects_long_captures(self, monkeypatch):
+        """Test that captures longer than the configured maximum are rejected"""
+        monkeypatch.setattr(settings, "PROFILING_ENABLED", True)
+        monkeypatch.setattr(settings, "PROFILING_MAX_SECONDS", 5)
+        client = TestClient(app)
+
+        response = client.post("/api/v1/admin/profile?seconds=10", headers=ADMIN_HEADERS)
+        assert response.status_code == 400
@@ -0,0 +1,36 @@
+import pytest
+from datetime import datetime
+from pydantic import ValidationError
+from app.api import analytics
+from app.models import DashboardResponse
+from app.responses import dumps
+
+
+RECENT_EVENTS = [
+    # Naive, as Mongo returns datetimes
+    {"event": "task_created", "task_id": 7, "project_id": 3, "timestamp": datetime(2024, 1, 1, 10, 30)}
+]
+
+
+class TestSerialization:
+    def test_naive_datetimes_are_encoded_as_utc(self):
+        """Test that naive Mongo datetimes are tagged as UTC"""
+        assert dumps({"at": datetime(2024, 1, 1, 10, 30)}) == b'{"at":"2024-01-01T10:30:00+00:00"}'
+
+    @pytest.mark.parametrize("recent_events", [RECENT_EVENTS])
+    def test_dashboard_is_encoded_without_revalidation(self, client):
+        """Test that the dashboard is returned as encoded by orjson, with its ETag"""
+        response = client.get("/api/v1/analytics/dashboard")
+
+        assert response.status_code == 200
+        assert response.headers["etag"].startswith('"')
+        assert response.json()["recent_activity"][0]["timestamp"] == "2024-01-01T10:30:00+00:00"
+
+    @pytest.mark.parametrize("recent_events", [RECENT_EVENTS])
+    def test_validation_can_be_enabled(self, client, monkeypatch):
+        """Test that RESPONSE_VALIDATION_ENABLED checks results against the response model"""
+        monkeypatch.setattr(analytics.settings, "RESPONSE_VALIDATION_ENABLED", True)
+        assert client.get("/api/v1/analytics/dashboard").status_code == 200
+
+        with pytest.raises(ValidationError):
+            analytics._respond(DashboardResponse, {"total_tasks": "many"})
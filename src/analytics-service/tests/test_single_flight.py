@@ -0,0 +1,88 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from app.services.analytics_service import AnalyticsService
+from app.services.single_flight import SingleFlight
+
+
+class TestSingleFlight:
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_one_computation(self):
+        """Test that identical concurrent calls run once and all get the result"""
+        flight = SingleFlight()
+        release = asyncio.Event()
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return {"value": 1}
+
+        waiters = [asyncio.create_task(flight.do("k", compute)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters)
+
+        assert calls == 1
+        assert all(result == {"value": 1} for result in results)
+        assert flight.stats() == {"in_flight": 0, "leaders": 1, "collapsed": 4, "collapse_rate": 0.8}
+
+        # Released once finished: the next call computes again
+        await flight.do("k", compute)
+        assert calls == 2
+
+    @pytest.mark.asyncio
+    async def test_errors_reach_every_caller(self):
+        """Test that a failed computation raises in every waiting caller"""
+        flight = SingleFlight()
+
+        async def compute():
+            await asyncio.sleep(0)
+            raise RuntimeError("mongo down")
+
+        results = await asyncio.gather(*(flight.do("k", compute) for _ in range(3)), return_exceptions=True)
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert flight.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_others(self):
+        """Test that the first caller going away leaves the shared computation running"""
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            return "done"
+
+        first = asyncio.create_task(flight.do("k", compute))
+        second = asyncio.create_task(flight.do("k", compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await second == "done"
+        assert first.cancelled()
+
+
+class TestServiceSingleFlight:
+    @pytest.mark.asyncio
+    async def test_concurrent_dashboards_collapse(self, monkeypatch):
+        """Test that concurrent dashboard misses for the same user and version query Mongo once"""
+        service = AnalyticsService()
+
+        async def compute(user_id):
+            await asyncio.sleep(0.01)
+            return {"user_id": user_id}
+
+        compute_mock = AsyncMock(side_effect=compute)
+        monkeypatch.setattr(service, "_compute_user_dashboard", compute_mock)
+
+        results = await asyncio.gather(*(service.get_user_dashboard(1, version=(1,)) for _ in range(10)))
+        await service.get_user_dashboard(1, version=(2,))
+
+        assert results == [{"user_id": 1}] * 10
+        assert compute_mock.await_count == 2
+        assert service.single_flight.collapsed == 9
@@ -0,0 +1,88 @@
+import bisect
+import random
+import pytest
+from unittest.mock import Mock, AsyncMock
+from bson import Binary
+from app.services.analytics_service import AnalyticsService
+from app.services.tdigest import TDigest
+
+
+def rank(values, x):
+    return bisect.bisect(values, x) / len(values)
+
+
+class TestTDigest:
+    def test_merged_quantiles_have_small_rank_error(self):
+        """Test that digests built apart and merged track the exact quantiles"""
+        rng = random.Random(7)
+        values = [rng.lognormvariate(2, 1.2) for _ in range(20000)]
+        parts = [TDigest() for _ in range(8)]
+        for i, value in enumerate(values):
+            parts[i % len(parts)].add(value)
+
+        merged = TDigest()
+        for part in parts:
+            merged.merge(TDigest.from_bytes(part.to_bytes()))
+
+        ordered = sorted(values)
+        for q in (0.5, 0.9, 0.99):
+            assert rank(ordered, merged.quantile(q)) == pytest.approx(q, abs=0.005)
+        assert merged.count == len(values)
+        assert merged.mean == pytest.approx(sum(values) / len(values), rel=1e-4)
+
+    def test_encoding_is_compact(self):
+        """Test that a digest of many values stays around a kilobyte"""
+        digest = TDigest()
+        for i in range(100000):
+            digest.add(i % 977)
+
+        assert len(digest.to_bytes()) < 1024
+        assert TDigest.from_bytes(digest.to_bytes()).quantile(1.0) == 976
+
+
+class TestCycleTimes:
+    @pytest.mark.asyncio
+    async def test_merge_cycle_times_over_projects(self, monkeypatch):
+        """Test that admin percentiles merge the stored project digests"""
+        first, second = TDigest(), TDigest()
+        for hours in range(1, 51):
+            first.add(hours)
+            second.add(hours + 50)
+        docs = [{"cycle_time_digest": Binary(first.to_bytes())}, {"cycle_time_digest": Binary(second.to_bytes())}]
+
+        class Cursor:
+            def __aiter__(self):
+                return self._docs()
+
+            async def _docs(self):
+                for doc in docs:
+                    yield doc
+
+        db = Mock()
+        db.project_metrics.find = Mock(return_value=Cursor())
+        service = AnalyticsService()
+        monkeypatch.setattr(service, '_get_db', lambda: db)
+
+        result = await service.merge_cycle_times([1, 2])
+
+        assert result["digests"] == 2
+        assert result["completed"] == 100
+        assert result["p50_hours"] == pytest.approx(50, abs=1)
+        assert result["p99_hours"] == pytest.approx(99.5, abs=1)
+        assert db.project_metrics.find.call_args[0][0]["project_id"] == {"$in": [1, 2]}
+
+    @pytest.mark.asyncio
+    async def test_user_without_completions(self, monkeypatch):
+        """Test that a user without a digest gets empty percentiles"""
+        db = Mock()
+        db.user_metrics.find_one = AsyncMock(return_value={})
+        db.task_events.find_one = AsyncMock(return_value=None)
+        db.project_metrics.find.return_value.to_list = AsyncMock(return_value=[])
+        service = AnalyticsService()
+        monkeypatch.setattr(service, '_get_db', lambda: db)
+
+        result = await service.get_cycle_times(1)
+
+        assert result["completed"] == 0
+        assert result["p90_hours"] is None
+        assert result["projects"] == []
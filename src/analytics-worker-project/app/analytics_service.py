@@ -1,53 +1,171 @@
+import time
 from datetime import datetime, timezone
 import structlog
-from app.database import get_database
-from app.models import ProjectEvent, ProjectMetrics
+from pydantic import ValidationError
+from pymongo import DeleteOne, UpdateOne
+from app.config import settings
+from app.database import get_database, user_id_filter
+from app.models import ProjectEvent, coerce_user_id
+from app.state_store import StateStore
+from app.version_guard import event_version, is_newer, version_datetime
 
 logger = structlog.get_logger()
 
 
 class AnalyticsService:
-    def __init__(self):
-        self._db = None
+    """Computes project metrics against the local state store.
 
-    def _get_db(self):
-        if self._db is None:
-            self._db = get_database()
-        return self._db
+    Namespaces: ``project`` (last applied state per project, the version guard;
+    deleted projects stay as tombstones so a late create/update cannot revive
+    them) and ``user`` (the ids of each user's active projects). Mongo only
+    receives periodic snapshots.
+    """
 
-    async def update_project_metrics(self, project_event: ProjectEvent):
+    def __init__(self, store: StateStore):
+        self.store = store
+        self.stale_events = 0
+        self._last_snapshot = 0.0
+
+    async def update_project_metrics(self, project_event: ProjectEvent, partition: int):
         try:
-            # First apply the project metrics mutation so the count reflects the change
-            await self._update_project_metrics_from_project(project_event)
-            # Then recalculate user's active project count (now includes/excludes this project)
-            await self._update_user_project_count(project_event)
+            if self.store.get("user", project_event.user_id) is None:
+                await self._seed_user(project_event.user_id, partition)
+                # Events are stored before they are applied, so the replay normally covered this one
+                if not is_newer(event_version(project_event.timestamp), self.store.get("project", project_event.project_id)):
+                    return
+            self._apply_project_event(project_event, partition)
         except Exception as e:
             logger.error("Error updating project metrics", error=str(e), exc_info=True)
 
-    async def _update_user_project_count(self, project_event: ProjectEvent):
-        db = self._get_db()
-        active_projects = await db.project_metrics.count_documents({"user_id": project_event.user_id})
-        await db.user_metrics.update_one(
-            {"user_id": project_event.user_id},
-            {"$set": {"active_projects": active_projects, "last_activity": project_event.timestamp, "updated_at": datetime.now(timezone.utc)}},
-            upsert=True,
-        )
-
-    async def _update_project_metrics_from_project(self, project_event: ProjectEvent):
-        db = self._get_db()
+    async def _seed_user(self, user_id: int, partition: int):
+        """Build a user's state from their stored project events.
+
+        A user without local state is either new or predates the state store,
+        in which case the first snapshot would otherwise overwrite
+        ``active_projects`` with the projects created since. All events of a
+        user arrive on one partition, so the replayed state belongs to the
+        partition of the event that triggered it.
+        """
+        cursor = get_database().project_events.find(
+            {"user_id": user_id_filter(user_id)}, {"_id": 0}
+        ).sort("timestamp", 1)
+        replayed = 0
+        async for doc in cursor:
+            try:
+                event = ProjectEvent.model_validate(doc)
+            except ValidationError:
+                continue
+            self._apply_project_event(event, partition)
+            replayed += 1
+        if replayed > 1:
+            logger.info("User state seeded from project events", user_id=user_id, events=replayed)
+
+    def _apply_project_event(self, project_event: ProjectEvent, partition: int):
+        version = event_version(project_event.timestamp)
+        previous = self.store.get("project", project_event.project_id)
+        if not is_newer(version, previous):
+            self.stale_events += 1
+            logger.info("Stale project event dropped", event_type=project_event.event, project_id=project_event.project_id)
+            return
+        deleted = project_event.event == "project_deleted"
+        state = dict(previous or {"first_activity": version})
+        state.update({
+            "project_id": project_event.project_id,
+            "user_id": project_event.user_id,
+            "username": project_event.username,
+            "deleted": deleted,
+            "version": version,
+            "last_activity": max(state.get("last_activity", 0), version),
+        })
+        if not deleted:
+            # An update that overtakes its create still materializes the project
+            state["project_name"] = project_event.name or f"Project {project_event.project_id}"
         if project_event.event == "project_created":
-            metrics = ProjectMetrics(
-                project_id=project_event.project_id,
-                user_id=project_event.user_id,
-                username=project_event.username,
-                project_name=project_event.name or f"Project {project_event.project_id}",
-                created_at_project=project_event.timestamp,
-            )
-            await db.project_metrics.insert_one(metrics.model_dump())
-        elif project_event.event == "project_updated":
-            await db.project_metrics.update_one(
-                {"project_id": project_event.project_id, "user_id": project_event.user_id},
-                {"$set": {"project_name": project_event.name or f"Project {project_event.project_id}", "last_activity": project_event.timestamp, "updated_at": datetime.now(timezone.utc)}},
-            )
-        elif project_event.event == "project_deleted":
-            await db.project_metrics.delete_one({"project_id": project_event.project_id, "user_id": project_event.user_id})
\ No newline at end of file
+            state["created_at_project"] = version
+        self.store.put("project", project_event.project_id, state, partition)
+
+        # Recalculate the user's active project set (now includes/excludes this project)
+        user = self.store.get("user", project_event.user_id) or {"projects": []}
+        user["user_id"] = project_event.user_id
+        projects = set(user["projects"])
+        if deleted:
+            projects.discard(project_event.project_id)
+        else:
+            projects.add(project_event.project_id)
+        user["projects"] = sorted(projects)
+        user["last_activity"] = max(user.get("last_activity", 0), version)
+        self.store.put("user", project_event.user_id, user, partition)
+
+    async def maybe_snapshot(self):
+        if time.monotonic() - self._last_snapshot >= settings.STATE_SNAPSHOT_INTERVAL_SECONDS:
+            await self.snapshot()
+
+    async def snapshot(self):
+        """Materialize the state changed since the last snapshot into Mongo."""
+        self._last_snapshot = time.monotonic()
+        dirty = self.store.take_dirty()
+        now = datetime.now(timezone.utc)
+        user_ops, project_ops, dashboard_ops = [], [], []
+        for namespace, _, state in dirty:
+            if state is None:
+                continue
+            # State written before the user id migration may still hold string ids
+            user_id = coerce_user_id(state["user_id"])
+            if namespace == "project":
+                key = {"project_id": state["project_id"], "user_id": user_id_filter(user_id)}
+                if state["deleted"]:
+                    project_ops.append(DeleteOne(key))
+                    continue
+                fields = {"user_id": user_id, "username": state["username"], "project_name": state["project_name"], "updated_at": now}
+                on_insert = {
+                    "total_tasks": 0,
+                    "completed_tasks": 0,
+                    "completion_rate": 0.0,
+                    "avg_completion_time_hours": None,
+                    "created_at": now,
+                }
+                if "created_at_project" in state:
+                    fields["created_at_project"] = version_datetime(state["created_at_project"])
+                else:
+                    on_insert["created_at_project"] = version_datetime(state["first_activity"])
+                project_ops.append(UpdateOne(
+                    key,
+                    {"$set": fields, "$setOnInsert": on_insert, "$max": {"last_activity": version_datetime(state["last_activity"])}},
+                    upsert=True,
+                ))
+            elif namespace == "user":
+                user_ops.append(UpdateOne(
+                    {"user_id": user_id_filter(user_id)},
+                    {
+                        "$set": {"user_id": user_id, "active_projects": len(state["projects"]), "updated_at": now},
+                        "$max": {"last_activity": version_datetime(state["last_activity"])},
+                        # Version stamp the API's response cache validates against
+                        "$inc": {"version": 1},
+                    },
+                    upsert=True,
+                ))
+                # Keep the dashboard read model's project count in step
+                dashboard_ops.append(UpdateOne(
+                    {"_id": user_id},
+                    {
+                        "$set": {"user_id": user_id, "active_projects": len(state["projects"]), "updated_at": now},
+                        "$inc": {"version": 1},
+                    },
+                    upsert=True,
+                ))
+        if not user_ops and not project_ops:
+            return
+        db = get_database()
+        try:
+            if project_ops:
+                await db.project_metrics.bulk_write(project_ops, ordered=False)
+            if user_ops:
+                await db.user_metrics.bulk_write(user_ops, ordered=False)
+            if dashboard_ops:
+                await db.user_dashboards.bulk_write(dashboard_ops, ordered=False)
+        except Exception:
+            # Keep the entries dirty so the next snapshot retries them
+            for namespace, key, state in dirty:
+                self.store.mark_dirty(namespace, key, state)
+            raise
+        logger.info("Metrics snapshot written", users=len(user_ops), projects=len(project_ops))
@@ -1,4 +1,5 @@
 import os
+import socket
 
 
 class Settings:
@@ -8,6 +9,22 @@ class Settings:
     KAFKA_BOOTSTRAP_SERVERS: str = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092")
     KAFKA_GROUP_ID: str = os.getenv("KAFKA_GROUP_ID", "analytics-worker-project")
     KAFKA_TOPIC_PROJECT: str = os.getenv("KAFKA_TOPIC_PROJECT", "project-events")
+    # Static membership id, stable and unique per replica (e.g. the pod name); "{hostname}" is
+    # replaced with the container's hostname so scaled replicas never share an id
+    KAFKA_GROUP_INSTANCE_ID: str = os.getenv("KAFKA_GROUP_INSTANCE_ID", "").replace("{hostname}", socket.gethostname())
+    KAFKA_SESSION_TIMEOUT_MS: int = int(os.getenv("KAFKA_SESSION_TIMEOUT_MS", "45000"))
+    KAFKA_MAX_POLL_RECORDS: int = int(os.getenv("KAFKA_MAX_POLL_RECORDS", "500"))
+
+    STATE_STORE_PATH: str = os.getenv("STATE_STORE_PATH", "/var/lib/analytics-worker-project/state.db")
+    STATE_CHANGELOG_TOPIC: str = os.getenv("STATE_CHANGELOG_TOPIC", "analytics-worker-project-state-changelog")
+    STATE_CHANGELOG_REPLICATION_FACTOR: int = int(os.getenv("STATE_CHANGELOG_REPLICATION_FACTOR", "1"))
+    STATE_SNAPSHOT_INTERVAL_SECONDS: float = float(os.getenv("STATE_SNAPSHOT_INTERVAL_SECONDS", "10"))
+
+    # Also match legacy string user ids while scripts/migrate_user_ids.py is running
+    USER_ID_MIGRATION_COMPAT: bool = os.getenv("USER_ID_MIGRATION_COMPAT", "false").lower() == "true"
+
+    PROFILING_OUTPUT_DIR: str = os.getenv("PROFILING_OUTPUT_DIR", "/tmp/profiles")
+    PROFILING_SECONDS: float = float(os.getenv("PROFILING_SECONDS", "30"))
 
     WORKER_NAME: str = "Analytics Project Worker"
     VERSION: str = "1.0.0"
@@ -9,6 +9,7 @@ async def connect_to_mongo():
     global _client
     if _client is None:
         _client = AsyncIOMotorClient(settings.MONGODB_URL)
+        await create_indexes()
 
 
 async def close_mongo_connection():
@@ -18,6 +19,20 @@ async def close_mongo_connection():
         _client = None
 
 
+async def create_indexes():
+    """Unique keys the snapshot upserts rely on."""
+    db = get_database()
+    await db.user_metrics.create_index([("user_id", 1)], unique=True)
+    await db.project_metrics.create_index([("project_id", 1), ("user_id", 1)], unique=True)
+
+
+def user_id_filter(user_id: int):
+    """Query value for ``user_id``; during the id migration it also matches the legacy string form."""
+    if settings.USER_ID_MIGRATION_COMPAT:
+        return {"$in": [user_id, str(user_id)]}
+    return user_id
+
+
 def get_database():
     if _client is None:
         raise RuntimeError("Mongo client not initialized. Call connect_to_mongo() first.")
@@ -1,62 +1,162 @@
 import json
 import asyncio
-from datetime import datetime
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
 import structlog
-from kafka import KafkaConsumer
-from kafka.errors import KafkaError
+from confluent_kafka import Consumer, KafkaException, TopicPartition, TIMESTAMP_NOT_AVAILABLE
+from pydantic import ValidationError
 from app.config import settings
 from app.analytics_service import AnalyticsService
+from app.state_store import ChangelogTopicError, StateStore
 from app.models import ProjectEvent
 from app.database import get_database
 
 logger = structlog.get_logger()
 
 
+def consumer_config() -> dict:
+    config = {
+        "bootstrap.servers": settings.KAFKA_BOOTSTRAP_SERVERS,
+        "group.id": settings.KAFKA_GROUP_ID,
+        "auto.offset.reset": "latest",
+        # Offsets are committed by the worker after processing and on revoke
+        "enable.auto.commit": False,
+        # Incremental rebalancing: only the partitions that move are revoked
+        "partition.assignment.strategy": "cooperative-sticky",
+        "session.timeout.ms": settings.KAFKA_SESSION_TIMEOUT_MS,
+    }
+    if settings.KAFKA_GROUP_INSTANCE_ID:
+        # Static membership: a restarting replica gets its partitions back
+        # without a rebalance as long as it rejoins within the session timeout
+        config["group.instance.id"] = settings.KAFKA_GROUP_INSTANCE_ID
+    return config
+
+
 class KafkaProjectEventConsumer:
     def __init__(self):
         self.consumer = None
-        self.analytics_service = AnalyticsService()
+        self.state_store = StateStore(
+            settings.KAFKA_TOPIC_PROJECT, settings.STATE_CHANGELOG_TOPIC, settings.STATE_STORE_PATH
+        )
+        self.analytics_service = AnalyticsService(self.state_store)
         self.running = False
+        self._loop = None
+        # Next offset to commit per (topic, partition), for processed messages
+        self._pending_offsets: Dict[Tuple[str, int], int] = {}
 
     async def start_consumer(self):
         logger.info("PROJECT CONSUMER STARTING", topic=settings.KAFKA_TOPIC_PROJECT)
+        self._loop = asyncio.get_running_loop()
         try:
-            self.consumer = KafkaConsumer(
-                settings.KAFKA_TOPIC_PROJECT,
-                bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
-                group_id=settings.KAFKA_GROUP_ID,
-                value_deserializer=lambda x: json.loads(x.decode("utf-8")),
-                auto_offset_reset="latest",
-                enable_auto_commit=True,
-                auto_commit_interval_ms=1000,
-                consumer_timeout_ms=1000,
+            await self._loop.run_in_executor(None, self.state_store.open)
+            self.consumer = Consumer(consumer_config())
+            self.consumer.subscribe(
+                [settings.KAFKA_TOPIC_PROJECT],
+                on_assign=self._on_assign,
+                on_revoke=self._on_revoke,
+                on_lost=self._on_lost,
             )
             self.running = True
             await self._consume()
-        except KafkaError as e:
+        except KafkaException as e:
             logger.error("Kafka error", error=str(e))
             raise
+        finally:
+            await self._close()
 
     async def stop_consumer(self):
+        # The consume loop exits after the current poll; start_consumer closes the consumer
         self.running = False
-        if self.consumer:
-            self.consumer.close()
+
+    async def _close(self):
+        if self.consumer is None:
+            return
+        await self.flush()
+        self._commit(asynchronous=False)
+        # close() may invoke the revoke callback, which needs the event loop free
+        await self._loop.run_in_executor(None, self.consumer.close)
+        self.consumer = None
+        await self._loop.run_in_executor(None, self.state_store.close)
 
     async def _consume(self):
         while self.running:
             try:
-                batch = self.consumer.poll(timeout_ms=1000)
-                if batch:
-                    for _, messages in batch.items():
-                        for m in messages:
-                            await self._process(m)
-                await asyncio.sleep(0.1)
+                messages = await self._loop.run_in_executor(
+                    None, self.consumer.consume, settings.KAFKA_MAX_POLL_RECORDS, 1.0
+                )
+                for m in messages:
+                    if m.error():
+                        logger.warning("Kafka message error", error=str(m.error()))
+                        continue
+                    await self._process(m)
+                    self._pending_offsets[(m.topic(), m.partition())] = m.offset() + 1
+                await self.analytics_service.maybe_snapshot()
+                # The changelog must hold the state before the offsets that produced it are committed
+                await self._loop.run_in_executor(None, self.state_store.commit)
+                self._commit(asynchronous=True)
+            except ChangelogTopicError:
+                # Consuming without a usable changelog would lose state; restart instead
+                raise
             except Exception as e:
                 logger.error("Consume loop error", error=str(e), exc_info=True)
                 await asyncio.sleep(5)
 
+    def _commit(self, partitions: List[TopicPartition] = None, asynchronous: bool = True):
+        """Commit processed offsets, optionally only for ``partitions``."""
+        if partitions is not None:
+            keys = [(p.topic, p.partition) for p in partitions]
+        else:
+            keys = list(self._pending_offsets)
+        offsets = [
+            TopicPartition(topic, partition, self._pending_offsets.pop((topic, partition)))
+            for topic, partition in keys
+            if (topic, partition) in self._pending_offsets
+        ]
+        if not offsets:
+            return
+        try:
+            self.consumer.commit(offsets=offsets, asynchronous=asynchronous)
+        except KafkaException as e:
+            logger.error("Offset commit failed", error=str(e))
+
+    async def flush(self):
+        """Write out state that is still buffered in this worker."""
+        await self.analytics_service.snapshot()
+        await self._loop.run_in_executor(None, self.state_store.commit)
+
+    # Rebalance callbacks run on the polling thread inside consume(), while the
+    # event loop is idle awaiting it, so async work is handed back to the loop.
+
+    def _on_assign(self, consumer, partitions):
+        logger.info("Partitions assigned", partitions=[p.partition for p in partitions])
+        # Catch the local state up with the changelog before consuming the partitions
+        self.state_store.restore([p.partition for p in partitions])
+
+    def _on_revoke(self, consumer, partitions):
+        logger.info("Partitions revoked", partitions=[p.partition for p in partitions])
+        future = asyncio.run_coroutine_threadsafe(self.flush(), self._loop)
+        try:
+            future.result()
+        except Exception as e:
+            # The changelog may lack the state of the pending offsets: leave them for the new owner to replay
+            logger.error("Flush on revoke failed", error=str(e), exc_info=True)
+            for p in partitions:
+                self._pending_offsets.pop((p.topic, p.partition), None)
+            return
+        self._commit(partitions, asynchronous=False)
+
+    def _on_lost(self, consumer, partitions):
+        # Ownership is already gone: committing would be rejected, so just drop local state
+        logger.warning("Partitions lost", partitions=[p.partition for p in partitions])
+        for p in partitions:
+            self._pending_offsets.pop((p.topic, p.partition), None)
+
     async def _process(self, message):
-        envelope = message.value
+        try:
+            envelope = json.loads(message.value().decode("utf-8"))
+        except (AttributeError, UnicodeDecodeError, json.JSONDecodeError):
+            logger.warning("Skip undecodable message", partition=message.partition(), offset=message.offset())
+            return
         if not isinstance(envelope, dict):
             logger.warning("Skip non-dict message", raw=envelope)
             return
@@ -76,15 +176,23 @@ class KafkaProjectEventConsumer:
                 timestamp = datetime.fromisoformat(ts_raw.replace("Z", "+00:00"))
             except ValueError:
                 logger.warning("Timestamp parse failed", raw=ts_raw)
-        project_event = ProjectEvent(
-            event=event_internal,
-            project_id=data.get("ID"),
-            user_id=str(data.get("UserID")),
-            username=data.get("Username"),
-            name=data.get("Name"),
-            timestamp=timestamp or datetime.utcnow(),
-        )
+        ts_type, ts_ms = message.timestamp()
+        if timestamp is None and ts_type != TIMESTAMP_NOT_AVAILABLE:
+            # Fall back to the producer's record timestamp, which is still event time
+            timestamp = datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc)
+        try:
+            project_event = ProjectEvent(
+                event=event_internal,
+                project_id=data.get("ID"),
+                user_id=data.get("UserID"),
+                username=data.get("Username"),
+                name=data.get("Name"),
+                timestamp=timestamp or datetime.now(timezone.utc),
+            )
+        except ValidationError as e:
+            logger.warning("Skip invalid project event", error=str(e), partition=message.partition(), offset=message.offset())
+            return
         db = get_database()
         await db.project_events.insert_one(project_event.model_dump())
-        await self.analytics_service.update_project_metrics(project_event)
-        logger.info("Project event processed", event_type=event_internal, project_id=project_event.project_id)
\ No newline at end of file
+        await self.analytics_service.update_project_metrics(project_event, message.partition())
+        logger.info("Project event processed", event_type=event_internal, project_id=project_event.project_id)
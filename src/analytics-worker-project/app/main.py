@@ -4,6 +4,7 @@ import sys
 import structlog
 from app.config import settings
 from app.database import connect_to_mongo, close_mongo_connection
+from app.profiling import capture_profile
 from app.kafka_consumer import KafkaProjectEventConsumer
 
 structlog.configure(
@@ -43,19 +44,30 @@ class ProjectAnalyticsWorker:
             await close_mongo_connection()
 
     async def stop(self):
+        # start() closes Mongo once the consumer has flushed and left the loop
         self.running = False
         await self.consumer.stop_consumer()
-        await close_mongo_connection()
 
     def handle_shutdown(self, signum, frame):
         logger.info("Shutdown signal", signal=signum)
         asyncio.create_task(self.stop())
 
+    def handle_profile(self, signum, frame):
+        logger.info("Profile signal", signal=signum, seconds=settings.PROFILING_SECONDS)
+        asyncio.create_task(self._profile())
+
+    async def _profile(self):
+        try:
+            await capture_profile(settings.PROFILING_SECONDS, settings.PROFILING_OUTPUT_DIR)
+        except Exception as e:
+            logger.error("Profile capture failed", error=str(e))
+
 
 async def main():
     worker = ProjectAnalyticsWorker()
     signal.signal(signal.SIGINT, worker.handle_shutdown)
     signal.signal(signal.SIGTERM, worker.handle_shutdown)
+    signal.signal(signal.SIGUSR1, worker.handle_profile)
     try:
         await worker.start()
     except KeyboardInterrupt:
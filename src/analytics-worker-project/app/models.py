@@ -1,12 +1,29 @@
+import re
 from datetime import datetime, timezone
-from typing import Optional
-from pydantic import BaseModel, Field
+from typing import Annotated, Any, Optional
+from pydantic import BaseModel, BeforeValidator, Field
+
+
+def coerce_user_id(value: Any) -> Any:
+    """Normalize a user id to its canonical ``int`` form.
+
+    Producers and older documents carry the id as a numeric string; anything
+    that is not an integer is left for pydantic to reject. Only ASCII digits
+    count, the strings Mongo's ``$toInt`` accepts in scripts/migrate_user_ids.py.
+    """
+    if isinstance(value, str) and re.fullmatch(r"-?[0-9]+", value.strip()):
+        return int(value)
+    return value
+
+
+# Canonical user id type shared by every model that stores or queries user_id
+UserId = Annotated[int, BeforeValidator(coerce_user_id)]
 
 
 class ProjectEvent(BaseModel):
     event: str  # internal normalized: project_created, etc.
     project_id: int
-    user_id: str
+    user_id: UserId
     username: str
     name: str | None = None
     timestamp: datetime
@@ -16,7 +33,7 @@ class ProjectEvent(BaseModel):
 
 
 class UserMetrics(BaseModel):
-    user_id: str
+    user_id: UserId
     username: str
     total_tasks: int = 0
     completed_tasks: int = 0
@@ -30,7 +47,7 @@ class UserMetrics(BaseModel):
 
 class ProjectMetrics(BaseModel):
     project_id: int
-    user_id: str
+    user_id: UserId
     username: str
     project_name: str
     total_tasks: int = 0
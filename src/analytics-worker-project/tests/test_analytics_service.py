@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from unittest.mock import Mock
+from app import analytics_service
+from app.analytics_service import AnalyticsService
+from app.models import ProjectEvent
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class MemoryStore:
+    def __init__(self):
+        self.state = {}
+
+    def get(self, namespace, key):
+        return self.state.get((namespace, str(key)))
+
+    def put(self, namespace, key, value, partition):
+        self.state[(namespace, str(key))] = value
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs = sorted(self.docs, key=lambda doc: doc[field])
+        return self
+
+    def __aiter__(self):
+        return self._docs()
+
+    async def _docs(self):
+        for doc in self.docs:
+            yield doc
+
+
+def event(hours, event="project_created", project_id=1, user_id=7):
+    return ProjectEvent(
+        event=event, project_id=project_id, user_id=user_id, username="alice",
+        name=f"Project {project_id}", timestamp=START + timedelta(hours=hours)
+    )
+
+
+@pytest.fixture
+def stored(monkeypatch):
+    """project_events as the worker stores them, before it applies each event"""
+    docs = []
+    db = Mock()
+    db.project_events.find = Mock(side_effect=lambda query, projection: Cursor(list(docs)))
+    monkeypatch.setattr(analytics_service, "get_database", lambda: db)
+    return docs
+
+
+class TestSeeding:
+    @pytest.mark.asyncio
+    async def test_user_predating_the_store_keeps_their_projects(self, stored):
+        """Test that a user's first event rebuilds their active projects from the stored history"""
+        service = AnalyticsService(MemoryStore())
+        stored.extend(ev.model_dump() for ev in [
+            event(0, project_id=1),
+            event(1, project_id=2),
+            event(2, "project_deleted", project_id=1),
+        ])
+        new = event(3, project_id=3)
+        stored.append(new.model_dump())
+
+        await service.update_project_metrics(new, 0)
+        # A late update cannot revive the project deleted before the store existed
+        late = event(1.5, "project_updated", project_id=1)
+        stored.append(late.model_dump())
+        await service.update_project_metrics(late, 0)
+
+        assert service.store.get("user", 7)["projects"] == [2, 3]
+        assert service.store.get("project", 1)["deleted"] is True
+        assert service.stale_events == 1
@@ -1,81 +1,282 @@
+import time
 from datetime import datetime, timezone
+from typing import Any, Dict, Optional
 import structlog
-from app.database import get_database
-from app.models import TaskEvent, UserMetrics, ProjectMetrics
+from bson import Binary
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from app.config import settings
+from app.database import get_database, user_id_filter
+from app.models import TaskEvent, coerce_user_id
+from app.state_store import StateStore
+from app.tdigest import TDigest
+from app.version_guard import event_version, is_newer, version_datetime
 
 logger = structlog.get_logger()
 
 
+def _task_flags(state: Optional[Dict[str, Any]]):
+    """(exists, completed) contribution of a task state to the counters."""
+    if state is None or state.get("deleted"):
+        return 0, 0
+    return 1, int(state.get("status") == "completed")
+
+
+def _apply_counters(aggregate: Dict[str, Any], delta_total: int, delta_completed: int, version: int):
+    aggregate["total_tasks"] = max(0, aggregate.get("total_tasks", 0) + delta_total)
+    aggregate["completed_tasks"] = max(0, aggregate.get("completed_tasks", 0) + delta_completed)
+    aggregate["last_activity"] = max(aggregate.get("last_activity", 0), version)
+
+
+def _add_cycle_time(aggregate: Dict[str, Any], cycle_hours: Optional[float]):
+    """Fold a task's cycle time into the aggregate's t-digest, kept base64-encoded in the JSON state."""
+    if cycle_hours is None:
+        return
+    digest = TDigest.from_base64(aggregate.get("cycle_digest"), settings.TDIGEST_COMPRESSION)
+    digest.add(cycle_hours)
+    aggregate["cycle_digest"] = digest.to_base64()
+
+
+def _cycle_time_fields(aggregate: Dict[str, Any]) -> Dict[str, Any]:
+    """Snapshot fields of the cycle-time digest; empty until a task was completed."""
+    if not aggregate.get("cycle_digest"):
+        return {}
+    digest = TDigest.from_base64(aggregate["cycle_digest"])
+    return {
+        "cycle_time_digest": Binary(digest.to_bytes()),
+        "avg_completion_time_hours": digest.mean,
+    }
+
+
+def _completion_rate(aggregate: Dict[str, Any]) -> float:
+    if aggregate["total_tasks"] > 0:
+        return aggregate["completed_tasks"] / aggregate["total_tasks"]
+    return 0.0
+
+
 class AnalyticsService:
-    def __init__(self):
-        self._db = None
+    """Computes task metrics against the local state store.
+
+    Namespaces: ``task`` (last applied state per task, the version guard),
+    ``user`` (per-user counters) and ``project`` (per user/project counters).
+    Mongo only receives periodic snapshots of the user and project aggregates.
+    """
 
-    def _get_db(self):
-        if self._db is None:
-            self._db = get_database()
-        return self._db
+    def __init__(self, store: StateStore):
+        self.store = store
+        self.stale_events = 0
+        self._last_snapshot = 0.0
 
-    async def update_task_metrics(self, task_event: TaskEvent):
+    async def update_task_metrics(self, task_event: TaskEvent, partition: int):
         try:
-            await self._update_user_metrics(task_event)
-            await self._update_project_metrics_from_task(task_event)
+            if task_event.task_id is not None and self.store.get("user", task_event.user_id) is None:
+                await self._seed_user(task_event.user_id, partition)
+                # Events are stored before they are applied, so the replay normally covered this one
+                if not is_newer(event_version(task_event.timestamp), self.store.get("task", task_event.task_id)):
+                    return
+            self._apply_task_event(task_event, partition)
         except Exception as e:
             logger.error("Error updating task metrics", error=str(e), exc_info=True)
 
-    async def _update_user_metrics(self, task_event: TaskEvent):
-        db = self._get_db()
-        user_metrics = await db.user_metrics.find_one({"user_id": task_event.user_id})
-        if user_metrics is None:
-            user_metrics = UserMetrics(user_id=task_event.user_id, username=task_event.username).model_dump()
-        # Ensure keys
-        for k, v in {"total_tasks": 0, "completed_tasks": 0, "completion_rate": 0.0}.items():
-            user_metrics.setdefault(k, v)
-        if task_event.event == "task_created":
-            user_metrics["total_tasks"] += 1
-        elif task_event.event == "task_updated" and task_event.status == "completed":
-            user_metrics["completed_tasks"] += 1
-        elif task_event.event == "task_deleted":
-            user_metrics["total_tasks"] = max(0, user_metrics["total_tasks"] - 1)
-            if task_event.status == "completed":
-                user_metrics["completed_tasks"] = max(0, user_metrics["completed_tasks"] - 1)
-        if user_metrics["total_tasks"] > 0:
-            user_metrics["completion_rate"] = user_metrics["completed_tasks"] / user_metrics["total_tasks"]
-        else:
-            user_metrics["completion_rate"] = 0.0
-        user_metrics["last_activity"] = task_event.timestamp
-        user_metrics["updated_at"] = datetime.now(timezone.utc)
-        await db.user_metrics.replace_one({"user_id": task_event.user_id}, user_metrics, upsert=True)
-
-    async def _update_project_metrics_from_task(self, task_event: TaskEvent):
-        if not task_event.project_id:
+    async def _seed_user(self, user_id: int, partition: int):
+        """Build a user's state from their stored task events.
+
+        A user without local state is either new or predates the state store,
+        in which case Mongo holds counters the first snapshot would otherwise
+        overwrite with counts of new events only. Replaying ``task_events``
+        through the version guard rebuilds the task states and aggregates
+        exactly; all events of a user arrive on one partition, so the state
+        belongs to the partition of the event that triggered the replay.
+        """
+        cursor = get_database().task_events.find(
+            {"user_id": user_id_filter(user_id)}, {"_id": 0}
+        ).sort("timestamp", 1)
+        replayed = 0
+        async for doc in cursor:
+            try:
+                event = TaskEvent.model_validate(doc)
+            except ValidationError:
+                continue
+            self._apply_task_event(event, partition)
+            replayed += 1
+        if replayed > 1:
+            logger.info("User state seeded from task events", user_id=user_id, events=replayed)
+
+    def _apply_task_event(self, task_event: TaskEvent, partition: int):
+        """Apply a task event through the per-task version guard.
+
+        Metrics are derived from the transition between the previous and the new
+        task state rather than from the event type, so events that arrive out of
+        order are compensated: a stale event is dropped because its effect is
+        already contained in the newer state that was applied first.
+        """
+        if task_event.task_id is None:
+            return
+        version = event_version(task_event.timestamp)
+        previous = self.store.get("task", task_event.task_id)
+        if not is_newer(version, previous):
+            self.stale_events += 1
+            logger.info("Stale task event dropped", event_type=task_event.event, task_id=task_event.task_id)
             return
-        db = self._get_db()
-        project_metrics = await db.project_metrics.find_one({
+        created = previous.get("created") if previous else None
+        if created is None and task_event.event == "task_created":
+            created = version
+        state = {
+            "user_id": task_event.user_id,
             "project_id": task_event.project_id,
-            "user_id": task_event.user_id
-        })
-        if project_metrics is None:
-            project_metrics = ProjectMetrics(
-                project_id=task_event.project_id,
-                user_id=task_event.user_id,
-                username=task_event.username,
-                project_name=f"Project {task_event.project_id}",
-                created_at_project=task_event.timestamp
-            ).model_dump()
-        for k, v in {"total_tasks": 0, "completed_tasks": 0, "completion_rate": 0.0}.items():
-            project_metrics.setdefault(k, v)
-        if task_event.event == "task_created":
-            project_metrics["total_tasks"] += 1
-        elif task_event.event == "task_updated" and task_event.status == "completed":
-            project_metrics["completed_tasks"] += 1
-        elif task_event.event == "task_deleted":
-            project_metrics["total_tasks"] = max(0, project_metrics["total_tasks"] - 1)
-            if task_event.status == "completed":
-                project_metrics["completed_tasks"] = max(0, project_metrics["completed_tasks"] - 1)
-        if project_metrics["total_tasks"] > 0:
-            project_metrics["completion_rate"] = project_metrics["completed_tasks"] / project_metrics["total_tasks"]
-        else:
-            project_metrics["completion_rate"] = 0.0
-        project_metrics["last_activity"] = task_event.timestamp
-        project_metrics["updated_at"] = datetime.now(timezone.utc)
-        await db.project_metrics.replace_one({"project_id": task_event.project_id, "user_id": task_event.user_id}, project_metrics, upsert=True)
\ No newline at end of file
+            "status": task_event.status,
+            "deleted": task_event.event == "task_deleted",
+            "version": version,
+            # Version of the task's task_created event; None when it was never seen
+            "created": created,
+            "cycle_counted": bool(previous and previous.get("cycle_counted")),
+        }
+
+        prev_exists, prev_completed = _task_flags(previous)
+        new_exists, new_completed = _task_flags(state)
+        cycle_hours = None
+        # Only a task's first completion counts, and only from a known creation:
+        # starting the clock at a later event would make the cycle too short
+        if new_completed and not prev_completed and not state["cycle_counted"] and created and created < version:
+            cycle_hours = (version - created) / 3_600_000_000
+            state["cycle_counted"] = True
+        self.store.put("task", task_event.task_id, state, partition)
+        self._update_user(
+            task_event, partition, new_exists - prev_exists, new_completed - prev_completed, version, cycle_hours
+        )
+
+        prev_project = previous.get("project_id") if previous else None
+        if prev_project and prev_project != task_event.project_id:
+            # Task moved between projects: take it out of the old one
+            self._update_project(task_event, prev_project, partition, -prev_exists, -prev_completed, version)
+            prev_exists = prev_completed = 0
+        self._update_project(
+            task_event, task_event.project_id, partition, new_exists - prev_exists, new_completed - prev_completed,
+            version, cycle_hours
+        )
+
+    def _update_user(self, task_event: TaskEvent, partition: int, delta_total: int, delta_completed: int, version: int, cycle_hours: Optional[float] = None):
+        aggregate = self.store.get("user", task_event.user_id) or {}
+        aggregate["user_id"] = task_event.user_id
+        aggregate["username"] = task_event.username
+        _apply_counters(aggregate, delta_total, delta_completed, version)
+        _add_cycle_time(aggregate, cycle_hours)
+        self.store.put("user", task_event.user_id, aggregate, partition)
+
+    def _update_project(self, task_event: TaskEvent, project_id: Optional[int], partition: int, delta_total: int, delta_completed: int, version: int, cycle_hours: Optional[float] = None):
+        if not project_id:
+            return
+        key = f"{task_event.user_id}:{project_id}"
+        aggregate = self.store.get("project", key) or {
+            "project_id": project_id,
+            "first_activity": version,
+        }
+        aggregate["user_id"] = task_event.user_id
+        aggregate["username"] = task_event.username
+        _apply_counters(aggregate, delta_total, delta_completed, version)
+        _add_cycle_time(aggregate, cycle_hours)
+        self.store.put("project", key, aggregate, partition)
+
+    async def maybe_snapshot(self):
+        if time.monotonic() - self._last_snapshot >= settings.STATE_SNAPSHOT_INTERVAL_SECONDS:
+            await self.snapshot()
+
+    async def snapshot(self):
+        """Materialize the aggregates changed since the last snapshot into Mongo."""
+        self._last_snapshot = time.monotonic()
+        dirty = self.store.take_dirty()
+        now = datetime.now(timezone.utc)
+        user_ops, project_ops, dashboard_ops = [], [], []
+        for namespace, _, aggregate in dirty:
+            if aggregate is None:
+                continue
+            # State written before the user id migration may still hold string ids
+            user_id = coerce_user_id(aggregate["user_id"])
+            cycle_time = _cycle_time_fields(aggregate)
+            # The digest's mean replaces the placeholder once a task was completed
+            avg_on_insert = {} if cycle_time else {"avg_completion_time_hours": None}
+            if namespace == "user":
+                user_ops.append(UpdateOne(
+                    {"user_id": user_id_filter(user_id)},
+                    {
+                        "$set": {
+                            "user_id": user_id,
+                            "username": aggregate["username"],
+                            "total_tasks": aggregate["total_tasks"],
+                            "completed_tasks": aggregate["completed_tasks"],
+                            "completion_rate": _completion_rate(aggregate),
+                            "updated_at": now,
+                            **cycle_time,
+                        },
+                        "$max": {"last_activity": version_datetime(aggregate["last_activity"])},
+                        # Version stamp the API's response cache validates against
+                        "$inc": {"version": 1},
+                        "$setOnInsert": {"active_projects": 0, "created_at": now, **avg_on_insert},
+                    },
+                    upsert=True,
+                ))
+                # The dashboard read model carries the same metrics next to its ring
+                # buffers; its active_projects is written by the project worker
+                dashboard_ops.append(UpdateOne(
+                    {"_id": user_id},
+                    {
+                        "$set": {
+                            "user_id": user_id,
+                            "username": aggregate["username"],
+                            "total_tasks": aggregate["total_tasks"],
+                            "completed_tasks": aggregate["completed_tasks"],
+                            "completion_rate": _completion_rate(aggregate),
+                            "updated_at": now,
+                        },
+                        "$inc": {"version": 1},
+                    },
+                    upsert=True,
+                ))
+            elif namespace == "project":
+                project_ops.append((aggregate["project_id"], UpdateOne(
+                    {"project_id": aggregate["project_id"], "user_id": user_id_filter(user_id)},
+                    {
+                        "$set": {
+                            "user_id": user_id,
+                            "username": aggregate["username"],
+                            "total_tasks": aggregate["total_tasks"],
+                            "completed_tasks": aggregate["completed_tasks"],
+                            "completion_rate": _completion_rate(aggregate),
+                            "updated_at": now,
+                            **cycle_time,
+                        },
+                        "$max": {"last_activity": version_datetime(aggregate["last_activity"])},
+                        "$setOnInsert": {
+                            "project_name": f"Project {aggregate['project_id']}",
+                            "created_at_project": version_datetime(aggregate["first_activity"]),
+                            "created_at": now,
+                            **avg_on_insert,
+                        },
+                    },
+                    upsert=True,
+                )))
+        if not user_ops and not project_ops:
+            return
+        db = get_database()
+        try:
+            if user_ops:
+                await db.user_metrics.bulk_write(user_ops, ordered=False)
+            if project_ops:
+                # The upsert creates projects the project worker has not materialized
+                # yet, but must not revive one it deleted: its stored project_deleted
+                # event is the tombstone
+                deleted = set(await db.project_events.distinct("project_id", {
+                    "project_id": {"$in": [project_id for project_id, _ in project_ops]},
+                    "event": "project_deleted",
+                }))
+                ops = [op for project_id, op in project_ops if project_id not in deleted]
+                if ops:
+                    await db.project_metrics.bulk_write(ops, ordered=False)
+            if dashboard_ops:
+                await db.user_dashboards.bulk_write(dashboard_ops, ordered=False)
+        except Exception:
+            # Keep the entries dirty so the next snapshot retries them
+            for namespace, key, aggregate in dirty:
+                self.store.mark_dirty(namespace, key, aggregate)
+            raise
+        logger.info("Metrics snapshot written", users=len(user_ops), projects=len(project_ops))
@@ -1,4 +1,5 @@
 import os
+import socket
 
 
 class Settings:
@@ -10,6 +11,40 @@ class Settings:
     KAFKA_BOOTSTRAP_SERVERS: str = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092")
     KAFKA_GROUP_ID: str = os.getenv("KAFKA_GROUP_ID", "analytics-worker-task")
     KAFKA_TOPIC_TASK: str = os.getenv("KAFKA_TOPIC_TASK", "task-events")
+    # Static membership id, stable and unique per replica (e.g. the pod name); "{hostname}" is
+    # replaced with the container's hostname so scaled replicas never share an id
+    KAFKA_GROUP_INSTANCE_ID: str = os.getenv("KAFKA_GROUP_INSTANCE_ID", "").replace("{hostname}", socket.gethostname())
+    KAFKA_SESSION_TIMEOUT_MS: int = int(os.getenv("KAFKA_SESSION_TIMEOUT_MS", "45000"))
+    KAFKA_MAX_POLL_RECORDS: int = int(os.getenv("KAFKA_MAX_POLL_RECORDS", "500"))
+
+    # Local state store and its compacted changelog topic
+    STATE_STORE_PATH: str = os.getenv("STATE_STORE_PATH", "/var/lib/analytics-worker-task/state.db")
+    STATE_CHANGELOG_TOPIC: str = os.getenv("STATE_CHANGELOG_TOPIC", "analytics-worker-task-state-changelog")
+    STATE_CHANGELOG_REPLICATION_FACTOR: int = int(os.getenv("STATE_CHANGELOG_REPLICATION_FACTOR", "1"))
+    STATE_SNAPSHOT_INTERVAL_SECONDS: float = float(os.getenv("STATE_SNAPSHOT_INTERVAL_SECONDS", "10"))
+
+    # Event-time windowing
+    WINDOW_ALLOWED_LATENESS_SECONDS: int = int(os.getenv("WINDOW_ALLOWED_LATENESS_SECONDS", "3600"))
+    WINDOW_IDLE_PARTITION_SECONDS: int = int(os.getenv("WINDOW_IDLE_PARTITION_SECONDS", "300"))
+    WINDOW_CLOSE_INTERVAL_SECONDS: int = int(os.getenv("WINDOW_CLOSE_INTERVAL_SECONDS", "30"))
+
+    # Cycle-time t-digests: higher compression means more centroids and tighter tail quantiles
+    TDIGEST_COMPRESSION: int = int(os.getenv("TDIGEST_COMPRESSION", "100"))
+
+    # Daily distinct-count sketches: relative standard error is 1.04 / sqrt(2 ** HLL_PRECISION)
+    HLL_PRECISION: int = int(os.getenv("HLL_PRECISION", "12"))
+    HLL_CACHE_MAX_SKETCHES: int = int(os.getenv("HLL_CACHE_MAX_SKETCHES", "10000"))
+
+    # Ring buffer sizes of the per-user dashboard read model (user_dashboards)
+    DASHBOARD_RECENT_ACTIVITY: int = int(os.getenv("DASHBOARD_RECENT_ACTIVITY", "10"))
+    DASHBOARD_RECENT_COMPLETIONS: int = int(os.getenv("DASHBOARD_RECENT_COMPLETIONS", "5"))
+
+    # Also match legacy string user ids while scripts/migrate_user_ids.py is running
+    USER_ID_MIGRATION_COMPAT: bool = os.getenv("USER_ID_MIGRATION_COMPAT", "false").lower() == "true"
+
+    # Profiling (triggered with SIGUSR1)
+    PROFILING_OUTPUT_DIR: str = os.getenv("PROFILING_OUTPUT_DIR", "/tmp/profiles")
+    PROFILING_SECONDS: float = float(os.getenv("PROFILING_SECONDS", "30"))
 
     # Worker metadata
     WORKER_NAME: str = "Analytics Task Worker"
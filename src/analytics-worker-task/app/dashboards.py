@@ -0,0 +1,109 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+from pymongo import UpdateOne
+from app.config import settings
+from app.database import get_database
+from app.models import TaskEvent
+
+# user id, partition
+PendingKey = Tuple[int, int]
+
+
+def activity_entry(task_event: TaskEvent) -> Dict[str, Any]:
+    return {
+        "type": "task",
+        "event": task_event.event,
+        "task_id": task_event.task_id,
+        "project_id": task_event.project_id,
+        "timestamp": task_event.timestamp,
+    }
+
+
+def completion_entry(task_event: TaskEvent) -> Dict[str, Any]:
+    return {
+        "task_id": task_event.task_id,
+        "project_id": task_event.project_id,
+        "title": task_event.title,
+        "completed_at": task_event.timestamp,
+    }
+
+
+def _merged(field: str, entries: List[Dict[str, Any]], sort_field: str, size: int) -> Dict[str, Any]:
+    """Union of the stored ring buffer and ``entries``, newest first and trimmed to ``size``"""
+    # The union drops redelivered entries; sorting by event time rather than
+    # arrival puts late events in place, so they fall off first
+    return {"$slice": [
+        {"$sortArray": {
+            "input": {"$setUnion": [{"$ifNull": [f"${field}", []]}, {"$literal": entries}]},
+            "sortBy": {sort_field: -1},
+        }},
+        size,
+    ]}
+
+
+class DashboardReadModel:
+    """Per-user dashboard documents in ``user_dashboards``, keyed by user id.
+
+    Each document holds the user's metrics (written by the metrics snapshot)
+    and two bounded ring buffers kept by this class: the latest task events
+    and the latest completions, newest first. The API serves the dashboard
+    and task summary with a single ``_id`` lookup instead of sorting
+    ``task_events``. Entries are buffered per partition and flushed every
+    batch, before offsets are committed, like the distinct-count sketches.
+    Entries are shaped like scripts/backfill_dashboards.py's in the API, so
+    both merge into the buffers without duplicates.
+    """
+
+    def __init__(self):
+        self._activity: Dict[PendingKey, List[Dict[str, Any]]] = {}
+        self._completions: Dict[PendingKey, List[Dict[str, Any]]] = {}
+
+    def add(self, task_event: TaskEvent, partition: int):
+        key = (task_event.user_id, partition)
+        self._activity.setdefault(key, []).append(activity_entry(task_event))
+        if task_event.event == "task_updated" and task_event.status == "completed":
+            self._completions.setdefault(key, []).append(completion_entry(task_event))
+
+    def forget(self, partitions: List[int]):
+        """Drop buffered entries of partitions this worker no longer owns"""
+        for pending in (self._activity, self._completions):
+            for key in [key for key in pending if key[1] in partitions]:
+                del pending[key]
+
+    async def flush(self):
+        """Push the buffered entries into the users' ring buffers."""
+        if not self._activity:
+            return
+        activity, self._activity = self._activity, {}
+        completions, self._completions = self._completions, {}
+        # Buffers of a user's partitions are merged together; the sort puts them in order
+        by_user: Dict[int, Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]] = {}
+        for (user_id, _), entries in activity.items():
+            by_user.setdefault(user_id, ([], []))[0].extend(entries)
+        for (user_id, _), entries in completions.items():
+            by_user.setdefault(user_id, ([], []))[1].extend(entries)
+        now = datetime.now(timezone.utc)
+        ops = []
+        for user_id, (recent_activity, recent_completions) in by_user.items():
+            fields = {
+                "user_id": user_id,
+                "recent_activity": _merged(
+                    "recent_activity", recent_activity, "timestamp", settings.DASHBOARD_RECENT_ACTIVITY
+                ),
+                # Version stamp the API's response cache validates against
+                "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]},
+                "updated_at": now,
+            }
+            if recent_completions:
+                fields["recent_completions"] = _merged(
+                    "recent_completions", recent_completions, "completed_at", settings.DASHBOARD_RECENT_COMPLETIONS
+                )
+            ops.append(UpdateOne({"_id": user_id}, [{"$set": fields}], upsert=True))
+        try:
+            await get_database().user_dashboards.bulk_write(ops, ordered=False)
+        except Exception:
+            # Retry with the next flush; entries that did land are dropped by the union
+            for pending, taken in ((self._activity, activity), (self._completions, completions)):
+                for key, entries in taken.items():
+                    pending[key] = entries + pending.get(key, [])
+            raise
@@ -0,0 +1,108 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from bson import Binary
+from pymongo import UpdateOne
+from app.config import settings
+from app.database import get_database
+from app.hyperloglog import HyperLogLog
+from app.models import TaskEvent
+from app.windowing import window_start
+
+# metric, scope (project id, or None platform-wide), UTC day, partition
+SketchKey = Tuple[str, Optional[int], datetime, int]
+
+
+def _filter(key: SketchKey) -> Dict[str, Any]:
+    metric, scope, day, shard = key
+    return {"metric": metric, "scope": scope, "day": day, "shard": shard}
+
+
+class DistinctCounters:
+    """Daily HyperLogLog sketches of distinct users and tasks.
+
+    ``active_users`` counts the distinct users with any task event per day
+    and ``project_tasks`` the distinct tasks touched per project and day.
+    Each partition owns its own shard of every sketch in
+    ``distinct_sketches`` and is the only writer of it, so a shard is
+    replaced whole instead of merged in Mongo; readers merge the shards of
+    the days they ask for. Sketches are idempotent, so events replayed after
+    a rebalance or crash are harmless.
+    """
+
+    def __init__(self):
+        # Additions since the last flush
+        self._pending: Dict[SketchKey, HyperLogLog] = {}
+        # Current shards, so a flush only reads those it has not seen yet
+        self._shards: "OrderedDict[SketchKey, HyperLogLog]" = OrderedDict()
+
+    def _add(self, metric: str, scope: Optional[int], day: datetime, partition: int, item: Any):
+        key = (metric, scope, day, partition)
+        sketch = self._pending.get(key)
+        if sketch is None:
+            sketch = self._pending[key] = HyperLogLog(settings.HLL_PRECISION)
+        sketch.add(item)
+
+    def add(self, task_event: TaskEvent, partition: int):
+        day = window_start(task_event.timestamp, "day").replace(tzinfo=None)
+        self._add("active_users", None, day, partition, task_event.user_id)
+        if task_event.project_id and task_event.task_id is not None:
+            self._add("project_tasks", task_event.project_id, day, partition, task_event.task_id)
+
+    def forget(self, partitions: List[int]):
+        """Drop the shards of partitions this worker no longer owns"""
+        for key in [key for key in self._pending if key[3] in partitions]:
+            del self._pending[key]
+        for key in [key for key in self._shards if key[3] in partitions]:
+            del self._shards[key]
+
+    async def _load(self, keys: List[SketchKey]):
+        missing = [key for key in keys if key not in self._shards]
+        if not missing:
+            return
+        db = get_database()
+        for key in missing:
+            self._shards[key] = HyperLogLog(settings.HLL_PRECISION)
+        # A previous owner of the partition may already have written the shard
+        cursor = db.distinct_sketches.find(
+            {"$or": [_filter(key) for key in missing]},
+            {"_id": 0, "metric": 1, "scope": 1, "day": 1, "shard": 1, "registers": 1}
+        )
+        async for doc in cursor:
+            key = (doc["metric"], doc["scope"], doc["day"], doc["shard"])
+            self._shards[key] = HyperLogLog.from_bytes(doc["registers"])
+
+    async def flush(self):
+        """Write the shards changed since the last flush."""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            await self._load(list(pending))
+            now = datetime.now(timezone.utc)
+            ops = []
+            for key, additions in pending.items():
+                shard = self._shards[key]
+                self._shards.move_to_end(key)
+                if not shard.merge(additions):
+                    continue
+                ops.append(UpdateOne(
+                    _filter(key),
+                    {"$set": {"registers": Binary(shard.to_bytes()), "updated_at": now}},
+                    upsert=True,
+                ))
+            if ops:
+                await get_database().distinct_sketches.bulk_write(ops, ordered=False)
+        except Exception:
+            # Retry the additions with the next flush; the cached shards may
+            # hold some of them already, which merging again does not change
+            for key, additions in pending.items():
+                if key in self._pending:
+                    self._pending[key].merge(additions)
+                else:
+                    self._pending[key] = additions
+            for key in pending:
+                self._shards.pop(key, None)
+            raise
+        while len(self._shards) > settings.HLL_CACHE_MAX_SKETCHES:
+            self._shards.popitem(last=False)
@@ -0,0 +1,209 @@
+import asyncio
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+import structlog
+
+logger = structlog.get_logger()
+
+_capture_lock = asyncio.Lock()
+
+
+def _thread_cpu_time(ident: int) -> Optional[float]:
+    """CPU seconds a thread has consumed, or None where per-thread clocks are unavailable"""
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(ident))
+    except (AttributeError, OSError):
+        return None
+
+
+class StackSampler:
+    """Samples the stacks of the threads running on a CPU at a fixed interval.
+
+    A thread is only sampled when its CPU clock advanced since the previous
+    tick, so threads blocked in ``select`` or waiting for executor work do
+    not bury the hotspots; where per-thread CPU clocks are unavailable every
+    thread is sampled. Samples are aggregated into Brendan Gregg's "folded"
+    format (``frame;frame;frame count``) which flamegraph.pl, speedscope and
+    inferno all read directly.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._cpu_times: Dict[int, float] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while not self._stop.is_set():
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident or not self._ran(ident):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.samples[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def _ran(self, ident: int) -> bool:
+        """Whether the thread used CPU since the previous tick"""
+        cpu_time = _thread_cpu_time(ident)
+        if cpu_time is None:
+            return True
+        previous = self._cpu_times.get(ident)
+        self._cpu_times[ident] = cpu_time
+        return previous is not None and cpu_time > previous
+
+    def write_folded(self, path: str):
+        with open(path, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up from a short sleep."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.lags_ms: List[float] = []
+
+    async def run(self, duration: float):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + duration
+        while loop.time() < deadline:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags_ms.append(max(0.0, (loop.time() - started - self.interval) * 1000))
+
+    def summary(self) -> Dict[str, Any]:
+        if not self.lags_ms:
+            return {"samples": 0}
+        ordered = sorted(self.lags_ms)
+        return {
+            "samples": len(ordered),
+            "mean_ms": round(statistics.fmean(ordered), 3),
+            "p50_ms": round(ordered[len(ordered) // 2], 3),
+            "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 3),
+            "max_ms": round(ordered[-1], 3),
+        }
+
+
+def _task_stacks() -> str:
+    """Stacks of all asyncio tasks; must run on the event loop"""
+    out = io.StringIO()
+    for task in asyncio.all_tasks():
+        out.write(f"--- {task.get_name()} ({'done' if task.done() else 'pending'})\n")
+        task.print_stack(file=out)
+        out.write("\n")
+    return out.getvalue()
+
+
+def _write_allocations(snapshot: tracemalloc.Snapshot, path: str, limit: int):
+    with open(path, "w") as f:
+        for stat in snapshot.statistics("lineno")[:limit]:
+            f.write(f"{stat}\n")
+
+
+def _write_profile(
+    run_dir: str,
+    sampler: StackSampler,
+    task_stacks: str,
+    summary: Dict[str, Any],
+    stop_tracing: bool,
+    top_allocations: int
+) -> Dict[str, Any]:
+    """Snapshot allocations and write every file of a capture; runs in an executor thread"""
+    snapshot = tracemalloc.take_snapshot()
+    if stop_tracing:
+        tracemalloc.stop()
+    os.makedirs(run_dir, exist_ok=True)
+    files = {
+        "cpu": os.path.join(run_dir, "cpu.folded"),
+        "allocations": os.path.join(run_dir, "allocations.txt"),
+        "tasks": os.path.join(run_dir, "tasks.txt"),
+        "summary": os.path.join(run_dir, "summary.json"),
+    }
+    sampler.write_folded(files["cpu"])
+    _write_allocations(snapshot, files["allocations"], top_allocations)
+    with open(files["tasks"], "w") as f:
+        f.write(task_stacks)
+    summary = {**summary, "files": files}
+    with open(files["summary"], "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+async def capture_profile(
+    seconds: float,
+    output_dir: str,
+    interval: float = 0.005,
+    top_allocations: int = 50,
+) -> Dict[str, Any]:
+    """Profile the running process for ``seconds`` and write the results to disk.
+
+    Produces a folded CPU profile, the top tracemalloc allocations, the stacks
+    of all asyncio tasks and a JSON summary with event-loop lag statistics.
+    Only one capture runs at a time per process. Apart from the task stacks,
+    the snapshot and the file writes run in an executor so the capture does
+    not stall the requests and batches it is meant to observe.
+    """
+    if _capture_lock.locked():
+        raise RuntimeError("A profile capture is already running")
+
+    async with _capture_lock:
+        started_at = datetime.now(timezone.utc)
+        run_dir = os.path.join(output_dir, f"{started_at.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}")
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+
+        sampler = StackSampler(interval)
+        lag_monitor = LoopLagMonitor()
+        sampler.start()
+        try:
+            await lag_monitor.run(seconds)
+        except BaseException:
+            if started_tracing:
+                tracemalloc.stop()
+            raise
+        finally:
+            sampler.stop()
+
+        summary = {
+            "pid": os.getpid(),
+            "started_at": started_at.isoformat(),
+            "duration_seconds": seconds,
+            "cpu_samples": sum(sampler.samples.values()),
+            "asyncio_tasks": len(asyncio.all_tasks()),
+            "event_loop_lag": lag_monitor.summary(),
+        }
+        summary = await asyncio.get_running_loop().run_in_executor(
+            None, _write_profile, run_dir, sampler, _task_stacks(), summary, started_tracing, top_allocations
+        )
+
+        logger.info("Profile captured", directory=run_dir, cpu_samples=summary["cpu_samples"])
+        return summary
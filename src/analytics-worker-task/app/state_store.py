@@ -0,0 +1,253 @@
+import json
+import os
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+import structlog
+from confluent_kafka import Consumer, KafkaError, Producer, TopicPartition
+from confluent_kafka.admin import AdminClient, NewTopic
+from app.config import settings
+
+logger = structlog.get_logger()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    partition INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    partition INTEGER PRIMARY KEY,
+    next_offset INTEGER NOT NULL
+);
+"""
+
+
+class ChangelogDeliveryError(RuntimeError):
+    """Changelog records were not delivered; the input offsets behind them must not be committed."""
+
+
+class ChangelogTopicError(RuntimeError):
+    """The changelog topic cannot hold the state of every input partition."""
+
+
+class StateStore:
+    """Local key-value state in SQLite, backed by a compacted Kafka changelog.
+
+    Values are JSON documents grouped by namespace. Every write is also sent
+    to the changelog topic, which has the same partition count as the input
+    topic: state derived from input partition N lives in changelog partition N.
+    When a partition is assigned, the store replays its changelog partition
+    from the last local checkpoint, so a fresh replica restores the full state
+    and a returning one only catches up on what it missed.
+
+    Writes since the last ``take_dirty()`` are tracked so they can be
+    materialized to Mongo in periodic snapshots. ``commit()`` raises while
+    changelog records are undelivered, so the offsets of the input that
+    produced them are never committed past a hole in the changelog.
+    """
+
+    def __init__(self, input_topic: str, changelog_topic: str, path: str):
+        self.input_topic = input_topic
+        self.changelog_topic = changelog_topic
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._producer: Optional[Producer] = None
+        self._checkpoints: Dict[int, int] = {}
+        self._dirty: Dict[Tuple[str, str], Optional[Dict[str, Any]]] = {}
+        # Keys whose latest changelog record failed, with their partition; resent by commit()
+        self._undelivered: Dict[Tuple[str, str], int] = {}
+        self._changelog_ready = False
+
+    def open(self):
+        """Open the SQLite file and check the changelog topic if the input topic exists (blocking)."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Only one thread uses the connection at a time: the event loop, or the
+        # polling thread during a rebalance callback while the loop waits on it
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._checkpoints = dict(self._db.execute("SELECT partition, next_offset FROM checkpoints"))
+        self._producer = Producer({
+            "bootstrap.servers": settings.KAFKA_BOOTSTRAP_SERVERS,
+            "linger.ms": 20,
+            "enable.idempotence": True,
+        })
+        self._ensure_changelog_topic(required=False)
+
+    def close(self):
+        if self._producer is not None:
+            self._producer.flush()
+        if self._db is not None:
+            self.commit()
+            self._db.close()
+            self._db = None
+
+    def _ensure_changelog_topic(self, required: bool = True):
+        """Create the changelog with the input topic's partition count, or check an existing one.
+
+        The partition count is only known once the input topic exists (it may
+        be auto-created by the first producer), so until then this is retried
+        on the first assignment; ``required`` makes a missing input topic an error.
+        """
+        if self._changelog_ready:
+            return
+        admin = AdminClient({"bootstrap.servers": settings.KAFKA_BOOTSTRAP_SERVERS})
+        topics = admin.list_topics(timeout=10).topics
+        if self.input_topic not in topics:
+            if required:
+                raise ChangelogTopicError(f"Input topic {self.input_topic} does not exist")
+            logger.info("Changelog topic deferred until the input topic exists", topic=self.changelog_topic)
+            return
+        partitions = len(topics[self.input_topic].partitions)
+        if self.changelog_topic not in topics:
+            futures = admin.create_topics([NewTopic(
+                self.changelog_topic,
+                num_partitions=partitions,
+                replication_factor=settings.STATE_CHANGELOG_REPLICATION_FACTOR,
+                config={"cleanup.policy": "compact"},
+            )])
+            try:
+                futures[self.changelog_topic].result()
+                logger.info("Changelog topic created", topic=self.changelog_topic, partitions=partitions)
+            except Exception as e:
+                # Another replica may have created it concurrently
+                logger.warning("Changelog topic creation failed", topic=self.changelog_topic, error=str(e))
+            topics = admin.list_topics(timeout=10).topics
+        existing = len(topics[self.changelog_topic].partitions) if self.changelog_topic in topics else 0
+        if existing < partitions:
+            raise ChangelogTopicError(
+                f"Changelog topic {self.changelog_topic} has {existing} partitions, "
+                f"input topic {self.input_topic} has {partitions}"
+            )
+        self._changelog_ready = True
+
+    # Reads and writes
+
+    def get(self, namespace: str, key: Any) -> Optional[Dict[str, Any]]:
+        row = self._db.execute(
+            "SELECT value FROM state WHERE namespace = ? AND key = ?", (namespace, str(key))
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, namespace: str, key: Any, value: Dict[str, Any], partition: int):
+        key = str(key)
+        encoded = json.dumps(value, separators=(",", ":"))
+        self._db.execute(
+            "INSERT OR REPLACE INTO state (namespace, key, partition, value) VALUES (?, ?, ?, ?)",
+            (namespace, key, partition, encoded),
+        )
+        self._dirty[(namespace, key)] = value
+        self._send(namespace, key, encoded, partition)
+
+    def delete(self, namespace: str, key: Any, partition: int):
+        key = str(key)
+        self._db.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+        self._dirty[(namespace, key)] = None
+        self._send(namespace, key, None, partition)
+
+    def take_dirty(self) -> List[Tuple[str, str, Optional[Dict[str, Any]]]]:
+        """Entries written since the previous call; a value of None means deleted."""
+        dirty, self._dirty = self._dirty, {}
+        return [(namespace, key, value) for (namespace, key), value in dirty.items()]
+
+    def mark_dirty(self, namespace: str, key: str, value: Optional[Dict[str, Any]]):
+        """Re-queue an entry for the next snapshot unless it was written again meanwhile."""
+        self._dirty.setdefault((namespace, key), value)
+
+    def commit(self):
+        """Make local writes and their changelog records durable (blocking).
+
+        Keys whose changelog record failed are sent again with their current
+        value; raises ChangelogDeliveryError if any is still undelivered.
+        """
+        self._producer.flush()
+        if self._undelivered:
+            undelivered, self._undelivered = self._undelivered, {}
+            for (namespace, key), partition in undelivered.items():
+                row = self._db.execute(
+                    "SELECT value FROM state WHERE namespace = ? AND key = ?", (namespace, key)
+                ).fetchone()
+                self._send(namespace, key, row[0] if row else None, partition)
+            self._producer.flush()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO checkpoints (partition, next_offset) VALUES (?, ?)",
+            list(self._checkpoints.items()),
+        )
+        self._db.commit()
+        if self._undelivered:
+            raise ChangelogDeliveryError(f"{len(self._undelivered)} changelog records undelivered")
+
+    # Changelog
+
+    def _send(self, namespace: str, key: str, encoded: Optional[str], partition: int):
+        self._producer.produce(
+            self.changelog_topic,
+            key=f"{namespace}/{key}",
+            value=encoded,
+            partition=partition,
+            on_delivery=self._on_delivery,
+        )
+        self._producer.poll(0)
+
+    def _on_delivery(self, err, msg):
+        if err is not None:
+            logger.error("Changelog write failed", error=str(err))
+            namespace, key = msg.key().decode("utf-8").split("/", 1)
+            self._undelivered[(namespace, key)] = msg.partition()
+            return
+        self._checkpoints[msg.partition()] = max(self._checkpoints.get(msg.partition(), 0), msg.offset() + 1)
+
+    def restore(self, partitions: List[int]):
+        """Replay the changelog of ``partitions`` from the local checkpoints (blocking)."""
+        self._ensure_changelog_topic()
+        consumer = Consumer({
+            "bootstrap.servers": settings.KAFKA_BOOTSTRAP_SERVERS,
+            "group.id": f"{settings.KAFKA_GROUP_ID}-restore",
+            "enable.auto.commit": False,
+            "auto.offset.reset": "earliest",
+            "enable.partition.eof": True,
+        })
+        try:
+            end_offsets = {}
+            for partition in partitions:
+                _, high = consumer.get_watermark_offsets(TopicPartition(self.changelog_topic, partition), timeout=10)
+                if high > self._checkpoints.get(partition, 0):
+                    end_offsets[partition] = high
+            if not end_offsets:
+                return
+            consumer.assign([
+                TopicPartition(self.changelog_topic, partition, self._checkpoints.get(partition, 0))
+                for partition in end_offsets
+            ])
+            restored = 0
+            while end_offsets:
+                for msg in consumer.consume(1000, 1.0):
+                    if msg.error():
+                        if msg.error().code() == KafkaError._PARTITION_EOF:
+                            end_offsets.pop(msg.partition(), None)
+                        else:
+                            logger.warning("Changelog read error", error=str(msg.error()))
+                        continue
+                    namespace, key = msg.key().decode("utf-8").split("/", 1)
+                    value = msg.value()
+                    if value is None:
+                        self._db.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+                        self._dirty[(namespace, key)] = None
+                    else:
+                        self._db.execute(
+                            "INSERT OR REPLACE INTO state (namespace, key, partition, value) VALUES (?, ?, ?, ?)",
+                            (namespace, key, msg.partition(), value.decode("utf-8")),
+                        )
+                        # Mongo may be behind the changelog, so re-materialize restored entries
+                        self._dirty[(namespace, key)] = json.loads(value)
+                    self._checkpoints[msg.partition()] = msg.offset() + 1
+                    restored += 1
+                    if msg.offset() + 1 >= end_offsets.get(msg.partition(), 0):
+                        end_offsets.pop(msg.partition(), None)
+            self.commit()
+            logger.info("State restored from changelog", partitions=partitions, records=restored)
+        finally:
+            consumer.close()
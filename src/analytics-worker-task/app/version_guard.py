@@ -0,0 +1,21 @@
+from datetime import datetime, timezone
+
+
+def event_version(timestamp: datetime) -> int:
+    """Event version used for ordering: microseconds since the epoch of the event time."""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return int(timestamp.timestamp() * 1_000_000)
+
+
+def version_datetime(version: int) -> datetime:
+    """Inverse of ``event_version``."""
+    return datetime.fromtimestamp(version / 1_000_000, tz=timezone.utc)
+
+
+def is_newer(version: int, previous: dict = None) -> bool:
+    """Whether an event with ``version`` may be applied over the stored ``previous`` state.
+
+    Stale and duplicate (redelivered) events are rejected.
+    """
+    return previous is None or version > previous.get("version", -1)
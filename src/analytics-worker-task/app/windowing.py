@@ -0,0 +1,197 @@
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import structlog
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app.config import settings
+from app.database import get_database
+from app.models import TaskEvent
+
+logger = structlog.get_logger()
+
+GRANULARITIES = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+DUPLICATE_KEY = 11000
+
+
+def _utc(ts: datetime) -> datetime:
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(timezone.utc)
+
+
+def window_start(ts: datetime, granularity: str) -> datetime:
+    """Start of the tumbling window of ``granularity`` containing ``ts`` (UTC)."""
+    ts = _utc(ts).replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        ts = ts.replace(hour=0)
+    return ts
+
+
+class WatermarkTracker:
+    """Tracks the event-time watermark of every assigned partition.
+
+    A partition's watermark is the highest event time seen on it. The
+    watermark of the whole topic is the minimum over all partitions of all
+    replicas, shared through the ``window_watermarks`` collection; partitions
+    that have been idle longer than the idle timeout are ignored so a quiet
+    partition cannot hold every window open.
+    """
+
+    def __init__(self, topic: str):
+        self.topic = topic
+        self.partitions: Dict[int, datetime] = {}
+
+    def observe(self, partition: int, ts: datetime):
+        ts = _utc(ts)
+        current = self.partitions.get(partition)
+        if current is None or ts > current:
+            self.partitions[partition] = ts
+
+    def forget(self, partitions: List[int]):
+        for partition in partitions:
+            self.partitions.pop(partition, None)
+
+    async def publish(self):
+        db = get_database()
+        now = datetime.now(timezone.utc)
+        for partition, watermark in self.partitions.items():
+            await db.window_watermarks.update_one(
+                {"topic": self.topic, "partition": partition},
+                {"$max": {"watermark": watermark}, "$set": {"updated_at": now}},
+                upsert=True,
+            )
+
+    async def global_watermark(self) -> Optional[datetime]:
+        db = get_database()
+        idle_cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.WINDOW_IDLE_PARTITION_SECONDS)
+        docs = await db.window_watermarks.find({"topic": self.topic}).to_list(None)
+        if not docs:
+            return None
+        active = [d["watermark"] for d in docs if _utc(d["updated_at"]) >= idle_cutoff]
+        if active:
+            return _utc(min(active))
+        return _utc(max(d["watermark"] for d in docs))
+
+
+class WindowAggregator:
+    """Event-time tumbling window aggregation of task events.
+
+    Every event is added incrementally (``$inc``) to hourly and daily windows,
+    both per user (``project_id: None``) and per user/project, keyed by the
+    event timestamp. A window is closed once the topic watermark passes its end
+    plus the allowed lateness; events that arrive later than that are dropped
+    from the windows, so closed windows never change again and can be cached
+    indefinitely by readers. Events within the allowed lateness amend their
+    window and are counted in ``late_events``.
+
+    Updates are idempotent: a window records the highest offset it applied per
+    input partition (``offsets.<partition>``) and only matches events past it,
+    so an event redelivered after a crash or rebalance is not counted twice.
+    """
+
+    def __init__(self, topic: str):
+        self.watermarks = WatermarkTracker(topic)
+        self.allowed_lateness = timedelta(seconds=settings.WINDOW_ALLOWED_LATENESS_SECONDS)
+        self.dropped_events = 0
+        self._last_close = 0.0
+
+    def _window_ops(
+        self,
+        task_event: TaskEvent,
+        watermark: Optional[datetime],
+        partition: int,
+        offset: int
+    ) -> List[Tuple[Dict[str, Any], UpdateOne]]:
+        """(window key, upsert) pairs of the windows an event counts in"""
+        inc: Dict[str, int] = {"events": 1}
+        if task_event.event == "task_created":
+            inc["created"] = 1
+        elif task_event.event == "task_deleted":
+            inc["deleted"] = 1
+        elif task_event.event == "task_updated":
+            inc["updated"] = 1
+            if task_event.status:
+                inc[f"transitions.{task_event.status}"] = 1
+                if task_event.status == "completed":
+                    inc["completed"] = 1
+
+        scopes = [None]
+        if task_event.project_id:
+            scopes.append(task_event.project_id)
+
+        ops = []
+        now = datetime.now(timezone.utc)
+        for granularity, size in GRANULARITIES.items():
+            start = window_start(task_event.timestamp, granularity)
+            window_inc = dict(inc)
+            if watermark is not None and start + size <= watermark:
+                # The watermark had already passed this window: a late amendment
+                window_inc["late_events"] = 1
+            for project_id in scopes:
+                key = {
+                    "granularity": granularity,
+                    "window_start": start,
+                    "user_id": task_event.user_id,
+                    "project_id": project_id,
+                }
+                ops.append((key, UpdateOne(
+                    {**key, "closed": False, f"offsets.{partition}": {"$not": {"$gte": offset}}},
+                    {
+                        "$inc": window_inc,
+                        "$set": {"updated_at": now, f"offsets.{partition}": offset},
+                        "$setOnInsert": {"window_end": start + size},
+                    },
+                    upsert=True,
+                )))
+        return ops
+
+    async def add(self, task_event: TaskEvent, partition: int, offset: int):
+        """Add an event at ``offset`` of ``partition`` to its windows and advance the partition watermark."""
+        watermark = self.watermarks.partitions.get(partition)
+        event_time = _utc(task_event.timestamp)
+        self.watermarks.observe(partition, event_time)
+
+        db = get_database()
+        windows = self._window_ops(task_event, watermark, partition, offset)
+        try:
+            await db.task_event_windows.bulk_write([op for _, op in windows], ordered=False)
+        except BulkWriteError as e:
+            # The upsert only matches open windows that have not applied the
+            # offset yet; otherwise it collides with the unique window key
+            errors = e.details.get("writeErrors", [])
+            if any(err.get("code") != DUPLICATE_KEY for err in errors):
+                raise
+            keys = [windows[err["index"]][0] for err in errors]
+            existing = await db.task_event_windows.find({"$or": keys}, {"_id": 0, "offsets": 1}).to_list(None)
+            if any((doc.get("offsets") or {}).get(str(partition), -1) >= offset for doc in existing):
+                logger.info("Redelivered event already counted in its windows", task_id=task_event.task_id, offset=offset)
+                return
+            self.dropped_events += 1
+            logger.warning(
+                "Event beyond allowed lateness dropped from closed windows",
+                task_id=task_event.task_id,
+                timestamp=event_time.isoformat(),
+                closed_windows=len(errors),
+            )
+
+    async def maybe_close_windows(self):
+        """Publish local watermarks and close windows the global watermark has passed."""
+        if time.monotonic() - self._last_close < settings.WINDOW_CLOSE_INTERVAL_SECONDS:
+            return
+        self._last_close = time.monotonic()
+        await self.watermarks.publish()
+        watermark = await self.watermarks.global_watermark()
+        if watermark is None:
+            return
+        db = get_database()
+        result = await db.task_event_windows.update_many(
+            {"closed": False, "window_end": {"$lte": watermark - self.allowed_lateness}},
+            {"$set": {"closed": True, "closed_at": datetime.now(timezone.utc)}},
+        )
+        if result.modified_count:
+            logger.info("Windows closed", count=result.modified_count, watermark=watermark.isoformat())
@@ -0,0 +1 @@
+# Empty __init__.py file to make this directory a Python package
\ No newline at end of file
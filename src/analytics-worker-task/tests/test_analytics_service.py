@@ -0,0 +1,164 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from unittest.mock import AsyncMock, Mock
+from app import analytics_service
+from app.analytics_service import AnalyticsService
+from app.models import TaskEvent
+from app.tdigest import TDigest
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class MemoryStore:
+    def __init__(self):
+        self.state = {}
+
+    def get(self, namespace, key):
+        return self.state.get((namespace, str(key)))
+
+    def put(self, namespace, key, value, partition):
+        self.state[(namespace, str(key))] = value
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs = sorted(self.docs, key=lambda doc: doc[field])
+        return self
+
+    def __aiter__(self):
+        return self._docs()
+
+    async def _docs(self):
+        for doc in self.docs:
+            yield doc
+
+
+def event(hours, event="task_updated", status=None, task_id=1, project_id=1, user_id=7):
+    return TaskEvent(
+        event=event, task_id=task_id, project_id=project_id, user_id=user_id, username="alice",
+        status=status, timestamp=START + timedelta(hours=hours)
+    )
+
+
+@pytest.fixture
+def stored(monkeypatch):
+    """task_events as the worker stores them, before it applies each event"""
+    docs = []
+    db = Mock()
+    db.task_events.find = Mock(side_effect=lambda query, projection: Cursor(list(docs)))
+    monkeypatch.setattr(analytics_service, "get_database", lambda: db)
+    return docs
+
+
+@pytest.fixture
+def service():
+    return AnalyticsService(MemoryStore())
+
+
+async def process(service, stored, task_event):
+    stored.append(task_event.model_dump())
+    await service.update_task_metrics(task_event, 0)
+
+
+class TestSeeding:
+    @pytest.mark.asyncio
+    async def test_user_predating_the_store_is_seeded_from_task_events(self, service, stored):
+        """Test that a user's first event rebuilds their counters from the stored history"""
+        stored.extend(ev.model_dump() for ev in [
+            event(0, "task_created", task_id=1),
+            event(1, "task_created", task_id=2),
+            event(2, "task_updated", "completed", task_id=1),
+        ])
+
+        await process(service, stored, event(3, "task_created", task_id=3))
+
+        user = service.store.get("user", 7)
+        assert user["total_tasks"] == 3
+        assert user["completed_tasks"] == 1
+        assert service.store.get("project", "7:1")["total_tasks"] == 3
+        assert service.stale_events == 0
+
+    @pytest.mark.asyncio
+    async def test_history_is_replayed_once(self, service, stored):
+        """Test that later events of a seeded user are applied without another replay"""
+        await process(service, stored, event(0, "task_created"))
+        await process(service, stored, event(1, "task_updated", "completed"))
+
+        assert analytics_service.get_database().task_events.find.call_count == 1
+        user = service.store.get("user", 7)
+        assert (user["total_tasks"], user["completed_tasks"]) == (1, 1)
+
+    @pytest.mark.asyncio
+    async def test_event_missing_from_the_history_is_still_applied(self, service, stored):
+        """Test that the triggering event is applied when the replay did not include it"""
+        await service.update_task_metrics(event(0, "task_created"), 0)
+
+        assert service.store.get("user", 7)["total_tasks"] == 1
+
+
+class TestCycleTimes:
+    @staticmethod
+    def cycle_count(service):
+        user = service.store.get("user", 7)
+        if not user.get("cycle_digest"):
+            return 0
+        return TDigest.from_base64(user["cycle_digest"]).count
+
+    @pytest.mark.asyncio
+    async def test_cycle_starts_at_creation(self, service, stored):
+        """Test that a task's cycle time runs from its task_created event to its completion"""
+        await process(service, stored, event(0, "task_created"))
+        await process(service, stored, event(2, "task_updated", "in_progress"))
+        await process(service, stored, event(5, "task_updated", "completed"))
+
+        digest = TDigest.from_base64(service.store.get("user", 7)["cycle_digest"])
+        assert digest.count == 1
+        assert digest.quantile(0.5) == pytest.approx(5.0)
+
+    @pytest.mark.asyncio
+    async def test_task_without_known_creation_is_skipped(self, service, stored):
+        """Test that a task first seen through an update adds no cycle time"""
+        await process(service, stored, event(2, "task_updated", "in_progress"))
+        await process(service, stored, event(5, "task_updated", "completed"))
+
+        assert service.store.get("user", 7)["completed_tasks"] == 1
+        assert self.cycle_count(service) == 0
+
+    @pytest.mark.asyncio
+    async def test_only_the_first_completion_counts(self, service, stored):
+        """Test that reopening and completing a task again adds no second cycle time"""
+        await process(service, stored, event(0, "task_created"))
+        await process(service, stored, event(1, "task_updated", "completed"))
+        await process(service, stored, event(2, "task_updated", "in_progress"))
+        await process(service, stored, event(3, "task_updated", "completed"))
+
+        assert service.store.get("user", 7)["completed_tasks"] == 1
+        assert self.cycle_count(service) == 1
+
+
+class TestSnapshot:
+    @pytest.mark.asyncio
+    async def test_deleted_projects_are_not_revived(self, monkeypatch):
+        """Test that task counters of a project deleted by the project worker are not upserted"""
+        def aggregate(project_id):
+            return {
+                "user_id": 7, "project_id": project_id, "username": "alice", "total_tasks": 2,
+                "completed_tasks": 1, "last_activity": 1, "first_activity": 1,
+            }
+
+        store = Mock()
+        store.take_dirty.return_value = [("project", "7:1", aggregate(1)), ("project", "7:2", aggregate(2))]
+        db = Mock()
+        db.project_events.distinct = AsyncMock(return_value=[2])
+        db.project_metrics.bulk_write = AsyncMock()
+        monkeypatch.setattr(analytics_service, "get_database", lambda: db)
+
+        await AnalyticsService(store).snapshot()
+
+        assert db.project_events.distinct.call_args[0][1] == {"project_id": {"$in": [1, 2]}, "event": "project_deleted"}
+        ops = db.project_metrics.bulk_write.call_args[0][0]
+        assert [op._filter["project_id"] for op in ops] == [1]
+        assert ops[0]._upsert is True
@@ -0,0 +1,62 @@
+from datetime import datetime
+from unittest.mock import AsyncMock, Mock
+import pytest
+from app import dashboards
+from app.dashboards import DashboardReadModel
+from app.models import TaskEvent
+
+
+def task_event(**fields) -> TaskEvent:
+    event = {
+        "event": "task_updated",
+        "task_id": 7,
+        "project_id": 3,
+        "user_id": 1,
+        "username": "alice",
+        "title": "Write docs",
+        "status": "completed",
+        "timestamp": datetime(2024, 1, 1, 12, 0, 0),
+    }
+    event.update(fields)
+    return TaskEvent(**event)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = Mock()
+    db.user_dashboards.bulk_write = AsyncMock()
+    monkeypatch.setattr(dashboards, "get_database", lambda: db)
+    return db
+
+
+@pytest.mark.asyncio
+async def test_flush_merges_entries_with_a_set_union(db):
+    """Test that ring buffers are merged with a pipeline union rather than pushed"""
+    read_model = DashboardReadModel()
+    read_model.add(task_event(), partition=0)
+    await read_model.flush()
+
+    op = db.user_dashboards.bulk_write.call_args[0][0][0]
+    assert op._filter == {"_id": 1}
+    assert op._upsert is True
+    fields = op._doc[0]["$set"]
+    union = fields["recent_activity"]["$slice"][0]["$sortArray"]["input"]["$setUnion"]
+    assert union[0] == {"$ifNull": ["$recent_activity", []]}
+    assert union[1]["$literal"] == [dashboards.activity_entry(task_event())]
+    completions = fields["recent_completions"]["$slice"][0]["$sortArray"]
+    assert completions["sortBy"] == {"completed_at": -1}
+    assert completions["input"]["$setUnion"][1]["$literal"] == [dashboards.completion_entry(task_event())]
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_entries_for_the_next_one(db):
+    """Test that entries of a failed flush are retried with the next flush"""
+    db.user_dashboards.bulk_write = AsyncMock(side_effect=[RuntimeError("down"), None])
+    read_model = DashboardReadModel()
+    read_model.add(task_event(), partition=0)
+    with pytest.raises(RuntimeError):
+        await read_model.flush()
+    await read_model.flush()
+
+    op = db.user_dashboards.bulk_write.call_args[0][0][0]
+    assert op._doc[0]["$set"]["recent_activity"]["$slice"][0]["$sortArray"]["input"]["$setUnion"][1]["$literal"]
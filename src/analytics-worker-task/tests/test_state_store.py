@@ -0,0 +1,217 @@
+import json
+import pytest
+from confluent_kafka import KafkaError
+from app import state_store
+from app.state_store import ChangelogDeliveryError, ChangelogTopicError, StateStore
+
+
+class Message:
+    def __init__(self, key, value, partition, offset, error=None):
+        self._key = key.encode() if isinstance(key, str) else key
+        self._value = value.encode() if isinstance(value, str) else value
+        self._partition = partition
+        self._offset = offset
+        self._error = error
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+    def error(self):
+        return self._error
+
+
+class Broker:
+    """In-memory changelog partitions shared by the fake producer and consumer"""
+
+    def __init__(self, partitions=2):
+        self.log = {partition: [] for partition in range(partitions)}
+        self.failing = False
+
+    def append(self, key, value, partition):
+        message = Message(key, value, partition, len(self.log[partition]))
+        self.log[partition].append(message)
+        return message
+
+
+class Producer:
+    def __init__(self, broker):
+        self.broker = broker
+        self.queued = []
+
+    def produce(self, topic, key, value, partition, on_delivery):
+        self.queued.append((key, value, partition, on_delivery))
+
+    def poll(self, timeout):
+        pass
+
+    def flush(self):
+        queued, self.queued = self.queued, []
+        for key, value, partition, on_delivery in queued:
+            if self.broker.failing:
+                on_delivery(KafkaError(KafkaError._MSG_TIMED_OUT), Message(key, value, partition, -1))
+            else:
+                on_delivery(None, self.broker.append(key, value, partition))
+
+
+class Consumer:
+    def __init__(self, broker):
+        self.broker = broker
+        self.pending = []
+
+    def get_watermark_offsets(self, topic_partition, timeout):
+        return 0, len(self.broker.log[topic_partition.partition])
+
+    def assign(self, topic_partitions):
+        for tp in topic_partitions:
+            self.pending.extend(self.broker.log[tp.partition][tp.offset:])
+
+    def consume(self, count, timeout):
+        batch, self.pending = self.pending[:count], self.pending[count:]
+        return batch
+
+    def close(self):
+        pass
+
+
+class Topic:
+    def __init__(self, partitions):
+        self.partitions = {partition: None for partition in range(partitions)}
+
+
+class Admin:
+    def __init__(self, topics):
+        self.topics = topics
+
+    def list_topics(self, timeout):
+        return self
+
+    def create_topics(self, new_topics):
+        for topic in new_topics:
+            self.topics[topic.topic] = Topic(topic.num_partitions)
+        return {topic.topic: _Done() for topic in new_topics}
+
+
+class _Done:
+    def result(self):
+        return None
+
+
+@pytest.fixture
+def broker():
+    return Broker()
+
+
+@pytest.fixture
+def topics():
+    return {"task-events": Topic(2)}
+
+
+@pytest.fixture
+def make_store(broker, topics, tmp_path, monkeypatch):
+    monkeypatch.setattr(state_store, "Producer", lambda config: Producer(broker))
+    monkeypatch.setattr(state_store, "Consumer", lambda config: Consumer(broker))
+    monkeypatch.setattr(state_store, "AdminClient", lambda config: Admin(topics))
+
+    def make(name="state.db"):
+        store = StateStore("task-events", "changelog", str(tmp_path / name))
+        store.open()
+        return store
+    return make
+
+
+class TestRestore:
+    def test_fresh_replica_restores_its_partitions(self, make_store, broker):
+        """Test that a replica with an empty store rebuilds the state of its partitions from the changelog"""
+        first = make_store("first.db")
+        first.put("user", 1, {"total_tasks": 1}, 0)
+        first.put("user", 1, {"total_tasks": 2}, 0)
+        first.put("user", 2, {"total_tasks": 5}, 1)
+        first.put("user", 3, {"total_tasks": 1}, 0)
+        first.delete("user", 3, 0)
+        first.commit()
+
+        second = make_store("second.db")
+        second.restore([0])
+
+        assert second.get("user", 1) == {"total_tasks": 2}
+        assert second.get("user", 3) is None
+        assert second.get("user", 2) is None
+        # Restored entries are re-materialized to Mongo by the next snapshot
+        assert ("user", "1", {"total_tasks": 2}) in second.take_dirty()
+
+    def test_returning_replica_only_replays_from_its_checkpoint(self, make_store, broker):
+        """Test that a restore resumes after the records the store already holds"""
+        store = make_store()
+        store.put("user", 1, {"total_tasks": 1}, 0)
+        store.commit()
+        store.take_dirty()
+        broker.append("user/1", json.dumps({"total_tasks": 7}), 0)
+
+        store.restore([0])
+
+        assert store.get("user", 1) == {"total_tasks": 7}
+        assert store.take_dirty() == [("user", "1", {"total_tasks": 7})]
+
+
+class TestDeliveryFailures:
+    def test_commit_raises_until_the_changelog_has_the_records(self, make_store, broker):
+        """Test that undelivered records fail the commit and are resent with the current value"""
+        store = make_store()
+        broker.failing = True
+        store.put("user", 1, {"total_tasks": 1}, 0)
+        store.put("user", 1, {"total_tasks": 2}, 0)
+
+        with pytest.raises(ChangelogDeliveryError):
+            store.commit()
+        with pytest.raises(ChangelogDeliveryError):
+            store.commit()
+        assert broker.log[0] == []
+
+        broker.failing = False
+        store.commit()
+        assert [json.loads(message.value()) for message in broker.log[0]] == [{"total_tasks": 2}]
+
+    def test_resend_of_a_deleted_key_is_a_tombstone(self, make_store, broker):
+        """Test that a key deleted after its record failed is resent as a deletion"""
+        store = make_store()
+        broker.failing = True
+        store.put("user", 1, {"total_tasks": 1}, 0)
+        store.delete("user", 1, 0)
+        with pytest.raises(ChangelogDeliveryError):
+            store.commit()
+
+        broker.failing = False
+        store.commit()
+        assert [message.value() for message in broker.log[0]] == [None]
+
+
+class TestChangelogTopic:
+    def test_created_with_the_input_partitions(self, make_store, topics):
+        """Test that the changelog gets one partition per input partition"""
+        make_store()
+        assert len(topics["changelog"].partitions) == 2
+
+    def test_deferred_until_the_input_topic_exists(self, make_store, topics):
+        """Test that a missing input topic defers the changelog to the first assignment"""
+        del topics["task-events"]
+        store = make_store()
+        assert "changelog" not in topics
+
+        topics["task-events"] = Topic(3)
+        store._ensure_changelog_topic()
+        assert len(topics["changelog"].partitions) == 3
+
+    def test_too_few_changelog_partitions_fail(self, make_store, topics):
+        """Test that a changelog with fewer partitions than the input refuses to start"""
+        topics["changelog"] = Topic(1)
+        with pytest.raises(ChangelogTopicError):
+            make_store()
@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+import pytest
+from unittest.mock import AsyncMock, Mock
+from pymongo.errors import BulkWriteError
+from app import windowing
+from app.models import TaskEvent
+from app.windowing import DUPLICATE_KEY, WindowAggregator, window_start
+
+TIMESTAMP = datetime(2024, 1, 1, 10, 30, tzinfo=timezone.utc)
+
+
+def event(status="completed"):
+    return TaskEvent(
+        event="task_updated", task_id=1, project_id=2, user_id=7, username="alice",
+        status=status, timestamp=TIMESTAMP
+    )
+
+
+def collisions(count):
+    return BulkWriteError({"writeErrors": [{"index": i, "code": DUPLICATE_KEY} for i in range(count)]})
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = Mock()
+    db.task_event_windows.bulk_write = AsyncMock()
+    db.task_event_windows.find.return_value.to_list = AsyncMock(return_value=[])
+    monkeypatch.setattr(windowing, "get_database", lambda: db)
+    return db
+
+
+class TestWindowAggregator:
+    def test_window_start(self):
+        """Test that windows are aligned to UTC hours and days"""
+        assert window_start(TIMESTAMP, "hour") == datetime(2024, 1, 1, 10, tzinfo=timezone.utc)
+        assert window_start(TIMESTAMP, "day") == datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    @pytest.mark.asyncio
+    async def test_updates_only_match_windows_before_the_offset(self, db):
+        """Test that each window upsert is guarded by, and records, the partition offset"""
+        await WindowAggregator("task-events").add(event(), 3, 41)
+
+        ops = db.task_event_windows.bulk_write.call_args[0][0]
+        assert len(ops) == 4  # hour and day, per user and per project
+        for op in ops:
+            assert op._filter["offsets.3"] == {"$not": {"$gte": 41}}
+            assert op._doc["$set"]["offsets.3"] == 41
+            assert op._doc["$inc"]["completed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_redelivered_event_is_not_counted_as_late(self, db):
+        """Test that a collision with windows that already applied the offset is a redelivery"""
+        db.task_event_windows.bulk_write.side_effect = collisions(4)
+        db.task_event_windows.find.return_value.to_list.return_value = [{"offsets": {"3": 41}}] * 4
+        windows = WindowAggregator("task-events")
+
+        await windows.add(event(), 3, 41)
+
+        assert windows.dropped_events == 0
+
+    @pytest.mark.asyncio
+    async def test_event_for_closed_windows_is_dropped(self, db):
+        """Test that a collision with closed windows that never saw the offset drops the event"""
+        db.task_event_windows.bulk_write.side_effect = collisions(2)
+        db.task_event_windows.find.return_value.to_list.return_value = [{"offsets": {"3": 12}}] * 2
+        windows = WindowAggregator("task-events")
+
+        await windows.add(event(), 3, 41)
+
+        assert windows.dropped_events == 1
+        keys = db.task_event_windows.find.call_args[0][0]["$or"]
+        assert {"closed", "offsets.3"}.isdisjoint(keys[0])
@@ -12,7 +12,7 @@ type ProjectCreated struct {
 }
 
 func (e ProjectCreated) Name() string { return "project.created" }
-func (e ProjectCreated) Key() string { return fmt.Sprintf("project:%d", e.ID) }
+func (e ProjectCreated) Key() string { return fmt.Sprintf("user:%s", e.UserID) }
 func (e ProjectCreated) Payload() interface{} { return e }
 
 // ---- Task Events ----
@@ -27,7 +27,7 @@ type TaskCreated struct {
 }
 
 func (e TaskCreated) Name() string { return "task.created" }
-func (e TaskCreated) Key() string { return fmt.Sprintf("task:%d", e.ID) }
+func (e TaskCreated) Key() string { return fmt.Sprintf("user:%s", e.UserID) }
 func (e TaskCreated) Payload() interface{} { return e }
 
 type TaskUpdated struct {
@@ -40,5 +40,5 @@ type TaskUpdated struct {
 }
 
 func (e TaskUpdated) Name() string { return "task.updated" }
-func (e TaskUpdated) Key() string { return fmt.Sprintf("task:%d", e.ID) }
+func (e TaskUpdated) Key() string { return fmt.Sprintf("user:%s", e.UserID) }
 func (e TaskUpdated) Payload() interface{} { return e }
@@ -32,7 +32,9 @@ func NewKafkaProducer() (*KafkaProducer, error) {
 	cfg.Producer.RequiredAcks = sarama.WaitForAll
 	cfg.Producer.Retry.Max = 5
 	cfg.Producer.Return.Successes = true
-	cfg.Producer.Partitioner = sarama.NewRandomPartitioner
+	// Hash on the event key (the user) so all events of a user land on one
+	// partition, which the analytics workers' local state stores rely on.
+	cfg.Producer.Partitioner = sarama.NewHashPartitioner
 
 	p, err := sarama.NewSyncProducer([]string{brokerURL}, cfg)
 	if err != nil {
@@ -61,7 +63,7 @@ func (k *KafkaProducer) Publish(ctx context.Context, evt Event) error {
 	if evtName := evt.Name(); len(evtName) >= 8 && evtName[:8] == "project." {
 		if k.projectTopic != "" { topic = k.projectTopic }
 	}
-	msg := &sarama.ProducerMessage{Topic: topic, Value: sarama.ByteEncoder(b)}
+	msg := &sarama.ProducerMessage{Topic: topic, Key: sarama.StringEncoder(evt.Key()), Value: sarama.ByteEncoder(b)}
 	partition, offset, err := k.producer.SendMessage(msg)
 	if err != nil { return fmt.Errorf("send kafka message: %w", err) }
 	slog.Info("event published", "event", evt.Name(), "topic", topic, "partition", partition, "offset", offset)